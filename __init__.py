@@ -2,4 +2,9 @@
 
 from . import models
 from . import wizards
-from . import reports
\ No newline at end of file
+from . import reports
+from . import tools
+
+
+def post_init_hook(env):
+    env['account.move']._backfill_supplier_ncf()
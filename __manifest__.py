@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'NCF Management for Dominican Republic',
-    'version': '17.0.1.0.0',
+    'version': '17.0.1.1.0',
     'category': 'Accounting/Localizations',
     'summary': 'NCF (Número de Comprobante Fiscal) management for Dominican Republic DGII compliance',
     'description': """
@@ -46,15 +46,19 @@ Requirements:
         # Views (core views first)
         'views/ncf_sequence_views.xml',
         'views/ncf_assignment_views.xml',
+        'views/ncf_sequence_audit_views.xml',
         'views/account_move_views.xml',
         'views/ncf_invoice_form.xml',
         'views/ncf_dashboard_views.xml',
+        'views/res_partner_views.xml',
         
         # Wizards
         'wizards/ncf_sequence_wizard_views.xml',
+        'wizards/dgii_rnc_import_wizard_views.xml',
         
         # Reports (must be loaded before menu that references them)
         'reports/dgii_reports_views.xml',
+        'reports/dgii_report_job_views.xml',
         'reports/invoice_report_ncf_standalone.xml',
         
         # Menu views (loaded last to ensure all actions exist)
@@ -63,6 +67,7 @@ Requirements:
     ],
 
     'demo': [],
+    'post_init_hook': 'post_init_hook',
     'installable': True,
     'auto_install': False,
     'application': True,
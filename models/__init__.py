@@ -1,6 +1,12 @@
 # -*- coding: utf-8 -*-
 
 from . import ncf_sequence
+from . import ncf_sequence_audit
 from . import ncf_assignment
+from . import ncf_allocation_journal
 from . import account_move
-from . import res_company
\ No newline at end of file
+from . import ncf_fiscal_cube
+from . import res_company
+from . import dgii_rnc_registry
+from . import res_partner
+from . import ir_attachment
\ No newline at end of file
@@ -2,8 +2,13 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools.sql import create_index
+from collections import defaultdict
+from psycopg2 import errors
 import logging
 
+from ..tools.ncf_validation import SUPPLIER_NCF_RE, normalize_ncf
+
 _logger = logging.getLogger(__name__)
 
 
@@ -39,12 +44,95 @@ class AccountMove(models.Model):
     ], string='Tipo de NCF', copy=False, 
        help='Tipo de Número de Comprobante Fiscal según DGII')
     
+    supplier_ncf = fields.Char(
+        string='NCF Proveedor',
+        copy=False,
+        help='Número de Comprobante Fiscal emitido por el proveedor (normalizado)'
+    )
+    
     requires_ncf = fields.Boolean(
         string='Requiere NCF',
         default=lambda self: self._default_requires_ncf(),
         help='Indica si esta factura requiere un Número de Comprobante Fiscal'
     )
     
+    # A supplier NCF can only be booked once per supplier
+    _sql_constraints = [
+        ('supplier_ncf_uniq',
+         "EXCLUDE USING btree (company_id WITH =, commercial_partner_id WITH =, supplier_ncf WITH =) "
+         "WHERE (state = 'posted' AND supplier_ncf IS NOT NULL)",
+         'This supplier NCF is already booked on another posted bill of the same supplier.'),
+    ]
+    
+    # Vendor bills backfilled per UPDATE
+    _SUPPLIER_NCF_BACKFILL_BATCH = 10000
+    
+    def init(self):
+        super().init()
+        # DGII 607 domain: company, posted vendor bills, invoice date range
+        create_index(
+            self.env.cr, 'account_move_dgii_607_idx', self._table,
+            ['company_id', 'invoice_date', 'name'],
+            where="state = 'posted' AND move_type IN ('in_invoice', 'in_refund')"
+        )
+        # Exact and prefix (LIKE 'B01%') search on supplier NCFs
+        create_index(
+            self.env.cr, 'account_move_supplier_ncf_idx', self._table,
+            ['supplier_ncf text_pattern_ops'],
+            where="supplier_ncf IS NOT NULL"
+        )
+        # DGII 607 duplicate check: bills of a supplier by normalized NCF,
+        # the supplier NCF or else the reference (see normalize_ncf)
+        create_index(
+            self.env.cr, 'account_move_supplier_ncf_key_idx', self._table,
+            ['commercial_partner_id', "upper(regexp_replace(COALESCE(supplier_ncf, ref), '[ .-]', '', 'g'))"],
+            where="state = 'posted' AND move_type IN ('in_invoice', 'in_refund')"
+        )
+    
+    @api.model
+    def _backfill_supplier_ncf(self):
+        """Fill supplier_ncf from the reference of existing vendor bills.
+        
+        Runs once, in batches of UPDATEs. Only references that are a
+        well-formed NCF are copied. When a supplier NCF is booked on several
+        posted bills, only the first one is filled; the others keep their
+        reference and show up as duplicates in the 607.
+        
+        :return: number of bills filled
+        """
+        self.flush_model()
+        normalized = "upper(regexp_replace(move.ref, '[ .-]', '', 'g'))"
+        total = 0
+        while True:
+            self.env.cr.execute(f"""
+                UPDATE account_move target
+                   SET supplier_ncf = source.ncf
+                  FROM (
+                      SELECT DISTINCT ON (move.company_id, move.commercial_partner_id, {normalized})
+                             move.id, {normalized} AS ncf
+                        FROM account_move move
+                       WHERE move.move_type IN ('in_invoice', 'in_refund')
+                         AND move.supplier_ncf IS NULL
+                         AND {normalized} ~ '^(B[0-9]{{10}}|E[0-9]{{12}})$'
+                         AND NOT EXISTS (
+                             SELECT 1 FROM account_move other
+                              WHERE other.company_id = move.company_id
+                                AND other.commercial_partner_id = move.commercial_partner_id
+                                AND other.supplier_ncf = {normalized}
+                         )
+                    ORDER BY move.company_id, move.commercial_partner_id, {normalized},
+                             move.state = 'posted' DESC, move.id
+                       LIMIT %s
+                  ) source
+                 WHERE target.id = source.id
+            """, (self._SUPPLIER_NCF_BACKFILL_BATCH,))
+            if not self.env.cr.rowcount:
+                break
+            total += self.env.cr.rowcount
+        self.invalidate_model(['supplier_ncf'])
+        _logger.info(f"Backfilled the supplier NCF of {total} vendor bills")
+        return total
+    
     def _default_requires_ncf(self):
         """Default value for requires_ncf field."""
         return (
@@ -79,11 +167,7 @@ class AccountMove(models.Model):
         try:
             # Find active sequence for the document type
             NCFSequence = self.env['ncf.sequence']
-            sequence = NCFSequence.search([
-                ('document_type', '=', self.ncf_document_type),
-                ('company_id', '=', self.company_id.id),
-                ('state', '=', 'active'),
-            ], limit=1)
+            sequence = NCFSequence._get_active_sequence(self.company_id.id, self.ncf_document_type)
             
             if not sequence:
                 return {
@@ -180,46 +264,109 @@ class AccountMove(models.Model):
         """Internal method to assign NCF."""
         self.ensure_one()
         
-        # Find active sequence for the document type
-        NCFSequence = self.env['ncf.sequence']
-        sequence = NCFSequence.search([
-            ('document_type', '=', self.ncf_document_type),
-            ('company_id', '=', self.company_id.id),
-            ('state', '=', 'active'),
-        ], limit=1)
+        failures = self._assign_ncf_batch()
+        if failures:
+            raise UserError(failures[self.id])
+    
+    def _assign_ncf_batch(self):
+        """Assign NCFs to several invoices with one block allocation per sequence.
         
-        if not sequence:
-            raise UserError(_(
-                'No active NCF sequence found for document type "%s".'
-            ) % dict(self._fields['ncf_document_type'].selection)[self.ncf_document_type])
+        Invoices are grouped by (company, NCF document type). Each group
+        reserves a contiguous block from its active sequence, creates all its
+        assignments in one multi-create and links them back in one UPDATE, so
+        the cost grows with the number of sequences, not of invoices.
         
-        try:
-            # Get next NCF number
-            ncf_number = sequence.get_next_ncf()
-            
-            # Create NCF assignment
-            NCFAssignment = self.env['ncf.assignment']
-            assignment = NCFAssignment.create({
-                'ncf_number': ncf_number,
-                'sequence_id': sequence.id,
-                'invoice_id': self.id,
-                'company_id': self.company_id.id,
-            })
-            
-            # Link assignment to invoice
-            self.ncf_assignment_id = assignment.id
-            
-            # Log the assignment
-            self.message_post(
-                body=_('NCF %s assigned from sequence %s') % (ncf_number, sequence.prefix),
-                message_type='notification'
-            )
-            
-            _logger.info(f"NCF {ncf_number} assigned to invoice {self.name}")
+        When the sequence has fewer numbers left than the group needs, the
+        invoices it can serve are numbered and the sequence is depleted; the
+        rest go on with the next active sequence of the document type, if any.
+        
+        :return: dict mapping the id of each invoice that could not be
+                 assigned to the error message
+        """
+        groups = defaultdict(list)
+        for move in self:
+            groups[(move.company_id.id, move.ncf_document_type)].append(move.id)
+        
+        NCFSequence = self.env['ncf.sequence']
+        NCFAssignment = self.env['ncf.assignment']
+        doc_type_names = dict(self._fields['ncf_document_type'].selection)
+        failures = {}
+        
+        for (company_id, document_type), move_ids in groups.items():
+            pending = self.browse(move_ids)
             
-        except Exception as e:
-            _logger.error(f"Error assigning NCF to invoice {self.name}: {str(e)}")
-            raise UserError(_('Error assigning NCF: %s') % str(e))
+            while pending:
+                # Find active sequence for the document type
+                sequence = NCFSequence._get_active_sequence(company_id, document_type)
+                
+                if not sequence:
+                    failures.update(dict.fromkeys(pending.ids, _(
+                        'No active NCF sequence found for document type "%s".'
+                    ) % doc_type_names.get(document_type, document_type)))
+                    break
+                
+                try:
+                    with self.env.cr.savepoint():
+                        # Reserve one contiguous block, as large as the sequence allows
+                        ncf_numbers = sequence.allocate_block(len(pending), partial=True)
+                        moves = pending[:len(ncf_numbers)]
+                        
+                        # Create NCF assignments, without chatter in high throughput mode
+                        if sequence.allocation_mode == 'high_throughput':
+                            Assignment = NCFAssignment.with_context(mail_create_nolog=True, tracking_disable=True)
+                        else:
+                            Assignment = NCFAssignment
+                        assignments = Assignment.create([{
+                            'ncf_number': ncf_number,
+                            'sequence_id': sequence.id,
+                            'invoice_id': move.id,
+                            'company_id': company_id,
+                        } for move, ncf_number in zip(moves, ncf_numbers)])
+                        
+                        # Link assignments to invoices
+                        moves._link_ncf_assignments(assignments)
+                except UserError as e:
+                    # Sequence not active, expired or depleted
+                    failures.update(dict.fromkeys(pending.ids, e.args[0]))
+                    break
+                except (errors.UniqueViolation, errors.ExclusionViolation) as e:
+                    _logger.warning(f"Error assigning NCF block to {len(pending)} invoices: {str(e)}")
+                    failures.update(dict.fromkeys(pending.ids, self._get_ncf_constraint_message(e)))
+                    break
+                
+                # Log the assignments (high throughput sequences journal them instead)
+                if sequence.allocation_mode != 'high_throughput':
+                    moves._message_log_batch(bodies={
+                        move.id: _('NCF %s assigned from sequence %s') % (ncf_number, sequence.prefix)
+                        for move, ncf_number in zip(moves, ncf_numbers)
+                    })
+                
+                _logger.info(f"NCF {ncf_numbers[0]}-{ncf_numbers[-1]} assigned to {len(moves)} invoices")
+                pending = pending[len(moves):]
+        
+        return failures
+    
+    @api.model
+    def _get_ncf_constraint_message(self, error):
+        """Message of the NCF constraint violated by a database ``error``."""
+        constraint = error.diag.constraint_name
+        for model in (self.env['ncf.assignment'], self.env['ncf.sequence'], self):
+            for key, _definition, message in model._sql_constraints:
+                if constraint == f'{model._table}_{key}':
+                    return _(message)
+        return _('The NCF could not be assigned: it is already in use.')
+    
+    def _link_ncf_assignments(self, assignments):
+        """Point each invoice to its NCF assignment with a single UPDATE."""
+        self.env.cr.execute("""
+            UPDATE account_move move
+               SET ncf_assignment_id = assignment.id
+              FROM ncf_assignment assignment
+             WHERE assignment.invoice_id = move.id
+               AND assignment.id IN %s
+        """, [tuple(assignments.ids)])
+        self.invalidate_recordset(['ncf_assignment_id'])
+        self.modified(['ncf_assignment_id'])
     
     def _assign_ncf_onchange(self):
         """Internal method to assign NCF during onchange (less strict validation)."""
@@ -227,11 +374,7 @@ class AccountMove(models.Model):
         
         # Find active sequence for the document type
         NCFSequence = self.env['ncf.sequence']
-        sequence = NCFSequence.search([
-            ('document_type', '=', self.ncf_document_type),
-            ('company_id', '=', self.company_id.id),
-            ('state', '=', 'active'),
-        ], limit=1)
+        sequence = NCFSequence._get_active_sequence(self.company_id.id, self.ncf_document_type)
         
         if not sequence:
             raise UserError(_(
@@ -251,61 +394,105 @@ class AccountMove(models.Model):
         
         _logger.info(f"NCF {ncf_number} prepared for assignment to invoice {self.name or 'new'} via onchange")
     
-    @api.model
-    def create(self, vals):
+    @api.model_create_multi
+    def create(self, vals_list):
         """Override create to handle NCF assignment."""
-        # Create the record first
-        record = super(AccountMove, self).create(vals)
+        for vals in vals_list:
+            self._normalize_supplier_ncf_vals(vals)
         
-        # Handle NCF assignment if needed
-        if (record.requires_ncf and record.ncf_document_type and 
-            not record.ncf_assignment_id and record.state == 'draft'):
-            try:
-                record._assign_ncf()
-            except Exception as e:
-                _logger.warning(f"Could not auto-assign NCF during creation: {str(e)}")
-                # Don't fail the creation, just log the warning
+        # Create the records first
+        records = super(AccountMove, self).create(vals_list)
         
-        return record
+        # Handle NCF assignment in one pass per sequence
+        records._auto_assign_ncf('creation')
+        
+        return records
     
     def write(self, vals):
         """Override write to handle NCF assignment."""
+        self._normalize_supplier_ncf_vals(vals)
         result = super(AccountMove, self).write(vals)
         
         # Handle NCF assignment if document type changed
         if 'ncf_document_type' in vals:
-            for record in self:
-                if (record.requires_ncf and record.ncf_document_type and 
-                    not record.ncf_assignment_id and record.state == 'draft'):
-                    try:
-                        record._assign_ncf()
-                    except Exception as e:
-                        _logger.warning(f"Could not auto-assign NCF during write: {str(e)}")
+            self._auto_assign_ncf('write')
         
         return result
     
+    @api.model
+    def _normalize_supplier_ncf_vals(self, vals):
+        if vals.get('supplier_ncf'):
+            vals['supplier_ncf'] = normalize_ncf(vals['supplier_ncf'])
+    
+    @api.onchange('ref')
+    def _onchange_ref_supplier_ncf(self):
+        """Take the supplier NCF from a reference typed as an NCF."""
+        for move in self:
+            if move.is_purchase_document() and not move.supplier_ncf:
+                ncf = normalize_ncf(move.ref)
+                if SUPPLIER_NCF_RE.fullmatch(ncf):
+                    move.supplier_ncf = ncf
+    
+    def _auto_assign_ncf(self, operation):
+        """Assign NCFs to draft invoices that need one, without failing.
+        
+        Failures are reported on each invoice's chatter; the create or
+        write itself goes on.
+        """
+        moves = self.filtered(
+            lambda m: m.requires_ncf and m.ncf_document_type
+            and not m.ncf_assignment_id and m.state == 'draft'
+        )
+        failures = moves._assign_ncf_batch()
+        if failures:
+            # Don't fail the operation, just report it per invoice
+            for move_id, error in failures.items():
+                _logger.warning(f"Could not auto-assign NCF to invoice {move_id} during {operation}: {error}")
+            self.browse(list(failures))._message_log_batch(bodies={
+                move_id: _('Could not auto-assign NCF: %s. Please assign manually.') % error
+                for move_id, error in failures.items()
+            })
+        return failures
+    
     def action_post(self):
         """Override to auto-assign NCF on posting."""
         # First, call the parent method
         result = super(AccountMove, self).action_post()
         
-        # Then handle NCF assignment for invoices that require it
-        for move in self:
-            if move.requires_ncf and not move.ncf_assignment_id:
-                if move.ncf_document_type:
-                    try:
-                        move._assign_ncf()
-                    except Exception as e:
-                        _logger.warning(f"Could not auto-assign NCF to invoice {move.name}: {str(e)}")
-                        # Don't prevent posting if NCF assignment fails
-                        # User can manually assign later
-                        move.message_post(
-                            body=_('Could not auto-assign NCF: %s. Please assign manually.') % str(e),
-                            message_type='notification'
-                        )
+        # Then handle NCF assignment for invoices that require it,
+        # one block allocation per (company, document type)
+        moves_to_assign = self.filtered(
+            lambda m: m.requires_ncf and not m.ncf_assignment_id and m.ncf_document_type
+        )
+        failures = moves_to_assign._assign_ncf_batch()
+        if failures:
+            _logger.warning(f"Could not auto-assign NCF to {len(failures)} invoices")
+            # Don't prevent posting if NCF assignment fails
+            # User can manually assign later
+            self.browse(list(failures))._message_log_batch(bodies={
+                move_id: _('Could not auto-assign NCF: %s. Please assign manually.') % error
+                for move_id, error in failures.items()
+            })
         
         return result
     
+    def _post(self, soft=True):
+        # Every posting path (action_post, auto-post cron, payments, API)
+        # goes through _post: queue the fiscal cube slices here
+        posted = super()._post(soft=soft)
+        self.env['ncf.fiscal.cube']._mark_dirty(posted)
+        return posted
+    
+    def button_draft(self):
+        result = super().button_draft()
+        self.env['ncf.fiscal.cube']._mark_dirty(self)
+        return result
+    
+    def button_cancel(self):
+        result = super().button_cancel()
+        self.env['ncf.fiscal.cube']._mark_dirty(self)
+        return result
+    
     def _check_ncf_required(self):
         """Validate that posted invoices have NCF when required."""
         for move in self:
@@ -318,6 +505,8 @@ class AccountMove(models.Model):
     
     def unlink(self):
         """Override to handle NCF assignment deletion."""
+        self.env['ncf.fiscal.cube']._mark_dirty(self)
+        
         # Delete related NCF assignments first
         ncf_assignments = self.mapped('ncf_assignment_id')
         if ncf_assignments:
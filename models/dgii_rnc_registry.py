@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, api, _
+from odoo.exceptions import UserError
+from odoo.tools import config
+from ..tools.rnc_registry import RNCRegistry, compile_registry, normalize_vat
+from ..tools.vat_validation import VAT_STATUS_VALID, check_vats
+import logging
+import os
+
+_logger = logging.getLogger(__name__)
+
+VAT_STATUS_SELECTION = [
+    ('registered', 'Registered'),
+    ('inactive', 'Inactive'),
+    ('not_found', 'Not in DGII Registry'),
+    ('invalid', 'Invalid RNC/Cédula'),
+]
+
+# Mapped indexes of this process, by path
+_registries = {}
+
+
+class DGIIRNCRegistry(models.AbstractModel):
+    _name = 'dgii.rnc.registry'
+    _description = 'DGII Taxpayer Registry'
+
+    @api.model
+    def _get_index_path(self):
+        """Index of the registry, in the filestore of the database."""
+        return os.path.join(config.filestore(self.env.cr.dbname), 'dgii_rnc', 'DGII_RNC.idx')
+
+    @api.model
+    def _get_registry(self):
+        """Mapped registry index, or None until a registry file was imported."""
+        path = self._get_index_path()
+        registry = _registries.get(path)
+        if registry is None:
+            if not os.path.exists(path):
+                return None
+            registry = _registries[path] = RNCRegistry(path)
+        else:
+            registry.refresh()
+        return registry
+
+    @api.model
+    def _lookup(self, vat):
+        """(name, status) registered at DGII for ``vat``, or None."""
+        registry = self._get_registry()
+        return registry and registry.lookup(normalize_vat(vat))
+
+    @api.model
+    def _get_vat_statuses(self, vats):
+        """Status of each VAT: invalid when its format or check digit is
+        wrong, else its status in the registry.
+
+        :return: dict {vat: status}, without the valid VATs when no registry
+                 was imported
+        """
+        vats = list({vat for vat in vats if vat})
+        registry = self._get_registry()
+        statuses = {}
+        for vat, check in zip(vats, check_vats(vats)):
+            if check != VAT_STATUS_VALID:
+                statuses[vat] = 'invalid'
+            elif registry is not None:
+                statuses[vat] = registry.get_status(vat)
+        return statuses
+
+    @api.model
+    def _import_registry(self, lines):
+        """Compile DGII_RNC.TXT lines into the index, replacing the current one.
+
+        :return: number of taxpayers imported
+        """
+        try:
+            count = compile_registry(lines, self._get_index_path())
+        except ValueError:
+            raise UserError(_('The file does not contain any RNC or cédula.'))
+        # Pick the new index up right away in this process
+        _registries.pop(self._get_index_path(), None)
+        _logger.info(f"DGII RNC registry imported: {count} taxpayers")
+        return count
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, api
+import hashlib
+import io
+import mimetypes
+import os
+import shutil
+
+
+class IrAttachment(models.Model):
+    _inherit = 'ir.attachment'
+
+    # Bytes read at once when streaming a file into or out of the filestore
+    _STREAM_CHUNK_SIZE = 1024 * 1024
+
+    @api.model
+    def _get_file_checksum(self, file):
+        """(sha1 checksum, size) of a binary file object, read in chunks."""
+        sha = hashlib.sha1()
+        size = 0
+        file.seek(0)
+        for chunk in iter(lambda: file.read(self._STREAM_CHUNK_SIZE), b''):
+            sha.update(chunk)
+            size += len(chunk)
+        return sha.hexdigest(), size
+
+    @api.model
+    def _create_from_file(self, file, vals):
+        """Create an attachment from a binary file object.
+
+        With filestore storage the content is hashed and copied in chunks,
+        never loaded in memory as a whole. Database storage keeps the
+        content in a single column, so it is read at once there.
+        """
+        if self._storage() != 'file':
+            file.seek(0)
+            return self.create(dict(vals, raw=file.read()))
+
+        checksum, size = self._get_file_checksum(file)
+        fname, full_path = self._get_path(b'', checksum)
+        if not os.path.exists(full_path):
+            file.seek(0)
+            with open(full_path, 'wb') as target:
+                shutil.copyfileobj(file, target, self._STREAM_CHUNK_SIZE)
+            # Remove the file if the transaction aborts
+            self._mark_for_gc(fname)
+
+        attachment = self.create(dict(
+            vals,
+            mimetype=vals.get('mimetype') or mimetypes.guess_type(vals['name'])[0] or 'application/octet-stream',
+        ))
+        # create() ignores the content columns, they follow the filestore file
+        self.env.cr.execute("""
+            UPDATE ir_attachment
+               SET store_fname = %s, file_size = %s, checksum = %s
+             WHERE id = %s
+        """, (fname, size, checksum, attachment.id))
+        attachment.invalidate_recordset(['store_fname', 'file_size', 'checksum', 'raw', 'datas', 'db_datas'])
+        return attachment
+
+    def _open_file(self):
+        """Binary file object with the content of the attachment."""
+        self.ensure_one()
+        if self.store_fname:
+            return open(self._full_path(self.store_fname), 'rb')
+        return io.BytesIO(self.raw or b'')
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class NCFAllocationJournal(models.Model):
+    _name = 'ncf.allocation.journal'
+    _description = 'NCF Allocation Journal'
+    _order = 'id desc'
+    _log_access = False
+
+    sequence_id = fields.Many2one(
+        'ncf.sequence',
+        string='NCF Sequence',
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete='cascade'
+    )
+    
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        readonly=True
+    )
+    
+    first_number = fields.Integer(
+        string='First Number',
+        required=True,
+        readonly=True
+    )
+    
+    last_number = fields.Integer(
+        string='Last Number',
+        required=True,
+        readonly=True
+    )
+    
+    quantity = fields.Integer(
+        string='Quantity',
+        required=True,
+        readonly=True
+    )
+    
+    allocation_date = fields.Datetime(
+        string='Allocation Date',
+        required=True,
+        readonly=True,
+        default=fields.Datetime.now
+    )
+    
+    digested = fields.Boolean(
+        string='Digested',
+        readonly=True,
+        index=True,
+        help='Already summarized in the sequence chatter digest'
+    )
+    
+    def write(self, vals):
+        raise UserError(_('NCF allocation journal entries cannot be modified.'))
+    
+    def unlink(self):
+        raise UserError(_('NCF allocation journal entries cannot be deleted.'))
+    
+    @api.model
+    def _log_allocation(self, sequence, first_number, quantity):
+        """Append an allocated block to the journal (one INSERT, no ORM overhead)."""
+        self.env.cr.execute("""
+            INSERT INTO ncf_allocation_journal
+                   (sequence_id, company_id, first_number, last_number,
+                    quantity, allocation_date, digested)
+            VALUES (%s, %s, %s, %s, %s, (now() at time zone 'UTC'), false)
+        """, (sequence.id, sequence.company_id.id, first_number,
+              first_number + quantity - 1, quantity))
+    
+    @api.model
+    def _cron_post_allocation_digest(self):
+        """Cron job posting one summarized chatter message per sequence."""
+        self.env.cr.execute("SELECT max(id) FROM ncf_allocation_journal WHERE NOT digested")
+        max_id = self.env.cr.fetchone()[0]
+        if not max_id:
+            return
+        
+        self.env.cr.execute("""
+            SELECT sequence_id, count(*), sum(quantity),
+                   min(first_number), max(last_number),
+                   min(allocation_date), max(allocation_date)
+              FROM ncf_allocation_journal
+             WHERE NOT digested AND id <= %s
+          GROUP BY sequence_id
+        """, (max_id,))
+        rows = self.env.cr.fetchall()
+        
+        sequences = self.env['ncf.sequence'].browse([row[0] for row in rows])
+        for sequence, row in zip(sequences, rows):
+            _sequence_id, blocks, quantity, first, last, date_from, date_to = row
+            sequence.message_post(
+                body=_('%(quantity)d NCFs allocated in %(blocks)d blocks (%(first)s to %(last)s) between %(date_from)s and %(date_to)s') % {
+                    'quantity': quantity,
+                    'blocks': blocks,
+                    'first': sequence._format_ncf(first),
+                    'last': sequence._format_ncf(last),
+                    'date_from': date_from,
+                    'date_to': date_to,
+                },
+                message_type='notification'
+            )
+        
+        self.env.cr.execute("""
+            UPDATE ncf_allocation_journal
+               SET digested = true
+             WHERE NOT digested AND id <= %s
+        """, (max_id,))
+        self.invalidate_model(['digested'])
+        _logger.info(f"Posted NCF allocation digest for {len(rows)} sequences")
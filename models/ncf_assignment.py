@@ -2,6 +2,7 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError, UserError
+from odoo.tools.sql import create_index
 import logging
 
 _logger = logging.getLogger(__name__)
@@ -14,6 +15,14 @@ class NCFAssignment(models.Model):
     _order = 'assignment_date desc, ncf_number desc'
     _rec_name = 'ncf_number'
 
+    # Uniqueness is enforced by the database, no per-record search on create
+    _sql_constraints = [
+        ('ncf_number_company_uniq', 'unique(ncf_number, company_id)',
+         'This NCF number is already assigned to another invoice.'),
+        ('invoice_uniq', 'unique(invoice_id)',
+         'This invoice already has an NCF assignment.'),
+    ]
+
     # Basic Information
     ncf_number = fields.Char(
         string='NCF Number',
@@ -71,6 +80,12 @@ class NCFAssignment(models.Model):
         store=True
     )
     
+    invoice_move_type = fields.Selection(
+        related='invoice_id.move_type',
+        string='Invoice Type',
+        store=True
+    )
+    
     invoice_amount = fields.Monetary(
         related='invoice_id.amount_total',
         string='Invoice Amount',
@@ -88,6 +103,25 @@ class NCFAssignment(models.Model):
         store=True
     )
     
+    def init(self):
+        # DGII 606 domain: company, posted invoices, assignment date range,
+        # rows read in (assignment_date, ncf_number) order
+        create_index(
+            self.env.cr, 'ncf_assignment_dgii_606_idx', self._table,
+            ['company_id', 'assignment_date', 'ncf_number'],
+            where="invoice_state = 'posted'"
+        )
+        # Default _order (scanned backwards for assignment_date desc, ncf_number desc)
+        create_index(
+            self.env.cr, 'ncf_assignment_order_idx', self._table,
+            ['assignment_date', 'ncf_number']
+        )
+        # Integrity audit: numbers of each sequence in NCF order
+        create_index(
+            self.env.cr, 'ncf_assignment_audit_idx', self._table,
+            ['sequence_id', 'ncf_number']
+        )
+    
     @api.constrains('ncf_number')
     def _check_ncf_format(self):
         """Validate NCF number format."""
@@ -105,33 +139,6 @@ class NCFAssignment(models.Model):
             if not number.isdigit():
                 raise ValidationError(_('NCF number part must be 8 digits.'))
     
-    @api.constrains('ncf_number', 'company_id')
-    def _check_unique_ncf(self):
-        """Ensure NCF numbers are unique per company."""
-        for record in self:
-            existing = self.search([
-                ('ncf_number', '=', record.ncf_number),
-                ('company_id', '=', record.company_id.id),
-                ('id', '!=', record.id)
-            ])
-            if existing:
-                raise ValidationError(_(
-                    'NCF number %s is already assigned to another invoice.'
-                ) % record.ncf_number)
-    
-    @api.constrains('invoice_id')
-    def _check_unique_invoice(self):
-        """Ensure each invoice has only one NCF assignment."""
-        for record in self:
-            existing = self.search([
-                ('invoice_id', '=', record.invoice_id.id),
-                ('id', '!=', record.id)
-            ])
-            if existing:
-                raise ValidationError(_(
-                    'Invoice %s already has an NCF assignment.'
-                ) % record.invoice_id.name)
-    
     def name_get(self):
         """Custom name display."""
         result = []
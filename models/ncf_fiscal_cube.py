@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.tools.sql import create_index
+import logging
+
+_logger = logging.getLogger(__name__)
+
+_CUBE_MOVE_TYPES = ('out_invoice', 'out_refund', 'in_invoice', 'in_refund')
+
+
+class NCFFiscalCubeDirty(models.Model):
+    _name = 'ncf.fiscal.cube.dirty'
+    _description = 'NCF Fiscal Cube Slice To Refresh'
+    _log_access = False
+
+    # A slice may be queued several times: each posting queues it again,
+    # so that one committed during a refresh is not lost
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        ondelete='cascade'
+    )
+    
+    period = fields.Date(
+        string='Period',
+        required=True
+    )
+
+
+class NCFFiscalCube(models.Model):
+    _name = 'ncf.fiscal.cube'
+    _description = 'NCF Monthly Fiscal Cube'
+    _order = 'period desc, company_id, move_type, document_type'
+    _log_access = False
+
+    # Key
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        readonly=True,
+        ondelete='cascade'
+    )
+    
+    period = fields.Date(
+        string='Period',
+        required=True,
+        readonly=True,
+        help='First day of the month'
+    )
+    
+    move_type = fields.Selection([
+        ('out_invoice', 'Customer Invoice'),
+        ('out_refund', 'Customer Credit Note'),
+        ('in_invoice', 'Vendor Bill'),
+        ('in_refund', 'Vendor Credit Note'),
+    ], string='Move Type', required=True, readonly=True)
+    
+    document_type = fields.Selection(
+        selection=lambda self: self.env['account.move']._fields['ncf_document_type'].selection,
+        string='NCF Document Type',
+        readonly=True
+    )
+    
+    currency_id = fields.Many2one(
+        'res.currency',
+        string='Currency',
+        required=True,
+        readonly=True
+    )
+    
+    company_currency_id = fields.Many2one(
+        related='company_id.currency_id',
+        string='Company Currency'
+    )
+    
+    # Measures
+    move_count = fields.Integer(
+        string='# Documents',
+        readonly=True
+    )
+    
+    amount_untaxed = fields.Monetary(
+        string='Subtotal',
+        readonly=True
+    )
+    
+    amount_tax = fields.Monetary(
+        string='Tax',
+        readonly=True
+    )
+    
+    amount_total = fields.Monetary(
+        string='Total',
+        readonly=True
+    )
+    
+    amount_total_signed = fields.Monetary(
+        string='Total Signed (Company Currency)',
+        currency_field='company_currency_id',
+        readonly=True
+    )
+    
+    def init(self):
+        create_index(
+            self.env.cr, 'ncf_fiscal_cube_slice_idx', self._table,
+            ['company_id', 'period']
+        )
+        # First install: queue every month having invoices
+        self.env.cr.execute("""
+            INSERT INTO ncf_fiscal_cube_dirty (company_id, period)
+            SELECT DISTINCT company_id, date_trunc('month', invoice_date)::date
+              FROM account_move
+             WHERE state = 'posted'
+               AND move_type IN %s
+               AND invoice_date IS NOT NULL
+               AND NOT EXISTS (SELECT 1 FROM ncf_fiscal_cube)
+        """, (_CUBE_MOVE_TYPES,))
+    
+    @api.model
+    def _mark_dirty(self, moves):
+        """Queue the (company, month) slices of ``moves`` for a refresh.
+        
+        The slices are always queued, even when already waiting: a refresh
+        running concurrently only consumes the entries it could see. The
+        refresh cron is triggered when a slice was not waiting yet, so the
+        cube catches up in the background shortly after.
+        """
+        if not moves:
+            return
+        moves.flush_recordset(['company_id', 'invoice_date'])
+        self.env.cr.execute("""
+            WITH slices AS (
+                SELECT DISTINCT company_id, date_trunc('month', invoice_date)::date AS period
+                  FROM account_move
+                 WHERE id IN %s
+                   AND move_type IN %s
+                   AND invoice_date IS NOT NULL
+            ),
+            queued AS (
+                INSERT INTO ncf_fiscal_cube_dirty (company_id, period)
+                SELECT company_id, period FROM slices
+            )
+            -- Slices that were not waiting before this statement
+            SELECT count(*)
+              FROM slices
+             WHERE NOT EXISTS (
+                   SELECT 1 FROM ncf_fiscal_cube_dirty dirty
+                    WHERE dirty.company_id = slices.company_id
+                      AND dirty.period = slices.period
+             )
+        """, (tuple(moves.ids), _CUBE_MOVE_TYPES))
+        if self.env.cr.fetchone()[0]:
+            self.env.ref(f'{self._module}.ir_cron_ncf_fiscal_cube_refresh').sudo()._trigger()
+    
+    @api.model
+    def _refresh(self):
+        """Rebuild the queued slices from the posted invoices.
+        
+        Each slice is one month of one company, so the cost follows the
+        number of slices touched since the last refresh, not the history.
+        
+        The queue entries are consumed first, and only those this
+        transaction sees: a posting committed after its snapshot queued
+        its own entry, which stays for the next refresh.
+        """
+        self.env['account.move'].flush_model()
+        cr = self.env.cr
+        cr.execute("DELETE FROM ncf_fiscal_cube_dirty RETURNING company_id, period")
+        slices = set(cr.fetchall())
+        if not slices:
+            return 0
+        company_ids, periods = (list(values) for values in zip(*slices))
+        
+        cr.execute("""
+            DELETE FROM ncf_fiscal_cube cube
+             USING unnest(%s::int[], %s::date[]) AS dirty(company_id, period)
+             WHERE cube.company_id = dirty.company_id
+               AND cube.period = dirty.period
+        """, (company_ids, periods))
+        cr.execute("""
+            INSERT INTO ncf_fiscal_cube
+                   (company_id, period, move_type, document_type, currency_id,
+                    move_count, amount_untaxed, amount_tax, amount_total, amount_total_signed)
+            SELECT move.company_id, dirty.period, move.move_type, move.ncf_document_type, move.currency_id,
+                   count(*), sum(move.amount_untaxed), sum(move.amount_tax),
+                   sum(move.amount_total), sum(move.amount_total_signed)
+              FROM unnest(%s::int[], %s::date[]) AS dirty(company_id, period)
+              JOIN account_move move
+                ON move.company_id = dirty.company_id
+               AND move.invoice_date >= dirty.period
+               AND move.invoice_date < dirty.period + interval '1 month'
+             WHERE move.state = 'posted'
+               AND move.move_type IN %s
+          GROUP BY move.company_id, dirty.period, move.move_type, move.ncf_document_type, move.currency_id
+        """, (company_ids, periods, _CUBE_MOVE_TYPES))
+        self.invalidate_model()
+        _logger.info(f"Refreshed {len(slices)} NCF fiscal cube slices")
+        return len(slices)
+    
+    @api.model
+    def _cron_refresh(self):
+        """Cron job refreshing the slices queued by posting events."""
+        self._refresh()
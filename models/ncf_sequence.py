@@ -1,12 +1,19 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import ValidationError, UserError
-from datetime import date, timedelta
+from collections import Counter
+from datetime import date
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# Per-process counters of the active sequence resolver cache
+_resolver_stats = Counter()
+
+# Fields that change which sequence is the active one of a (company, type)
+_RESOLVER_FIELDS = {'state', 'company_id', 'document_type', 'prefix', 'start_date'}
+
 
 class NCFSequence(models.Model):
     _name = 'ncf.sequence'
@@ -15,6 +22,16 @@ class NCFSequence(models.Model):
     _order = 'prefix, document_type, start_date desc'
     _rec_name = 'display_name'
 
+    # Partial uniqueness (only open sequences) as an exclusion constraint on a
+    # btree index, so the database rejects duplicates with a friendly message
+    _sql_constraints = [
+        ('prefix_type_company_open_uniq',
+         "EXCLUDE USING btree (prefix WITH =, document_type WITH =, company_id WITH =) "
+         "WHERE (state IN ('active', 'inactive'))",
+         'An active or inactive sequence with this prefix and document type '
+         'already exists for this company.'),
+    ]
+
     # Basic Information
     prefix = fields.Char(
         string='NCF Prefix',
@@ -80,6 +97,12 @@ class NCFSequence(models.Model):
         ('depleted', 'Depleted'),
     ], string='State', default='active', tracking=True)
     
+    auto_activate = fields.Boolean(
+        string='Activate on Start Date',
+        copy=False,
+        help='Activate this inactive sequence automatically once its start date arrives'
+    )
+    
     company_id = fields.Many2one(
         'res.company',
         string='Company',
@@ -87,6 +110,14 @@ class NCFSequence(models.Model):
         default=lambda self: self.env.company
     )
     
+    allocation_mode = fields.Selection([
+        ('standard', 'Standard'),
+        ('high_throughput', 'High Throughput'),
+    ], string='Allocation Mode', required=True, default='standard', tracking=True,
+       help='High Throughput records allocations in a compact journal instead of '
+            'posting a chatter message on every invoice; a periodic digest is '
+            'posted on the sequence instead.')
+    
     # Computed Fields
     display_name = fields.Char(
         string='Display Name',
@@ -94,39 +125,41 @@ class NCFSequence(models.Model):
         store=True
     )
     
+    # Usage counters are derived from the range on read, so allocating a
+    # number only writes current_number
     available_numbers = fields.Integer(
         string='Available Numbers',
-        compute='_compute_statistics',
-        store=True
+        compute='_compute_usage_statistics',
+        search='_search_available_numbers'
     )
     
     used_numbers = fields.Integer(
         string='Used Numbers',
-        compute='_compute_statistics',
-        store=True
+        compute='_compute_usage_statistics',
+        search='_search_used_numbers'
     )
     
     percentage_used = fields.Float(
         string='Percentage Used',
-        compute='_compute_statistics',
-        store=True
+        compute='_compute_usage_statistics',
+        search='_search_percentage_used'
+    )
+    
+    is_low_availability = fields.Boolean(
+        string='Low Availability',
+        compute='_compute_usage_statistics',
+        search='_search_is_low_availability'
     )
     
     days_to_expiry = fields.Integer(
         string='Days to Expiry',
-        compute='_compute_statistics',
+        compute='_compute_expiry_statistics',
         store=True
     )
     
     is_expiring_soon = fields.Boolean(
         string='Expiring Soon',
-        compute='_compute_statistics',
-        store=True
-    )
-    
-    is_low_availability = fields.Boolean(
-        string='Low Availability',
-        compute='_compute_statistics',
+        compute='_compute_expiry_statistics',
         store=True
     )
     
@@ -138,6 +171,28 @@ class NCFSequence(models.Model):
         readonly=True
     )
     
+    allocation_journal_ids = fields.One2many(
+        'ncf.allocation.journal',
+        'sequence_id',
+        string='Allocation Journal',
+        readonly=True
+    )
+    
+    # Integrity Audit
+    last_audit_id = fields.Many2one(
+        'ncf.sequence.audit',
+        string='Last Audit',
+        readonly=True,
+        copy=False
+    )
+    
+    audit_issue_count = fields.Integer(
+        string='Audit Issues',
+        readonly=True,
+        copy=False,
+        help='Missing, duplicated and out of range numbers found by the last audit'
+    )
+    
     @api.depends('prefix', 'document_type')
     def _compute_display_name(self):
         for record in self:
@@ -145,8 +200,9 @@ class NCFSequence(models.Model):
             doc_type_name = doc_type_dict.get(record.document_type, record.document_type)
             record.display_name = f"{record.prefix} - {doc_type_name}"
     
-    @api.depends('current_number', 'start_number', 'end_number', 'expiry_date', 'state')
-    def _compute_statistics(self):
+    @api.depends('current_number', 'start_number', 'end_number', 'state',
+                 'company_id.ncf_low_availability_threshold')
+    def _compute_usage_statistics(self):
         for record in self:
             total_numbers = record.end_number - record.start_number + 1
             used = max(0, record.current_number - record.start_number)
@@ -156,21 +212,72 @@ class NCFSequence(models.Model):
             record.used_numbers = used
             record.percentage_used = (used / total_numbers * 100) if total_numbers > 0 else 0
             
+            # Alert conditions
+            record.is_low_availability = (
+                record.state == 'active' and 
+                record.percentage_used >= record.company_id.ncf_low_availability_threshold
+            )
+    
+    @api.depends('expiry_date', 'state', 'company_id.ncf_expiry_alert_days')
+    def _compute_expiry_statistics(self):
+        today = fields.Date.today()
+        for record in self:
             # Days to expiry
-            today = fields.Date.today()
             record.days_to_expiry = (record.expiry_date - today).days if record.expiry_date else 0
             
             # Alert conditions
             record.is_expiring_soon = (
                 record.state == 'active' and 
-                0 <= record.days_to_expiry <= 30
-            )
-            
-            record.is_low_availability = (
-                record.state == 'active' and 
-                record.percentage_used >= 90
+                0 <= record.days_to_expiry <= record.company_id.ncf_expiry_alert_days
             )
     
+    # SQL counterparts of the usage counters, used to search and filter on them
+    _USAGE_STATISTICS_SQL = {
+        'available_numbers': "GREATEST(0, end_number - current_number + 1)",
+        'used_numbers': "GREATEST(0, current_number - start_number)",
+        'percentage_used': """CASE WHEN end_number >= start_number
+                                   THEN GREATEST(0, current_number - start_number) * 100.0
+                                        / (end_number - start_number + 1)
+                                   ELSE 0 END""",
+    }
+    
+    def _search_usage_statistic(self, fname, operator, value):
+        """Resolve a domain on a usage counter with one SQL query over the ranges."""
+        if operator not in ('=', '!=', '<', '<=', '>', '>='):
+            raise UserError(_('Operation not supported on %s.') % self._fields[fname].string)
+        
+        self.flush_model(['current_number', 'start_number', 'end_number'])
+        self.env.cr.execute(
+            f"SELECT id FROM ncf_sequence WHERE {self._USAGE_STATISTICS_SQL[fname]} {operator} %s",
+            (value or 0,)
+        )
+        return [('id', 'in', [row[0] for row in self.env.cr.fetchall()])]
+    
+    def _search_available_numbers(self, operator, value):
+        return self._search_usage_statistic('available_numbers', operator, value)
+    
+    def _search_used_numbers(self, operator, value):
+        return self._search_usage_statistic('used_numbers', operator, value)
+    
+    def _search_percentage_used(self, operator, value):
+        return self._search_usage_statistic('percentage_used', operator, value)
+    
+    def _search_is_low_availability(self, operator, value):
+        if operator not in ('=', '!='):
+            raise UserError(_('Operation not supported on %s.') % self._fields['is_low_availability'].string)
+        
+        self.flush_model(['current_number', 'start_number', 'end_number', 'state', 'company_id'])
+        self.env['res.company'].flush_model(['ncf_low_availability_threshold'])
+        self.env.cr.execute(f"""
+            SELECT sequence.id FROM ncf_sequence sequence
+              JOIN res_company company ON company.id = sequence.company_id
+             WHERE sequence.state = 'active'
+               AND {self._USAGE_STATISTICS_SQL['percentage_used']} >= company.ncf_low_availability_threshold
+        """)
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        positive = (operator == '=') == bool(value)
+        return [('id', 'in' if positive else 'not in', ids)]
+    
     @api.constrains('prefix')
     def _check_prefix_format(self):
         for record in self:
@@ -195,21 +302,6 @@ class NCFSequence(models.Model):
             if record.start_date >= record.expiry_date:
                 raise ValidationError(_('Expiry date must be after start date.'))
     
-    @api.constrains('prefix', 'document_type', 'company_id')
-    def _check_unique_sequence(self):
-        for record in self:
-            existing = self.search([
-                ('prefix', '=', record.prefix),
-                ('document_type', '=', record.document_type),
-                ('company_id', '=', record.company_id.id),
-                ('id', '!=', record.id),
-                ('state', 'in', ['active', 'inactive'])
-            ])
-            if existing:
-                raise ValidationError(_(
-                    'A sequence with prefix "%s" and document type "%s" already exists for this company.'
-                ) % (record.prefix, record.document_type))
-    
     def action_reactivate(self):
         """Reactivate sequence if conditions are met."""
         for record in self:
@@ -231,6 +323,44 @@ class NCFSequence(models.Model):
             else:
                 raise UserError(_('Can only deactivate active sequences.'))
     
+    def action_audit_integrity(self):
+        """Audit the assigned numbers for gaps, duplicates and out of range numbers."""
+        audits = self.env['ncf.sequence.audit']._audit_sequences(self)
+        return audits.action_view_lines()
+    
+    def action_view_audits(self):
+        """Open the integrity audits of this sequence."""
+        self.ensure_one()
+        return {
+            'name': _('NCF Sequence Audits'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'ncf.sequence.audit',
+            'view_mode': 'tree,form',
+            'domain': [('sequence_id', '=', self.id)],
+        }
+    
+    @api.model
+    def _cron_audit_sequences(self):
+        """Cron job auditing the integrity of the sequences in use.
+        
+        Sequences that allocated no number since their last audit are
+        skipped, their last audit still covers the issued range.
+        """
+        self.flush_model(['state', 'start_number', 'end_number', 'current_number', 'last_audit_id'])
+        self.env['ncf.sequence.audit'].flush_model(['first_number', 'last_number'])
+        self.env.cr.execute("""
+            SELECT sequence.id FROM ncf_sequence sequence
+         LEFT JOIN ncf_sequence_audit audit ON audit.id = sequence.last_audit_id
+             WHERE sequence.state IN ('active', 'depleted')
+               AND (audit.id IS NULL
+                    OR audit.first_number != sequence.start_number
+                    OR audit.last_number != LEAST(sequence.current_number - 1, sequence.end_number))
+          ORDER BY sequence.id
+        """)
+        self.env['ncf.sequence.audit']._audit_sequences(
+            self.browse([row[0] for row in self.env.cr.fetchall()])
+        )
+    
     def action_ncf_assignment_from_sequence(self):
         """Open NCF assignments related to this sequence."""
         self.ensure_one()
@@ -243,44 +373,234 @@ class NCFSequence(models.Model):
             'context': {'default_sequence_id': self.id},
         }
     
+    @api.model_create_multi
+    def create(self, vals_list):
+        sequences = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return sequences
+    
+    def write(self, vals):
+        result = super().write(vals)
+        if _RESOLVER_FIELDS.intersection(vals):
+            self.env.registry.clear_cache()
+        return result
+    
+    def unlink(self):
+        result = super().unlink()
+        self.env.registry.clear_cache()
+        return result
+    
+    @api.model
+    def _get_active_sequence(self, company_id, document_type):
+        """Return the active sequence of a company for an NCF document type.
+        
+        Shared by the invoice onchange, manual assignment and posting paths;
+        the lookup is cached until a sequence is created, changed or deleted.
+        """
+        _resolver_stats['calls'] += 1
+        return self.browse(self._get_active_sequence_id(company_id, document_type))
+    
+    @tools.ormcache('company_id', 'document_type')
+    def _get_active_sequence_id(self, company_id, document_type):
+        _resolver_stats['misses'] += 1
+        return self.sudo().search([
+            ('document_type', '=', document_type),
+            ('company_id', '=', company_id),
+            ('state', '=', 'active'),
+        ], limit=1).id
+    
+    @api.model
+    def get_resolver_cache_stats(self):
+        """Hit and miss counters of the active sequence resolver (this process)."""
+        calls = _resolver_stats['calls']
+        misses = _resolver_stats['misses']
+        return {
+            'hits': calls - misses,
+            'misses': misses,
+            'hit_ratio': (calls - misses) / calls if calls else 0.0,
+        }
+    
     def get_next_ncf(self):
         """Get the next NCF number from this sequence."""
+        return self.allocate_block(1)[0]
+
+    def allocate_block(self, count, partial=False):
+        """Reserve ``count`` consecutive NCF numbers from this sequence.
+
+        The range is claimed with a single atomic ``UPDATE ... RETURNING``
+        that also checks state, expiry and depletion, so concurrent workers
+        never read the same ``current_number``:
+
+        * no duplicates: the sequence row is locked by the statement. Odoo
+          cursors run in REPEATABLE READ, so when another transaction
+          committed a claim on the row after this one started, the statement
+          fails with a serialization error rather than reading the new
+          value. The caller's transaction must then be retried as a whole,
+          which the server does for HTTP and RPC requests;
+        * no gaps on commit: the increment belongs to the caller's
+          transaction, a rollback releases the numbers together with the
+          invoices that would have used them.
+
+        By default the block is all or nothing: if fewer than ``count``
+        numbers remain, nothing is reserved. With ``partial``, the numbers
+        that remain are reserved (and the sequence depleted) when there are
+        fewer than ``count``.
+
+        :return: list of formatted NCF numbers, in order
+        """
         self.ensure_one()
-        
-        # Check if sequence is active
+        if count < 1:
+            return []
+
+        today = fields.Date.today()
+        self.flush_recordset()
+        self.env.cr.execute("""
+            WITH claim AS (
+                SELECT id, current_number AS first_number,
+                       LEAST(%(count)s, end_number - current_number + 1) AS quantity
+                  FROM ncf_sequence
+                 WHERE id = %(id)s
+                   AND state = 'active'
+                   AND expiry_date >= %(today)s
+                   AND current_number + %(minimum)s - 1 <= end_number
+                   FOR UPDATE
+            )
+            UPDATE ncf_sequence sequence
+               SET current_number = claim.first_number + claim.quantity,
+                   state = CASE WHEN claim.first_number + claim.quantity > sequence.end_number
+                                THEN 'depleted' ELSE sequence.state END
+              FROM claim
+             WHERE sequence.id = claim.id
+         RETURNING claim.first_number, claim.quantity, sequence.state
+        """, {'id': self.id, 'count': count, 'minimum': 1 if partial else count, 'today': today})
+        row = self.env.cr.fetchone()
+        self.invalidate_recordset(['current_number', 'state'])
+
+        if not row:
+            self._raise_allocation_error(today, count)
+
+        first_number, quantity, state = row
+        # Recompute the usage counters (and on depletion the stored expiry
+        # statistics) after the raw SQL update
+        self.modified(['current_number', 'state'] if state == 'depleted' else ['current_number'])
+        if state == 'depleted':
+            self.env.registry.clear_cache()
+
+        if self.allocation_mode == 'high_throughput':
+            self.env['ncf.allocation.journal']._log_allocation(self, first_number, quantity)
+
+        if state == 'depleted':
+            self.message_post(body=_('Sequence has been depleted'))
+
+        ncf_numbers = [
+            self._format_ncf(number)
+            for number in range(first_number, first_number + quantity)
+        ]
+        _logger.info(f"Generated NCF block {ncf_numbers[0]}-{ncf_numbers[-1]} from sequence {self.prefix}")
+        return ncf_numbers
+
+    def _format_ncf(self, number):
+        """Format a sequence number as a full NCF (prefix + 8 digits)."""
+        return f"{self.prefix}{number:08d}"
+
+    def _raise_allocation_error(self, today, count=1):
+        """Explain why the atomic allocation did not match the sequence."""
         if self.state != 'active':
             raise UserError(_('Sequence %s is not active.') % self.prefix)
-        
-        # Check expiry date
-        if self.expiry_date < fields.Date.today():
+
+        if self.expiry_date < today:
             self.state = 'expired'
             raise UserError(_('Sequence %s has expired.') % self.prefix)
-        
-        # Check if sequence is depleted
+
         if self.current_number > self.end_number:
             self.state = 'depleted'
             raise UserError(_('Sequence %s has been depleted.') % self.prefix)
+
+        raise UserError(_(
+            'Sequence %s only has %d numbers left, %d requested.'
+        ) % (self.prefix, self.end_number - self.current_number + 1, count))
+    
+    @api.model
+    def update_sequence_states(self):
+        """Cron job to refresh sequence states and date-dependent fields.
         
-        # Generate NCF number
-        ncf_number = f"{self.prefix}{self.current_number:08d}"
+        Works on all companies at once with a few set-based statements
+        instead of looping over records.
+        """
+        today = fields.Date.today()
+        self.flush_model()
+        cr = self.env.cr
         
-        # Update current number
-        self.current_number += 1
+        # Expire sequences past their expiry date
+        cr.execute("""
+            UPDATE ncf_sequence
+               SET state = 'expired', auto_activate = false
+             WHERE state IN ('active', 'inactive')
+               AND expiry_date < %s
+         RETURNING id
+        """, (today,))
+        expired_ids = [row[0] for row in cr.fetchall()]
         
-        # Update state if depleted
-        if self.current_number > self.end_number:
-            self.state = 'depleted'
-            self.message_post(body=_('Sequence has been depleted'))
+        # Deplete exhausted sequences
+        cr.execute("""
+            UPDATE ncf_sequence
+               SET state = 'depleted'
+             WHERE state = 'active'
+               AND current_number > end_number
+         RETURNING id
+        """)
+        depleted_ids = [row[0] for row in cr.fetchall()]
+        
+        # Activate scheduled sequences whose start date has arrived
+        cr.execute("""
+            UPDATE ncf_sequence
+               SET state = 'active', auto_activate = false
+             WHERE state = 'inactive'
+               AND auto_activate
+               AND start_date <= %s
+               AND current_number <= end_number
+         RETURNING id
+        """, (today,))
+        activated_ids = [row[0] for row in cr.fetchall()]
         
-        _logger.info(f"Generated NCF: {ncf_number} from sequence {self.prefix}")
-        return ncf_number
+        # Refresh date-derived columns, only where they changed
+        self.env['res.company'].flush_model(['ncf_expiry_alert_days'])
+        cr.execute("""
+            UPDATE ncf_sequence sequence
+               SET days_to_expiry = sequence.expiry_date - %(today)s,
+                   is_expiring_soon = (sequence.state = 'active'
+                                       AND sequence.expiry_date - %(today)s
+                                           BETWEEN 0 AND company.ncf_expiry_alert_days)
+              FROM res_company company
+             WHERE company.id = sequence.company_id
+               AND (sequence.days_to_expiry IS DISTINCT FROM sequence.expiry_date - %(today)s
+                    OR sequence.is_expiring_soon IS DISTINCT FROM (
+                        sequence.state = 'active'
+                        AND sequence.expiry_date - %(today)s BETWEEN 0 AND company.ncf_expiry_alert_days))
+        """, {'today': today})
+        
+        self.invalidate_model(['state', 'auto_activate', 'days_to_expiry', 'is_expiring_soon'])
+        if expired_ids or depleted_ids or activated_ids:
+            self.env.registry.clear_cache()
+        
+        for ids, message in [
+            (expired_ids, _('Sequence has expired')),
+            (depleted_ids, _('Sequence has been depleted')),
+            (activated_ids, _('Sequence activated on its start date')),
+        ]:
+            if ids:
+                self.browse(ids)._message_log_batch(bodies=dict.fromkeys(ids, message))
+        
+        _logger.info(
+            f"NCF sequence states updated: {len(expired_ids)} expired, "
+            f"{len(depleted_ids)} depleted, {len(activated_ids)} activated"
+        )
     
     @api.model
     def check_expiring_sequences(self):
         """Cron job to check for expiring sequences."""
         expiring_sequences = self.search([
-            ('state', '=', 'active'),
-            ('expiry_date', '<=', fields.Date.today() + timedelta(days=30)),
+            ('is_expiring_soon', '=', True),
             ('expiry_date', '>', fields.Date.today()),
         ])
         
@@ -293,10 +613,7 @@ class NCFSequence(models.Model):
     @api.model
     def check_low_availability_sequences(self):
         """Cron job to check for sequences with low availability."""
-        low_availability_sequences = self.search([
-            ('state', '=', 'active'),
-            ('percentage_used', '>=', 90),
-        ])
+        low_availability_sequences = self.search([('is_low_availability', '=', True)])
         
         for sequence in low_availability_sequences:
             sequence.message_post(
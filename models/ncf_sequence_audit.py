@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.tools import SQL
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class NCFSequenceAudit(models.Model):
+    _name = 'ncf.sequence.audit'
+    _description = 'NCF Sequence Integrity Audit'
+    _order = 'audit_date desc, id desc'
+    
+    # Days clean audits are kept, the last audit of a sequence is always kept
+    _AUDIT_RETENTION_DAYS = 90
+    
+    name = fields.Char(
+        string='Name',
+        compute='_compute_name'
+    )
+    
+    sequence_id = fields.Many2one(
+        'ncf.sequence',
+        string='NCF Sequence',
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete='cascade'
+    )
+    
+    company_id = fields.Many2one(
+        related='sequence_id.company_id',
+        string='Company',
+        store=True
+    )
+    
+    audit_date = fields.Datetime(
+        string='Audit Date',
+        required=True,
+        readonly=True,
+        default=fields.Datetime.now
+    )
+    
+    # Issued range at the time of the audit
+    first_number = fields.Integer(
+        string='First Number',
+        readonly=True
+    )
+    
+    last_number = fields.Integer(
+        string='Last Issued Number',
+        readonly=True
+    )
+    
+    assigned_count = fields.Integer(
+        string='Assigned NCFs',
+        readonly=True
+    )
+    
+    # Results
+    missing_count = fields.Integer(
+        string='Missing Numbers',
+        readonly=True
+    )
+    
+    duplicate_count = fields.Integer(
+        string='Duplicated Numbers',
+        readonly=True
+    )
+    
+    out_of_range_count = fields.Integer(
+        string='Out of Range Numbers',
+        readonly=True
+    )
+    
+    issue_count = fields.Integer(
+        string='Issues',
+        compute='_compute_issue_count'
+    )
+    
+    line_ids = fields.One2many(
+        'ncf.sequence.audit.line',
+        'audit_id',
+        string='Issues Found',
+        readonly=True
+    )
+    
+    @api.depends('sequence_id', 'audit_date')
+    def _compute_name(self):
+        for audit in self:
+            audit.name = f"{audit.sequence_id.prefix} {audit.audit_date}"
+    
+    @api.depends('missing_count', 'duplicate_count', 'out_of_range_count')
+    def _compute_issue_count(self):
+        for audit in self:
+            audit.issue_count = audit.missing_count + audit.duplicate_count + audit.out_of_range_count
+    
+    @api.model
+    def _audit_sequences(self, sequences):
+        """Audit the numbers assigned by ``sequences`` in one SQL pass.
+        
+        The assignments of each sequence are read in NCF order (served by
+        the ncf_assignment_audit_idx index) and compared to their neighbours
+        with window functions, so the cost grows linearly with the number of
+        assignments and nothing is loaded in Python:
+        
+        * gap: numbers of the issued range (start_number up to the last
+          issued number) that no assignment uses;
+        * duplicate: numbers assigned more than once;
+        * out of range: numbers outside the issued range, or with another
+          prefix than the sequence's.
+        
+        The issues are inserted as audit lines straight from the query.
+        
+        :return: new audits, one per sequence
+        """
+        if not sequences:
+            return self.browse()
+        
+        self.env.flush_all()
+        audits = self.create([{
+            'sequence_id': sequence.id,
+            'first_number': sequence.start_number,
+            'last_number': min(sequence.current_number - 1, sequence.end_number),
+        } for sequence in sequences])
+        audits.flush_recordset()
+        
+        self.env.cr.execute(SQL("""
+            WITH bounds AS (
+                SELECT audit.id AS audit_id, audit.sequence_id, sequence.prefix,
+                       audit.first_number AS low, audit.last_number AS high
+                  FROM ncf_sequence_audit audit
+                  JOIN ncf_sequence sequence ON sequence.id = audit.sequence_id
+                 WHERE audit.id IN %(audit_ids)s
+            ),
+            ordered AS (
+                SELECT audit_id, number, low, high,
+                       lag(number) OVER w AS previous_number,
+                       lead(number) OVER w AS next_number
+                  FROM (
+                      SELECT bounds.audit_id, assignment.sequence_id, assignment.ncf_number,
+                             substring(assignment.ncf_number FROM 4)::bigint AS number,
+                             bounds.low, bounds.high
+                        FROM ncf_assignment assignment
+                        JOIN bounds ON bounds.sequence_id = assignment.sequence_id
+                                   AND left(assignment.ncf_number, 3) = bounds.prefix
+                  ) numbers
+                WINDOW w AS (PARTITION BY sequence_id ORDER BY ncf_number)
+            ),
+            issues AS (
+                SELECT ordered.audit_id, issue.kind, issue.first_number, issue.last_number
+                  FROM ordered
+            CROSS JOIN LATERAL (VALUES
+                           -- Missing before this number, from the start of the range for the first one
+                           ('gap', GREATEST(COALESCE(previous_number, low - 1) + 1, low), LEAST(number - 1, high)),
+                           -- Missing after the last number, up to the last issued one
+                           ('gap', CASE WHEN next_number IS NULL THEN GREATEST(number + 1, low) END, high),
+                           ('duplicate', CASE WHEN number = previous_number THEN number END, number),
+                           ('out_of_range', CASE WHEN number NOT BETWEEN low AND high THEN number END, number)
+                       ) AS issue(kind, first_number, last_number)
+                 WHERE issue.first_number <= issue.last_number
+             UNION ALL
+                -- Assigned with the prefix of another sequence
+                SELECT bounds.audit_id, 'out_of_range',
+                       substring(assignment.ncf_number FROM 4)::bigint,
+                       substring(assignment.ncf_number FROM 4)::bigint
+                  FROM ncf_assignment assignment
+                  JOIN bounds ON bounds.sequence_id = assignment.sequence_id
+                             AND left(assignment.ncf_number, 3) != bounds.prefix
+             UNION ALL
+                -- Nothing assigned: the whole issued range is missing
+                SELECT bounds.audit_id, 'gap', bounds.low, bounds.high
+                  FROM bounds
+                 WHERE bounds.low <= bounds.high
+                   AND NOT EXISTS (
+                       SELECT 1 FROM ncf_assignment assignment
+                        WHERE assignment.sequence_id = bounds.sequence_id
+                          AND left(assignment.ncf_number, 3) = bounds.prefix
+                   )
+            )
+            INSERT INTO ncf_sequence_audit_line (audit_id, issue, first_number, last_number, number_count)
+            SELECT audit_id, kind, first_number, last_number,
+                   CASE kind WHEN 'gap' THEN last_number - first_number + 1
+                             WHEN 'duplicate' THEN count(*) + 1
+                             ELSE count(*) END
+              FROM issues
+          GROUP BY audit_id, kind, first_number, last_number
+        """, audit_ids=tuple(audits.ids)))
+        
+        # Totals of the audits, one grouped query
+        self.env.cr.execute(SQL("""
+            UPDATE ncf_sequence_audit audit
+               SET assigned_count = totals.assigned_count,
+                   missing_count = totals.missing_count,
+                   duplicate_count = totals.duplicate_count,
+                   out_of_range_count = totals.out_of_range_count
+              FROM (
+                  SELECT audit.id,
+                         (SELECT count(*) FROM ncf_assignment assignment
+                           WHERE assignment.sequence_id = audit.sequence_id) AS assigned_count,
+                         COALESCE(sum(line.number_count) FILTER (WHERE line.issue = 'gap'), 0) AS missing_count,
+                         COALESCE(sum(line.number_count - 1) FILTER (WHERE line.issue = 'duplicate'), 0) AS duplicate_count,
+                         COALESCE(sum(line.number_count) FILTER (WHERE line.issue = 'out_of_range'), 0) AS out_of_range_count
+                    FROM ncf_sequence_audit audit
+               LEFT JOIN ncf_sequence_audit_line line ON line.audit_id = audit.id
+                   WHERE audit.id IN %(audit_ids)s
+                GROUP BY audit.id
+              ) totals
+             WHERE audit.id = totals.id
+        """, audit_ids=tuple(audits.ids)))
+        audits.invalidate_recordset()
+        
+        for audit in audits:
+            audit.sequence_id.sudo().write({
+                'last_audit_id': audit.id,
+                'audit_issue_count': audit.issue_count,
+            })
+        _logger.info(
+            f"NCF sequence audit of {len(audits)} sequences: "
+            f"{sum(audits.mapped('issue_count'))} numbers with issues"
+        )
+        return audits
+    
+    @api.autovacuum
+    def _gc_clean_audits(self):
+        """Delete the old audits that found no issue, except the last one of each sequence."""
+        audits = self.search([
+            ('audit_date', '<', fields.Datetime.now() - timedelta(days=self._AUDIT_RETENTION_DAYS)),
+            ('missing_count', '=', 0),
+            ('duplicate_count', '=', 0),
+            ('out_of_range_count', '=', 0),
+        ])
+        last_audits = self.env['ncf.sequence'].search([('last_audit_id', 'in', audits.ids)]).last_audit_id
+        stale = audits - last_audits
+        stale.unlink()
+        _logger.info(f"Deleted {len(stale)} clean NCF sequence audits")
+    
+    def action_view_lines(self):
+        """Open the issues found by the audits."""
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('NCF Audit Issues'),
+            'res_model': 'ncf.sequence.audit.line',
+            'view_mode': 'tree,pivot',
+            'domain': [('audit_id', 'in', self.ids)],
+            'context': {'group_by': 'issue'},
+        }
+
+
+class NCFSequenceAuditLine(models.Model):
+    _name = 'ncf.sequence.audit.line'
+    _description = 'NCF Sequence Integrity Issue'
+    _order = 'audit_id, first_number, issue'
+    _log_access = False
+    
+    audit_id = fields.Many2one(
+        'ncf.sequence.audit',
+        string='Audit',
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete='cascade'
+    )
+    
+    sequence_id = fields.Many2one(
+        related='audit_id.sequence_id',
+        string='NCF Sequence'
+    )
+    
+    issue = fields.Selection([
+        ('gap', 'Missing'),
+        ('duplicate', 'Duplicated'),
+        ('out_of_range', 'Out of Range'),
+    ], string='Issue', required=True, readonly=True)
+    
+    first_number = fields.Integer(
+        string='From Number',
+        readonly=True
+    )
+    
+    last_number = fields.Integer(
+        string='To Number',
+        readonly=True
+    )
+    
+    number_count = fields.Integer(
+        string='Numbers',
+        readonly=True,
+        help='Missing numbers of the range, or times the number was assigned'
+    )
+    
+    first_ncf = fields.Char(
+        string='From NCF',
+        compute='_compute_ncf'
+    )
+    
+    last_ncf = fields.Char(
+        string='To NCF',
+        compute='_compute_ncf'
+    )
+    
+    @api.depends('audit_id.sequence_id.prefix', 'first_number', 'last_number')
+    def _compute_ncf(self):
+        for line in self:
+            sequence = line.audit_id.sequence_id
+            line.first_ncf = sequence._format_ncf(line.first_number)
+            line.last_ncf = sequence._format_ncf(line.last_number)
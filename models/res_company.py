@@ -2,6 +2,8 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
+from odoo.tools import SQL
+from ..tools.vat_validation import VAT_STATUS_INVALID, check_vats
 
 
 class ResCompany(models.Model):
@@ -46,6 +48,13 @@ class ResCompany(models.Model):
         help='Users who will receive NCF notifications'
     )
     
+    # DGII Report Jobs
+    dgii_report_job_limit = fields.Integer(
+        string='Concurrent DGII Report Jobs',
+        default=1,
+        help='Maximum number of DGII report background jobs running at the same time for this company'
+    )
+    
     @api.constrains('dgii_rnc')
     def _check_dgii_rnc(self):
         for record in self:
@@ -53,6 +62,10 @@ class ResCompany(models.Model):
                 raise ValidationError(_('RNC must contain only digits.'))
             if record.dgii_rnc and len(record.dgii_rnc) not in [9, 11]:
                 raise ValidationError(_('RNC must be 9 or 11 digits long.'))
+        companies = self.filtered('dgii_rnc')
+        for company, status in zip(companies, check_vats(companies.mapped('dgii_rnc'))):
+            if status == VAT_STATUS_INVALID:
+                raise ValidationError(_('RNC %s has an invalid check digit.') % company.dgii_rnc)
     
     @api.constrains('ncf_expiry_alert_days')
     def _check_expiry_alert_days(self):
@@ -66,24 +79,65 @@ class ResCompany(models.Model):
             if not (0 <= record.ncf_low_availability_threshold <= 100):
                 raise ValidationError(_('Low availability threshold must be between 0 and 100.'))
     
+    @api.constrains('dgii_report_job_limit')
+    def _check_dgii_report_job_limit(self):
+        for record in self:
+            if record.dgii_report_job_limit < 1:
+                raise ValidationError(_('Concurrent DGII report jobs must be at least 1.'))
+    
     def get_ncf_statistics(self):
         """Get NCF statistics for this company."""
         self.ensure_one()
+        return self.get_ncf_statistics_by_company()[self.id]
+    
+    def get_ncf_statistics_by_company(self):
+        """Get the NCF statistics of all these companies in one grouped query.
         
-        NCFSequence = self.env['ncf.sequence']
+        Expiring and low availability counters use each company's own
+        ncf_expiry_alert_days and ncf_low_availability_threshold.
         
-        # Get all sequences for this company
-        sequences = NCFSequence.search([('company_id', '=', self.id)])
+        :return: dict {company_id: statistics}
+        """
+        if not self:
+            return {}
+        
+        NCFSequence = self.env['ncf.sequence']
+        NCFSequence.check_access_rights('read')
+        sequence_query = NCFSequence._search([('company_id', 'in', self.ids)])
         
-        # Calculate statistics
-        total_sequences = len(sequences)
-        active_sequences = len(sequences.filtered(lambda s: s.state == 'active'))
-        expiring_sequences = len(sequences.filtered(lambda s: s.is_expiring_soon))
-        low_availability_sequences = len(sequences.filtered(lambda s: s.is_low_availability))
+        self.env.flush_all()
+        self.env.cr.execute(SQL("""
+            SELECT company.id,
+                   count(sequence.id),
+                   count(sequence.id) FILTER (WHERE sequence.state = 'active'),
+                   count(sequence.id) FILTER (
+                       WHERE sequence.state = 'active'
+                         AND sequence.expiry_date BETWEEN %(today)s AND %(today)s + company.ncf_expiry_alert_days),
+                   count(sequence.id) FILTER (
+                       WHERE sequence.state = 'active'
+                         AND %(percentage_used)s >= company.ncf_low_availability_threshold),
+                   count(sequence.id) FILTER (WHERE sequence.audit_issue_count > 0)
+              FROM res_company company
+         LEFT JOIN ncf_sequence sequence
+                ON sequence.company_id = company.id
+               AND sequence.id IN %(sequence_ids)s
+             WHERE company.id IN %(company_ids)s
+          GROUP BY company.id
+        """,
+            today=fields.Date.today(),
+            percentage_used=SQL(NCFSequence._USAGE_STATISTICS_SQL['percentage_used']),
+            sequence_ids=sequence_query.subselect(),
+            company_ids=tuple(self.ids),
+        ))
         
         return {
-            'total_sequences': total_sequences,
-            'active_sequences': active_sequences,
-            'expiring_sequences': expiring_sequences,
-            'low_availability_sequences': low_availability_sequences,
-        }
\ No newline at end of file
+            company_id: {
+                'total_sequences': total_sequences,
+                'active_sequences': active_sequences,
+                'expiring_sequences': expiring_sequences,
+                'low_availability_sequences': low_availability_sequences,
+                'audit_issue_sequences': audit_issue_sequences,
+            }
+            for company_id, total_sequences, active_sequences, expiring_sequences, low_availability_sequences,
+                audit_issue_sequences in self.env.cr.fetchall()
+        }
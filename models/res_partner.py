@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.tools import split_every
+from ..tools.vat_validation import VAT_STATUS_VALID, check_vats, normalize_vat
+from .dgii_rnc_registry import VAT_STATUS_SELECTION
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+
+    # Partners read and written per chunk by the bulk validation
+    _DGII_VALIDATION_CHUNK_SIZE = 10000
+
+    dgii_registry_state = fields.Selection(
+        VAT_STATUS_SELECTION,
+        string='DGII Registry',
+        readonly=True,
+        copy=False,
+        help='Status of the RNC/cédula in the imported DGII taxpayer registry'
+    )
+
+    @api.onchange('vat')
+    def _onchange_vat_dgii_registry(self):
+        """Fill the name from the DGII registry and warn about unknown VATs."""
+        if not self.vat:
+            self.dgii_registry_state = False
+            return
+        Registry = self.env['dgii.rnc.registry']
+        status = Registry._get_vat_statuses([self.vat]).get(self.vat)
+        self.dgii_registry_state = status
+        if status == 'invalid':
+            return {'warning': {
+                'title': _('DGII Registry'),
+                'message': _('%s is not a valid RNC or cédula: check its digits.') % self.vat,
+            }}
+        if status == 'not_found':
+            return {'warning': {
+                'title': _('DGII Registry'),
+                'message': _('RNC/cédula %s is not in the DGII taxpayer registry.') % self.vat,
+            }}
+        if status and not self.name:
+            self.name = Registry._lookup(self.vat)[0]
+        if status == 'inactive':
+            return {'warning': {
+                'title': _('DGII Registry'),
+                'message': _('RNC/cédula %s is not active in the DGII taxpayer registry.') % self.vat,
+            }}
+
+    def action_validate_dgii_registry(self):
+        """Check the VAT of the partners: check digit, then DGII registry.
+
+        Partners are read in chunks, checked in memory and written with one
+        grouped write per status and chunk.
+        """
+        Registry = self.env['dgii.rnc.registry']
+        partners = self or self.search([('vat', '!=', False)])
+        counts = dict.fromkeys(dict(VAT_STATUS_SELECTION), 0)
+        for chunk_ids in split_every(self._DGII_VALIDATION_CHUNK_SIZE, partners.ids):
+            chunk = self.browse(chunk_ids)
+            statuses = Registry._get_vat_statuses(chunk.mapped('vat'))
+            by_status = {}
+            for partner in chunk:
+                by_status.setdefault(statuses.get(partner.vat, False), []).append(partner.id)
+            for status, partner_ids in by_status.items():
+                self.browse(partner_ids).write({'dgii_registry_state': status})
+                if status:
+                    counts[status] += len(partner_ids)
+            self.env.invalidate_all()
+
+        labels = dict(VAT_STATUS_SELECTION)
+        return self._notify_dgii_registry(', '.join(
+            f'{labels[status]}: {count}' for status, count in counts.items()
+        ), 'success')
+
+    def action_cleanup_dgii_vat(self):
+        """Remove the separators from valid RNCs/cédulas, then validate all VATs."""
+        partners = self or self.search([('vat', '!=', False)])
+        for chunk_ids in split_every(self._DGII_VALIDATION_CHUNK_SIZE, partners.ids):
+            chunk = self.browse(chunk_ids)
+            for partner, check in zip(chunk, check_vats(partner.vat for partner in chunk)):
+                vat = normalize_vat(partner.vat)
+                if check == VAT_STATUS_VALID and vat != partner.vat:
+                    partner.vat = vat
+            self.env.invalidate_all()
+        return partners.action_validate_dgii_registry()
+
+    def _notify_dgii_registry(self, message, notification_type):
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('DGII Registry'),
+                'message': message,
+                'type': notification_type,
+                'sticky': False,
+            },
+        }
@@ -1,4 +1,8 @@
 # -*- coding: utf-8 -*-
 
+from . import dgii_report_export
 from . import dgii_report_606
 from . import dgii_report_607
+from . import dgii_report_job
+from . import dgii_report_batch
+from . import dgii_report_snapshot
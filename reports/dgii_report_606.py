@@ -2,16 +2,17 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
+from odoo.tools import SQL
 from datetime import datetime
-import base64
-import csv
-import io
-import xlsxwriter
+from ..models.dgii_rnc_registry import VAT_STATUS_SELECTION
 
 
 class DGIIReport606(models.TransientModel):
     _name = 'dgii.report.606'
+    _inherit = ['dgii.report.export.mixin']
     _description = 'DGII Report 606 - Sales'
+    _export_sheet_name = 'Reporte 606'
+    _row_source_key = 'assignment_id'
 
     # Report Parameters
     date_from = fields.Date(
@@ -40,23 +41,6 @@ class DGIIReport606(models.TransientModel):
         string='Report Lines'
     )
     
-    # Export Fields
-    export_format = fields.Selection([
-        ('txt', 'TXT File (DGII Format)'),
-        ('xlsx', 'Excel File (XLSX)'),
-        ('csv', 'CSV File'),
-    ], string='Export Format', default='txt')
-    
-    export_file = fields.Binary(
-        string='Export File',
-        readonly=True
-    )
-    
-    export_filename = fields.Char(
-        string='Export Filename',
-        readonly=True
-    )
-    
     # Statistics
     total_records = fields.Integer(
         string='Total Records',
@@ -94,41 +78,10 @@ class DGIIReport606(models.TransientModel):
         # Clear existing lines
         self.line_ids.unlink()
         
-        # Get NCF assignments in date range
-        assignments = self.env['ncf.assignment'].search([
-            ('assignment_date', '>=', self.date_from),
-            ('assignment_date', '<=', self.date_to),
-            ('company_id', '=', self.company_id.id),
-            ('invoice_state', '=', 'posted'),
-            ('invoice_id.move_type', 'in', ['out_invoice', 'out_refund']),
-        ], order='assignment_date, ncf_number')
-        
         # Create report lines
-        line_vals = []
-        for assignment in assignments:
-            invoice = assignment.invoice_id
-            
-            # Calculate amounts
-            subtotal = invoice.amount_untaxed
-            tax_amount = invoice.amount_tax
-            total_amount = invoice.amount_total
-            
-            # Determine document type code for DGII
-            doc_type_code = self._get_dgii_doc_type_code(assignment.document_type)
-            
-            line_vals.append({
-                'report_id': self.id,
-                'ncf_number': assignment.ncf_number,
-                'document_type_code': doc_type_code,
-                'invoice_date': invoice.invoice_date,
-                'invoice_id': invoice.id,
-                'partner_name': invoice.partner_id.name,
-                'partner_vat': invoice.partner_id.vat or '',
-                'subtotal': subtotal,
-                'tax_amount': tax_amount,
-                'total_amount': total_amount,
-                'currency_code': invoice.currency_id.name,
-            })
+        line_vals = [
+            dict(row, report_id=self.id) for row in self._get_report_rows()
+        ]
         
         if line_vals:
             self.env['dgii.report.606.line'].create(line_vals)
@@ -142,6 +95,76 @@ class DGIIReport606(models.TransientModel):
             'target': 'new',
         }
     
+    def _get_report_domain(self):
+        """Domain of the NCF assignments included in the report.
+        
+        Served by the ncf_assignment_dgii_606_idx index.
+        """
+        self.ensure_one()
+        return [
+            ('assignment_date', '>=', self.date_from),
+            ('assignment_date', '<=', self.date_to),
+            ('company_id', '=', self.company_id.id),
+            ('invoice_state', '=', 'posted'),
+            ('invoice_move_type', 'in', ['out_invoice', 'out_refund']),
+        ]
+    
+    def _get_report_rows(self, domain=None):
+        """Extract the report rows with a single query.
+        
+        Assignment, invoice, partner and currency are joined in SQL instead of
+        being read record by record. The assignment and invoice subqueries are
+        built by the ORM, so company and access rules still apply.
+        
+        :param domain: assignments to report, the report period by default
+        :return: list of dicts, one per line, keyed by line field names
+        """
+        self.ensure_one()
+        
+        NCFAssignment = self.env['ncf.assignment']
+        AccountMove = self.env['account.move']
+        NCFAssignment.check_access_rights('read')
+        AccountMove.check_access_rights('read')
+        
+        if domain is None:
+            domain = self._get_report_domain()
+        assignment_query = NCFAssignment._search(domain)
+        move_query = AccountMove._search([('company_id', '=', self.company_id.id)])
+        # Only the invoices of the reported assignments, not the whole company
+        move_query.add_where(SQL(
+            "%s IN %s",
+            SQL.identifier(move_query.table, 'id'),
+            NCFAssignment._search(domain).subselect(SQL.identifier('ncf_assignment', 'invoice_id')),
+        ))
+        
+        self.env.flush_all()
+        self.env.cr.execute(SQL("""
+            SELECT assignment.id AS assignment_id,
+                   assignment.ncf_number AS ncf_number,
+                   assignment.document_type AS document_type,
+                   move.invoice_date AS invoice_date,
+                   move.id AS invoice_id,
+                   COALESCE(partner.name, '') AS partner_name,
+                   COALESCE(partner.vat, '') AS partner_vat,
+                   move.amount_untaxed AS subtotal,
+                   move.amount_tax AS tax_amount,
+                   move.amount_total AS total_amount,
+                   currency.name AS currency_code
+              FROM ncf_assignment assignment
+              JOIN account_move move ON move.id = assignment.invoice_id
+              JOIN res_currency currency ON currency.id = move.currency_id
+         LEFT JOIN res_partner partner ON partner.id = move.partner_id
+             WHERE assignment.id IN %s
+               AND move.id IN %s
+          ORDER BY assignment.assignment_date, assignment.ncf_number
+        """, assignment_query.subselect(), move_query.subselect()))
+        
+        rows = self.env.cr.dictfetchall()
+        for row in rows:
+            # Determine document type code for DGII
+            row['document_type_code'] = self._get_dgii_doc_type_code(row.pop('document_type'))
+        return self._flag_partner_vats(rows)
+    
     def _get_dgii_doc_type_code(self, document_type):
         """Get DGII document type code."""
         mapping = {
@@ -157,165 +180,55 @@ class DGIIReport606(models.TransientModel):
         }
         return mapping.get(document_type, '31')
     
-    def action_export_report(self):
-        """Export report to file."""
-        self.ensure_one()
-        
-        if not self.line_ids:
-            raise ValidationError(_('Please generate the report first.'))
-        
-        if self.export_format == 'csv':
-            content, filename = self._export_csv()
-        elif self.export_format == 'xlsx':
-            content, filename = self._export_xlsx()
-        else:  # txt
-            content, filename = self._export_txt()
-        
-        self.write({
-            'export_file': base64.b64encode(content),
-            'export_filename': filename,
-        })
-        
-        return {
-            'type': 'ir.actions.act_url',
-            'url': f'/web/content?model=dgii.report.606&id={self.id}&field=export_file&download=true&filename={filename}',
-            'target': 'self',
-        }
+    def _get_export_rows(self):
+        return self._get_report_rows()
     
-    def _export_csv(self):
-        """Export to CSV format."""
-        output = io.StringIO()
-        writer = csv.writer(output, delimiter=',', quotechar='"', quoting=csv.QUOTE_ALL)
-        
-        # Header
-        writer.writerow([
-            'NCF',
-            'Tipo Doc',
-            'Fecha',
-            'Cliente',
-            'RNC/Cedula',
-            'Subtotal',
-            'Impuesto',
-            'Total',
-            'Moneda'
-        ])
-        
-        # Data rows
-        for line in self.line_ids:
-            writer.writerow([
-                line.ncf_number,
-                line.document_type_code,
-                line.invoice_date.strftime('%d/%m/%Y'),
-                line.partner_name,
-                line.partner_vat,
-                f"{line.subtotal:.2f}",
-                f"{line.tax_amount:.2f}",
-                f"{line.total_amount:.2f}",
-                line.currency_code,
-            ])
-        
-        content = output.getvalue().encode('utf-8')
-        filename = f'DGII_606_{self.date_from.strftime("%Y%m")}_{self.company_id.dgii_rnc or "SIN_RNC"}.csv'
-        
-        return content, filename
+    def _get_report_source_ids(self):
+        return self.env['ncf.assignment'].search(
+            self._get_report_domain(), order='assignment_date, ncf_number'
+        ).ids
     
-    def _export_txt(self):
-        """Export to TXT format (DGII standard)."""
-        lines = []
-        
-        for line in self.line_ids:
-            # Format according to DGII specifications
-            # Fields: RNC|Tipo|NCF|Fecha|Cliente|RNC_Cliente|Subtotal|Impuesto|Total
-            dgii_line = "|".join([
-                self.company_id.dgii_rnc or "",
-                line.document_type_code,
-                line.ncf_number,
-                line.invoice_date.strftime('%d/%m/%Y'),
-                line.partner_name.replace("|", " "),
-                line.partner_vat or "",
-                f"{line.subtotal:.2f}",
-                f"{line.tax_amount:.2f}",
-                f"{line.total_amount:.2f}",
-            ])
-            lines.append(dgii_line)
-        
-        content = "\n".join(lines).encode('utf-8')
-        filename = f'DGII_606_{self.date_from.strftime("%Y%m")}_{self.company_id.dgii_rnc or "SIN_RNC"}.txt'
-        
-        return content, filename
+    def _get_source_rows(self, source_ids):
+        return self._get_report_rows([('id', 'in', source_ids)])
     
-    def _export_xlsx(self):
-        """Export to Excel format."""
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-        worksheet = workbook.add_worksheet('Reporte 606')
-        
-        # Define formats
-        header_format = workbook.add_format({
-            'bold': True,
-            'bg_color': '#D9EDF7',
-            'font_color': '#31708F',
-            'border': 1
-        })
-        
-        money_format = workbook.add_format({
-            'num_format': '#,##0.00',
-            'border': 1
-        })
-        
-        text_format = workbook.add_format({
-            'border': 1
-        })
-        
-        date_format = workbook.add_format({
-            'num_format': 'dd/mm/yyyy',
-            'border': 1
-        })
-        
-        # Headers
-        headers = [
-            'NCF',
-            'Tipo Documento',
-            'Fecha Factura',
-            'Cliente',
-            'RNC/Cédula',
-            'Subtotal',
-            'Impuesto',
-            'Total',
-            'Moneda'
+    def _get_changed_source_ids(self, since):
+        return self.env['ncf.assignment'].search(self._get_report_domain() + [
+            '|', '|',
+            ('write_date', '>', since),
+            ('invoice_id.write_date', '>', since),
+            ('invoice_id.partner_id.write_date', '>', since),
+        ]).ids
+    
+    def _get_export_columns(self):
+        return [
+            {'key': 'ncf_number', 'csv_header': 'NCF', 'xlsx_header': 'NCF', 'kind': 'text'},
+            {'key': 'document_type_code', 'csv_header': 'Tipo Doc', 'xlsx_header': 'Tipo Documento', 'kind': 'text'},
+            {'key': 'invoice_date', 'csv_header': 'Fecha', 'xlsx_header': 'Fecha Factura', 'kind': 'date'},
+            {'key': 'partner_name', 'csv_header': 'Cliente', 'xlsx_header': 'Cliente', 'kind': 'text'},
+            {'key': 'partner_vat', 'csv_header': 'RNC/Cedula', 'xlsx_header': 'RNC/Cédula', 'kind': 'text'},
+            {'key': 'subtotal', 'csv_header': 'Subtotal', 'xlsx_header': 'Subtotal', 'kind': 'money'},
+            {'key': 'tax_amount', 'csv_header': 'Impuesto', 'xlsx_header': 'Impuesto', 'kind': 'money'},
+            {'key': 'total_amount', 'csv_header': 'Total', 'xlsx_header': 'Total', 'kind': 'money'},
+            {'key': 'currency_code', 'csv_header': 'Moneda', 'xlsx_header': 'Moneda', 'kind': 'text'},
         ]
-        
-        for col, header in enumerate(headers):
-            worksheet.write(0, col, header, header_format)
-        
-        # Data rows
-        for row, line in enumerate(self.line_ids, 1):
-            worksheet.write(row, 0, line.ncf_number, text_format)
-            worksheet.write(row, 1, line.document_type_code, text_format)
-            worksheet.write(row, 2, line.invoice_date, date_format)
-            worksheet.write(row, 3, line.partner_name, text_format)
-            worksheet.write(row, 4, line.partner_vat, text_format)
-            worksheet.write(row, 5, line.subtotal, money_format)
-            worksheet.write(row, 6, line.tax_amount, money_format)
-            worksheet.write(row, 7, line.total_amount, money_format)
-            worksheet.write(row, 8, line.currency_code, text_format)
-        
-        # Auto-adjust column widths
-        for col in range(len(headers)):
-            worksheet.set_column(col, col, 15)
-        
-        # Add totals row
-        total_row = len(self.line_ids) + 2
-        worksheet.write(total_row, 4, 'TOTALES:', header_format)
-        worksheet.write(total_row, 5, f'=SUM(F2:F{len(self.line_ids)+1})', money_format)
-        worksheet.write(total_row, 6, f'=SUM(G2:G{len(self.line_ids)+1})', money_format)
-        worksheet.write(total_row, 7, f'=SUM(H2:H{len(self.line_ids)+1})', money_format)
-        
-        workbook.close()
-        content = output.getvalue()
-        filename = f'DGII_606_{self.date_from.strftime("%Y%m")}_{self.company_id.dgii_rnc or "SIN_RNC"}.xlsx'
-        
-        return content, filename
+    
+    def _get_txt_record(self, row, values):
+        # Format according to DGII specifications
+        # Fields: RNC|Tipo|NCF|Fecha|Cliente|RNC_Cliente|Subtotal|Impuesto|Total
+        return "|".join([
+            self.company_id.dgii_rnc or "",
+            values['document_type_code'],
+            values['ncf_number'],
+            values['invoice_date'],
+            row['partner_name'].replace("|", " "),
+            row['partner_vat'] or "",
+            values['subtotal'],
+            values['tax_amount'],
+            values['total_amount'],
+        ])
+    
+    def _get_export_filename(self, file_format):
+        return f'DGII_606_{self.date_from.strftime("%Y%m")}_{self.company_id.dgii_rnc or "SIN_RNC"}.{file_format}'
 
 
 class DGIIReport606Line(models.TransientModel):
@@ -330,6 +243,11 @@ class DGIIReport606Line(models.TransientModel):
         ondelete='cascade'
     )
     
+    assignment_id = fields.Many2one(
+        'ncf.assignment',
+        string='NCF Assignment'
+    )
+    
     ncf_number = fields.Char(
         string='NCF Number',
         required=True
@@ -360,6 +278,11 @@ class DGIIReport606Line(models.TransientModel):
         string='Customer VAT'
     )
     
+    partner_vat_status = fields.Selection(
+        VAT_STATUS_SELECTION,
+        string='DGII Registry'
+    )
+    
     subtotal = fields.Monetary(
         string='Subtotal',
         required=True
@@ -2,16 +2,29 @@
 
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError
+from odoo.tools import SQL, split_every
 from datetime import datetime
-import base64
-import csv
-import io
-import xlsxwriter
+import itertools
+
+from ..tools.ncf_validation import NCF_STATUS_DUPLICATE, NCF_STATUS_VALID, check_supplier_ncfs, normalize_ncf
+from ..models.dgii_rnc_registry import VAT_STATUS_SELECTION
+
+NCF_STATUS_SELECTION = [
+    ('valid', 'Valid'),
+    ('missing', 'Missing'),
+    ('malformed', 'Malformed'),
+    ('duplicate', 'Duplicate'),
+]
 
 
 class DGIIReport607(models.TransientModel):
     _name = 'dgii.report.607'
+    _inherit = ['dgii.report.export.mixin']
     _description = 'DGII Report 607 - Purchases'
+    _export_sheet_name = 'Reporte 607'
+
+    # Vendor bills read, mapped and written per chunk during generation
+    _REPORT_CHUNK_SIZE = 1000
 
     # Report Parameters
     date_from = fields.Date(
@@ -40,23 +53,6 @@ class DGIIReport607(models.TransientModel):
         string='Report Lines'
     )
     
-    # Export Fields
-    export_format = fields.Selection([
-        ('txt', 'TXT File (DGII Format)'),
-        ('xlsx', 'Excel File (XLSX)'),
-        ('csv', 'CSV File'),
-    ], string='Export Format', default='txt')
-    
-    export_file = fields.Binary(
-        string='Export File',
-        readonly=True
-    )
-    
-    export_filename = fields.Char(
-        string='Export Filename',
-        readonly=True
-    )
-    
     # Statistics
     total_records = fields.Integer(
         string='Total Records',
@@ -94,50 +90,10 @@ class DGIIReport607(models.TransientModel):
         # Clear existing lines
         self.line_ids.unlink()
         
-        # Get vendor bills in date range
-        bills = self.env['account.move'].search([
-            ('invoice_date', '>=', self.date_from),
-            ('invoice_date', '<=', self.date_to),
-            ('company_id', '=', self.company_id.id),
-            ('state', '=', 'posted'),
-            ('move_type', 'in', ['in_invoice', 'in_refund']),
-        ], order='invoice_date, name')
-        
-        # Create report lines
-        line_vals = []
-        for bill in bills:
-            # Get supplier NCF from reference or specific field
-            supplier_ncf = bill.ref or ''
-            
-            # Validate NCF format
-            ncf_valid = self._validate_supplier_ncf(supplier_ncf)
-            
-            # Calculate amounts
-            subtotal = bill.amount_untaxed
-            tax_amount = bill.amount_tax
-            total_amount = bill.amount_total
-            
-            # Determine document type
-            doc_type = 'invoice' if bill.move_type == 'in_invoice' else 'credit_note'
-            doc_type_code = self._get_dgii_doc_type_code(doc_type)
-            
-            line_vals.append({
-                'report_id': self.id,
-                'supplier_ncf': supplier_ncf,
-                'ncf_valid': ncf_valid,
-                'document_type_code': doc_type_code,
-                'invoice_date': bill.invoice_date,
-                'invoice_id': bill.id,
-                'partner_name': bill.partner_id.name,
-                'partner_vat': bill.partner_id.vat or '',
-                'subtotal': subtotal,
-                'tax_amount': tax_amount,
-                'total_amount': total_amount,
-                'currency_code': bill.currency_id.name,
-            })
-        
-        if line_vals:
-            self.env['dgii.report.607.line'].create(line_vals)
+        # Create report lines chunk by chunk
+        ReportLine = self.env['dgii.report.607.line']
+        for rows in self._iter_report_row_chunks():
+            ReportLine.create([dict(row, report_id=self.id) for row in rows])
         
         # Return to form view
         return {
@@ -148,26 +104,157 @@ class DGIIReport607(models.TransientModel):
             'target': 'new',
         }
     
-    def _validate_supplier_ncf(self, ncf):
-        """Validate supplier NCF format."""
-        if not ncf:
-            return False
+    def _iter_report_row_chunks(self, chunk_size=None):
+        """Yield the report rows in chunks of ``chunk_size`` vendor bills.
         
-        # Remove spaces and convert to uppercase
-        ncf = ncf.replace(' ', '').upper()
+        Only the ordered ids of the period are loaded up front. Each chunk is
+        browsed on its own (so prefetching stays within the chunk), mapped to
+        line values and dropped from the ORM cache before the next one is
+        read, which keeps peak memory flat whatever the period size.
+        """
+        self.ensure_one()
+        chunk_size = chunk_size or self._REPORT_CHUNK_SIZE
         
-        # Check length (should be 11 characters)
-        if len(ncf) != 11:
-            return False
+        for chunk_ids in split_every(chunk_size, self._get_report_source_ids()):
+            yield self._get_source_rows(chunk_ids)
+            
+            # Flush what the consumer wrote and forget the chunk's records
+            self.env.invalidate_all()
+    
+    def _get_report_source_ids(self):
+        return self.env['account.move'].search(
+            self._get_report_domain(), order='invoice_date, name'
+        ).ids
+    
+    def _get_source_rows(self, source_ids):
+        exceptions = self._get_supplier_ncf_exceptions(source_ids)
+        return self._flag_partner_vats([
+            self._prepare_report_row(bill, exceptions.get(bill.id, NCF_STATUS_VALID))
+            for bill in self.env['account.move'].browse(source_ids)
+        ])
+    
+    def _get_supplier_ncf_exceptions(self, bill_ids):
+        """Status of the given bills whose supplier NCF is not valid.
         
-        # Check format: 3 letters/numbers + 8 digits
-        prefix = ncf[:3]
-        number = ncf[3:]
+        The format of each NCF is checked in memory. A well-formed NCF is a
+        duplicate when another bill of the period has the same supplier VAT
+        and normalized NCF: those bills are looked up for the given bills
+        only, through the account_move_supplier_ncf_key_idx index, so the
+        cost of a chunk does not grow with the period.
         
-        if not prefix.isalnum() or not number.isdigit():
-            return False
+        :return: dict {bill_id: status}
+        """
+        self.ensure_one()
+        if not bill_ids:
+            return {}
+        self.env['account.move'].check_access_rights('read')
+        
+        self.env.flush_all()
+        self.env.cr.execute(SQL("""
+            SELECT move.id,
+                   COALESCE(NULLIF(partner.vat, ''), 'partner:' || move.commercial_partner_id),
+                   COALESCE(move.supplier_ncf, move.ref),
+                   EXISTS (
+                       SELECT 1 FROM account_move other
+                        WHERE %(same_supplier_ncf)s
+                   )
+              FROM account_move move
+         LEFT JOIN res_partner partner ON partner.id = move.commercial_partner_id
+             WHERE move.id IN %(bill_ids)s
+        """, same_supplier_ncf=self._get_same_supplier_ncf_condition(), bill_ids=tuple(bill_ids)))
+        rows = self.env.cr.fetchall()
+        
+        statuses = check_supplier_ncfs((partner_key, ref) for _bill_id, partner_key, ref, _duplicated in rows)
+        exceptions = {}
+        for (bill_id, _partner_key, _ref, duplicated), status in zip(rows, statuses):
+            if status == NCF_STATUS_VALID and duplicated:
+                status = NCF_STATUS_DUPLICATE
+            if status != NCF_STATUS_VALID:
+                exceptions[bill_id] = status
+        return exceptions
+    
+    def _get_related_source_ids(self, source_ids):
+        """Bills of the period booked with the same supplier NCF as the given ones."""
+        self.ensure_one()
+        if not source_ids:
+            return []
+        self.env.flush_all()
+        self.env.cr.execute(SQL("""
+            SELECT DISTINCT other.id
+              FROM account_move move
+         LEFT JOIN res_partner partner ON partner.id = move.commercial_partner_id
+              JOIN account_move other ON %(same_supplier_ncf)s
+             WHERE move.id IN %(source_ids)s
+        """, same_supplier_ncf=self._get_same_supplier_ncf_condition(), source_ids=tuple(source_ids)))
+        return [other_id for other_id, in self.env.cr.fetchall()]
+    
+    def _get_same_supplier_ncf_condition(self):
+        """Condition on ``other``: another bill of the period booked with the
+        supplier VAT (``partner``) and normalized NCF of ``move``.
+        
+        The period conditions are those of ``_get_report_domain``, written
+        out so that the lookup goes through account_move_supplier_ncf_key_idx
+        instead of reading the whole period.
+        """
+        return SQL("""
+            other.commercial_partner_id IN (
+                SELECT move.commercial_partner_id
+                 UNION
+                SELECT same_vat.id FROM res_partner same_vat
+                 WHERE same_vat.vat = NULLIF(partner.vat, '')
+            )
+            AND upper(regexp_replace(COALESCE(other.supplier_ncf, other.ref), '[ .-]', '', 'g'))
+                = upper(regexp_replace(COALESCE(move.supplier_ncf, move.ref), '[ .-]', '', 'g'))
+            AND other.id != move.id
+            AND other.state = 'posted'
+            AND other.move_type IN ('in_invoice', 'in_refund')
+            AND other.company_id = %(company_id)s
+            AND other.invoice_date BETWEEN %(date_from)s AND %(date_to)s
+        """, company_id=self.company_id.id, date_from=self.date_from, date_to=self.date_to)
+    
+    def _get_changed_source_ids(self, since):
+        return self.env['account.move'].search(self._get_report_domain() + [
+            '|',
+            ('write_date', '>', since),
+            ('partner_id.write_date', '>', since),
+        ]).ids
+    
+    def _prepare_report_row(self, bill, ncf_status=NCF_STATUS_VALID):
+        """Map a vendor bill to report line values."""
+        # Supplier NCF field, or the reference of bills not filled by the backfill
+        supplier_ncf = bill.supplier_ncf or normalize_ncf(bill.ref)
+        
+        # Determine document type
+        doc_type = 'invoice' if bill.move_type == 'in_invoice' else 'credit_note'
         
-        return True
+        return {
+            'supplier_ncf': supplier_ncf,
+            'ncf_valid': ncf_status == NCF_STATUS_VALID,
+            'ncf_status': ncf_status,
+            'document_type_code': self._get_dgii_doc_type_code(doc_type),
+            'invoice_date': bill.invoice_date,
+            'invoice_id': bill.id,
+            'partner_name': bill.partner_id.name,
+            'partner_vat': bill.partner_id.vat or '',
+            'subtotal': bill.amount_untaxed,
+            'tax_amount': bill.amount_tax,
+            'total_amount': bill.amount_total,
+            'currency_code': bill.currency_id.name,
+        }
+    
+    def _get_report_domain(self):
+        """Domain of the vendor bills included in the report.
+        
+        Served by the account_move_dgii_607_idx index.
+        """
+        self.ensure_one()
+        return [
+            ('invoice_date', '>=', self.date_from),
+            ('invoice_date', '<=', self.date_to),
+            ('company_id', '=', self.company_id.id),
+            ('state', '=', 'posted'),
+            ('move_type', 'in', ['in_invoice', 'in_refund']),
+        ]
     
     def _get_dgii_doc_type_code(self, document_type):
         """Get DGII document type code for purchases."""
@@ -183,236 +270,58 @@ class DGIIReport607(models.TransientModel):
         }
         return mapping.get(document_type, '01')
     
-    def action_export_report(self):
-        """Export report to file."""
+    def action_view_ncf_exceptions(self):
+        """List the bills of the period with a missing, malformed or duplicate supplier NCF."""
         self.ensure_one()
         
         if not self.line_ids:
-            raise ValidationError(_('Please generate the report first.'))
-        
-        if self.export_format == 'csv':
-            content, filename = self._export_csv()
-        elif self.export_format == 'xlsx':
-            content, filename = self._export_xlsx()
-        else:  # txt
-            content, filename = self._export_txt()
-        
-        self.write({
-            'export_file': base64.b64encode(content),
-            'export_filename': filename,
-        })
+            self.action_generate_report()
         
         return {
-            'type': 'ir.actions.act_url',
-            'url': f'/web/content?model=dgii.report.607&id={self.id}&field=export_file&download=true&filename={filename}',
-            'target': 'self',
+            'name': _('Supplier NCF Exceptions'),
+            'type': 'ir.actions.act_window',
+            'res_model': 'dgii.report.607.line',
+            'view_mode': 'tree',
+            'views': [(self.env.ref(f'{self._module}.view_dgii_report_607_exception_tree').id, 'tree')],
+            'domain': [('report_id', '=', self.id), ('ncf_status', '!=', NCF_STATUS_VALID)],
+            'context': {'group_by': 'ncf_status'},
+            'target': 'current',
         }
     
-    def _export_csv(self):
-        """Export to CSV format."""
-        output = io.StringIO()
-        writer = csv.writer(output, delimiter=',', quotechar='"', quoting=csv.QUOTE_ALL)
-        
-        # Header
-        writer.writerow([
-            'NCF Proveedor',
-            'Tipo Doc',
-            'Fecha',
-            'Proveedor',
-            'RNC Proveedor',
-            'Subtotal',
-            'Impuesto',
-            'Total',
-            'Moneda',
-            'NCF Válido'
-        ])
-        
-        # Data rows
-        for line in self.line_ids:
-            writer.writerow([
-                line.supplier_ncf,
-                line.document_type_code,
-                line.invoice_date.strftime('%d/%m/%Y'),
-                line.partner_name,
-                line.partner_vat,
-                f"{line.subtotal:.2f}",
-                f"{line.tax_amount:.2f}",
-                f"{line.total_amount:.2f}",
-                line.currency_code,
-                'Sí' if line.ncf_valid else 'No'
-            ])
-        
-        content = output.getvalue().encode('utf-8')
-        filename = f'DGII_607_{self.date_from.strftime("%Y%m")}_{self.company_id.dgii_rnc or "SIN_RNC"}.csv'
-        
-        return content, filename
-    
-    def _export_txt(self):
-        """Export to TXT format (DGII standard)."""
-        lines = []
-        
-        for line in self.line_ids:
-            # Format according to DGII specifications for 607
-            # Fields: RNC|Tipo|NCF_Proveedor|Fecha|Proveedor|RNC_Proveedor|Subtotal|Impuesto|Total
-            dgii_line = "|".join([
-                self.company_id.dgii_rnc or "",
-                line.document_type_code,
-                line.supplier_ncf,
-                line.invoice_date.strftime('%d/%m/%Y'),
-                line.partner_name.replace("|", " "),
-                line.partner_vat or "",
-                f"{line.subtotal:.2f}",
-                f"{line.tax_amount:.2f}",
-                f"{line.total_amount:.2f}",
-            ])
-            lines.append(dgii_line)
-        
-        content = "\n".join(lines).encode('utf-8')
-        filename = f'DGII_607_{self.date_from.strftime("%Y%m")}_{self.company_id.dgii_rnc or "SIN_RNC"}.txt'
-        
-        return content, filename
-    
-    def _export_xlsx(self):
-        """Export to Excel format."""
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-        worksheet = workbook.add_worksheet('Reporte 607')
-        
-        # Define formats
-        header_format = workbook.add_format({
-            'bold': True,
-            'bg_color': '#D9EDF7',
-            'font_color': '#31708F',
-            'border': 1
-        })
-        
-        money_format = workbook.add_format({
-            'num_format': '#,##0.00',
-            'border': 1
-        })
-        
-        text_format = workbook.add_format({
-            'border': 1
-        })
-        
-        date_format = workbook.add_format({
-            'num_format': 'dd/mm/yyyy',
-            'border': 1
-        })
-        
-        # Headers
-        headers = [
-            'NCF Proveedor',
-            'Tipo Documento',
-            'Fecha Factura',
-            'Proveedor',
-            'RNC Proveedor',
-            'Subtotal',
-            'Impuesto',
-            'Total',
-            'Moneda',
-            'NCF Válido'
+    def _get_export_rows(self):
+        return itertools.chain.from_iterable(self._iter_report_row_chunks())
+    
+    def _get_export_columns(self):
+        return [
+            {'key': 'supplier_ncf', 'csv_header': 'NCF Proveedor', 'xlsx_header': 'NCF Proveedor', 'kind': 'text'},
+            {'key': 'document_type_code', 'csv_header': 'Tipo Doc', 'xlsx_header': 'Tipo Documento', 'kind': 'text'},
+            {'key': 'invoice_date', 'csv_header': 'Fecha', 'xlsx_header': 'Fecha Factura', 'kind': 'date'},
+            {'key': 'partner_name', 'csv_header': 'Proveedor', 'xlsx_header': 'Proveedor', 'kind': 'text'},
+            {'key': 'partner_vat', 'csv_header': 'RNC/Cedula', 'xlsx_header': 'RNC Proveedor', 'kind': 'text'},
+            {'key': 'subtotal', 'csv_header': 'Subtotal', 'xlsx_header': 'Subtotal', 'kind': 'money'},
+            {'key': 'tax_amount', 'csv_header': 'Impuesto', 'xlsx_header': 'Impuesto', 'kind': 'money'},
+            {'key': 'total_amount', 'csv_header': 'Total', 'xlsx_header': 'Total', 'kind': 'money'},
+            {'key': 'currency_code', 'csv_header': 'Moneda', 'xlsx_header': 'Moneda', 'kind': 'text'},
+            {'key': 'ncf_valid', 'csv_header': 'NCF Válido', 'xlsx_header': 'NCF Válido', 'kind': 'bool'},
         ]
-        
-        for col, header in enumerate(headers):
-            worksheet.write(0, col, header, header_format)
-        
-        # Data rows
-        for row, line in enumerate(self.line_ids, 1):
-            worksheet.write(row, 0, line.supplier_ncf, text_format)
-            worksheet.write(row, 1, line.document_type_code, text_format)
-            worksheet.write(row, 2, line.invoice_date, date_format)
-            worksheet.write(row, 3, line.partner_name, text_format)
-            worksheet.write(row, 4, line.partner_vat, text_format)
-            worksheet.write(row, 5, line.subtotal, money_format)
-            worksheet.write(row, 6, line.tax_amount, money_format)
-            worksheet.write(row, 7, line.total_amount, money_format)
-            worksheet.write(row, 8, line.currency_code, text_format)
-            worksheet.write(row, 9, 'Sí' if line.ncf_valid else 'No', text_format)
-        
-        # Auto-adjust column widths
-        for col in range(len(headers)):
-            worksheet.set_column(col, col, 15)
-        
-        # Add totals row
-        total_row = len(self.line_ids) + 2
-        worksheet.write(total_row, 4, 'TOTALES:', header_format)
-        worksheet.write(total_row, 5, f'=SUM(F2:F{len(self.line_ids)+1})', money_format)
-        worksheet.write(total_row, 6, f'=SUM(G2:G{len(self.line_ids)+1})', money_format)
-        worksheet.write(total_row, 7, f'=SUM(H2:H{len(self.line_ids)+1})', money_format)
-        
-        workbook.close()
-        content = output.getvalue()
-        filename = f'DGII_607_{self.date_from.strftime("%Y%m")}_{self.company_id.dgii_rnc or "SIN_RNC"}.xlsx'
-        
-        return content, filename
-        return {
-            'type': 'ir.actions.act_url',
-            'url': f'/web/content?model=dgii.report.607&id={self.id}&field=export_file&download=true&filename={filename}',
-            'target': 'self',
-        }
     
-    def _export_csv(self):
-        """Export to CSV format."""
-        output = io.StringIO()
-        writer = csv.writer(output, delimiter=',', quotechar='"', quoting=csv.QUOTE_ALL)
-        
-        # Header
-        writer.writerow([
-            'NCF Proveedor',
-            'Tipo Doc',
-            'Fecha',
-            'Proveedor',
-            'RNC/Cedula',
-            'Subtotal',
-            'Impuesto',
-            'Total',
-            'Moneda',
-            'NCF Válido'
-        ])
-        
-        # Data rows
-        for line in self.line_ids:
-            writer.writerow([
-                line.supplier_ncf,
-                line.document_type_code,
-                line.invoice_date.strftime('%d/%m/%Y'),
-                line.partner_name,
-                line.partner_vat,
-                f"{line.subtotal:.2f}",
-                f"{line.tax_amount:.2f}",
-                f"{line.total_amount:.2f}",
-                line.currency_code,
-                'Sí' if line.ncf_valid else 'No',
-            ])
-        
-        content = output.getvalue().encode('utf-8')
-        filename = f'DGII_607_{self.date_from.strftime("%Y%m")}_{self.company_id.dgii_rnc or "SIN_RNC"}.csv'
-        
-        return content, filename
-    
-    def _export_txt(self):
-        """Export to TXT format (DGII standard)."""
-        lines = []
-        
-        for line in self.line_ids:
-            # Format according to DGII specifications
-            record = (
-                f"{line.supplier_ncf:<11}"
-                f"{line.document_type_code:<2}"
-                f"{line.invoice_date.strftime('%d%m%Y'):<8}"
-                f"{line.partner_vat:<11}"
-                f"{line.partner_name[:50]:<50}"
-                f"{int(line.subtotal * 100):>12}"
-                f"{int(line.tax_amount * 100):>12}"
-                f"{int(line.total_amount * 100):>12}"
-            )
-            lines.append(record)
-        
-        content = '\n'.join(lines).encode('utf-8')
-        filename = f'607{self.date_from.strftime("%Y%m")}{self.company_id.dgii_rnc or "00000000000"}.txt'
-        
-        return content, filename
+    def _get_txt_record(self, row, values):
+        # Format according to DGII specifications (fixed width)
+        return (
+            f"{row['supplier_ncf']:<11}"
+            f"{row['document_type_code']:<2}"
+            f"{row['invoice_date'].strftime('%d%m%Y'):<8}"
+            f"{row['partner_vat']:<11}"
+            f"{row['partner_name'][:50]:<50}"
+            f"{int(row['subtotal'] * 100):>12}"
+            f"{int(row['tax_amount'] * 100):>12}"
+            f"{int(row['total_amount'] * 100):>12}"
+        )
+    
+    def _get_export_filename(self, file_format):
+        if file_format == 'txt':
+            return f'607{self.date_from.strftime("%Y%m")}{self.company_id.dgii_rnc or "00000000000"}.txt'
+        return f'DGII_607_{self.date_from.strftime("%Y%m")}_{self.company_id.dgii_rnc or "SIN_RNC"}.{file_format}'
 
 
 class DGIIReport607Line(models.TransientModel):
@@ -437,6 +346,12 @@ class DGIIReport607Line(models.TransientModel):
         default=False
     )
     
+    ncf_status = fields.Selection(
+        NCF_STATUS_SELECTION,
+        string='NCF Status',
+        default='valid'
+    )
+    
     document_type_code = fields.Char(
         string='Document Type Code',
         required=True
@@ -462,6 +377,11 @@ class DGIIReport607Line(models.TransientModel):
         string='Supplier VAT'
     )
     
+    partner_vat_status = fields.Selection(
+        VAT_STATUS_SELECTION,
+        string='DGII Registry'
+    )
+    
     subtotal = fields.Monetary(
         string='Subtotal',
         required=True
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError, ValidationError
+import logging
+import shutil
+import tempfile
+import zipfile
+
+_logger = logging.getLogger(__name__)
+
+
+class DGIIReportBatch(models.Model):
+    _name = 'dgii.report.batch'
+    _description = 'DGII Report Batch'
+    _order = 'id desc'
+
+    name = fields.Char(
+        string='Name',
+        compute='_compute_name'
+    )
+
+    date_from = fields.Date(
+        string='From Date',
+        required=True,
+        default=lambda self: fields.Date.context_today(self).replace(day=1)
+    )
+
+    date_to = fields.Date(
+        string='To Date',
+        required=True,
+        default=fields.Date.context_today
+    )
+
+    company_ids = fields.Many2many(
+        'res.company',
+        string='Companies',
+        required=True,
+        default=lambda self: self.env.companies
+    )
+
+    include_606 = fields.Boolean(
+        string='Report 606 (Sales)',
+        default=True
+    )
+
+    include_607 = fields.Boolean(
+        string='Report 607 (Purchases)',
+        default=True
+    )
+
+    export_format = fields.Selection([
+        ('txt', 'TXT File (DGII Format)'),
+        ('xlsx', 'Excel File (XLSX)'),
+        ('csv', 'CSV File'),
+        ('all', 'All Formats (TXT, XLSX, CSV)'),
+    ], string='Export Format', required=True, default='txt')
+
+    job_ids = fields.One2many(
+        'dgii.report.job',
+        'batch_id',
+        string='Jobs',
+        readonly=True
+    )
+
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='State', compute='_compute_state')
+
+    progress = fields.Float(
+        string='Progress (%)',
+        compute='_compute_state'
+    )
+
+    zip_attachment_id = fields.Many2one(
+        'ir.attachment',
+        string='Deliverable',
+        readonly=True
+    )
+
+    @api.depends('date_from', 'date_to')
+    def _compute_name(self):
+        for batch in self:
+            batch.name = _('DGII Reports %(date_from)s - %(date_to)s') % {
+                'date_from': batch.date_from,
+                'date_to': batch.date_to,
+            }
+
+    @api.depends('job_ids.state', 'job_ids.progress', 'zip_attachment_id')
+    def _compute_state(self):
+        for batch in self:
+            states = set(batch.job_ids.mapped('state'))
+            if not batch.job_ids:
+                batch.state = 'draft'
+            elif batch.zip_attachment_id:
+                batch.state = 'done'
+            elif 'failed' in states and not states & {'queued', 'running'}:
+                batch.state = 'failed'
+            else:
+                batch.state = 'running'
+            progresses = batch.job_ids.mapped('progress')
+            batch.progress = sum(progresses) / len(progresses) if progresses else 0.0
+
+    @api.constrains('date_from', 'date_to')
+    def _check_dates(self):
+        """Validate date range."""
+        for batch in self:
+            if batch.date_to < batch.date_from:
+                raise ValidationError(_('End date must be after start date.'))
+
+    def action_launch(self):
+        """Queue one background job per company and report."""
+        self.ensure_one()
+
+        if self.job_ids:
+            raise UserError(_('This batch has already been launched.'))
+        report_models = [
+            report_model for report_model, included in (
+                ('dgii.report.606', self.include_606),
+                ('dgii.report.607', self.include_607),
+            ) if included
+        ]
+        if not report_models:
+            raise UserError(_('Please select at least one report.'))
+
+        self.env['dgii.report.job'].create([{
+            'batch_id': self.id,
+            'report_model': report_model,
+            'company_id': company.id,
+            'date_from': self.date_from,
+            'date_to': self.date_to,
+            'export_format': self.export_format,
+        } for company in self.company_ids for report_model in report_models])
+
+    def _job_done(self):
+        """Build the deliverable once the last job of the batch is done.
+
+        Jobs finish in parallel workers: the batch row is locked so that the
+        last one to commit sees all the others done.
+        """
+        self.ensure_one()
+        self.env.cr.execute("SELECT id FROM dgii_report_batch WHERE id = %s FOR UPDATE", (self.id,))
+        self.invalidate_recordset()
+        self.job_ids.invalidate_recordset(['state'])
+        if not self.zip_attachment_id and all(job.state == 'done' for job in self.job_ids):
+            self._build_deliverable()
+
+    def _build_deliverable(self):
+        """Zip the files of all the jobs, one folder per company."""
+        self.ensure_one()
+
+        Attachment = self.env['ir.attachment']
+        with tempfile.TemporaryFile(prefix='dgii_', suffix='.zip') as file:
+            # Files are copied in chunks, none is loaded in memory as a whole
+            with zipfile.ZipFile(file, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for job in self.job_ids:
+                    folder = (job.company_id.dgii_rnc or job.company_id.name).replace('/', '-')
+                    for attachment in job.attachment_ids:
+                        with attachment._open_file() as source, \
+                                archive.open(f'{folder}/{attachment.name}', 'w') as target:
+                            shutil.copyfileobj(source, target, Attachment._STREAM_CHUNK_SIZE)
+
+            self.zip_attachment_id = Attachment._create_from_file(file, {
+                'name': f'DGII_{self.date_from.strftime("%Y%m")}_{self.date_to.strftime("%Y%m")}.zip',
+                'res_model': self._name,
+                'res_id': self.id,
+                'mimetype': 'application/zip',
+            })
+        _logger.info(f"DGII report batch {self.id}: deliverable built from {len(self.job_ids)} jobs")
+
+    def action_download(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{self.zip_attachment_id.id}?download=true',
+            'target': 'self',
+        }
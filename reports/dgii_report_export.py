@@ -0,0 +1,479 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, Command, _
+from odoo.exceptions import ValidationError
+import csv
+import datetime
+import io
+import json
+import tempfile
+import xlsxwriter
+from xlsxwriter.utility import xl_col_to_name
+
+
+def _json_default(value):
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    # numeric columns read in SQL come back as Decimal
+    return float(value)
+
+
+class DGIITxtExportWriter:
+    """DGII TXT file, one record per row as defined by the report.
+
+    Writers write to a temporary file, so memory stays bounded whatever the
+    row count; ``close()`` hands the file over, rewound, to the caller that
+    stores and closes it.
+    """
+
+    file_format = 'txt'
+
+    def __init__(self, report, columns):
+        self.report = report
+        self.file = tempfile.TemporaryFile(prefix='dgii_')
+        self.output = io.TextIOWrapper(self.file, encoding='utf-8', newline='')
+        self.row_count = 0
+
+    def write_row(self, row, values):
+        if self.row_count:
+            self.output.write('\n')
+        self.output.write(self.report._get_txt_record(row, values))
+        self.row_count += 1
+
+    def close(self):
+        self.output.detach()
+        self.file.seek(0)
+        return self.file
+
+
+class DGIICsvExportWriter(DGIITxtExportWriter):
+    """CSV file with the formatted column values."""
+
+    file_format = 'csv'
+
+    def __init__(self, report, columns):
+        super().__init__(report, columns)
+        self.columns = columns
+        self.writer = csv.writer(self.output, delimiter=',', quotechar='"', quoting=csv.QUOTE_ALL)
+
+        # Header
+        self.writer.writerow([column['csv_header'] for column in columns])
+
+    def write_row(self, row, values):
+        self.writer.writerow([values[column['key']] for column in self.columns])
+
+
+class DGIIXlsxExportWriter:
+    """Excel workbook with typed cells and a totals row.
+
+    Uses xlsxwriter's constant_memory mode into a temporary file: each row is
+    flushed to disk as soon as the next one starts, so memory stays bounded
+    whatever the row count. Rows must therefore be written strictly in order
+    (header, data rows, totals).
+    """
+
+    file_format = 'xlsx'
+
+    def __init__(self, report, columns):
+        self.columns = columns
+        self.file = tempfile.TemporaryFile(prefix='dgii_', suffix='.xlsx')
+        self.workbook = xlsxwriter.Workbook(self.file, {'constant_memory': True})
+        self.worksheet = self.workbook.add_worksheet(report._export_sheet_name)
+        self.row = 0
+
+        # Define formats
+        self.header_format = self.workbook.add_format({
+            'bold': True,
+            'bg_color': '#D9EDF7',
+            'font_color': '#31708F',
+            'border': 1
+        })
+        self.cell_formats = {
+            'money': self.workbook.add_format({
+                'num_format': '#,##0.00',
+                'border': 1
+            }),
+            'text': self.workbook.add_format({
+                'border': 1
+            }),
+            'date': self.workbook.add_format({
+                'num_format': 'dd/mm/yyyy',
+                'border': 1
+            }),
+        }
+        self.cell_formats['bool'] = self.cell_formats['text']
+
+        # Headers
+        for col, column in enumerate(columns):
+            self.worksheet.write(0, col, column['xlsx_header'], self.header_format)
+            self.worksheet.set_column(col, col, 15)
+
+    def write_row(self, row, values):
+        self.row += 1
+        for col, column in enumerate(self.columns):
+            kind = column['kind']
+            value = values[column['key']] if kind == 'bool' else row[column['key']]
+            self.worksheet.write(self.row, col, value, self.cell_formats[kind])
+
+    def close(self):
+        # Add totals row under the money columns
+        money_cols = [col for col, column in enumerate(self.columns) if column['kind'] == 'money']
+        total_row = self.row + 2
+        self.worksheet.write(total_row, money_cols[0] - 1, 'TOTALES:', self.header_format)
+        for col in money_cols:
+            letter = xl_col_to_name(col)
+            self.worksheet.write(total_row, col, f'=SUM({letter}2:{letter}{self.row + 1})',
+                                 self.cell_formats['money'])
+
+        self.workbook.close()
+        self.file.seek(0)
+        return self.file
+
+
+class DGIIReportExportMixin(models.AbstractModel):
+    _name = 'dgii.report.export.mixin'
+    _description = 'DGII Report Export Engine'
+
+    _export_writers = {
+        'txt': DGIITxtExportWriter,
+        'csv': DGIICsvExportWriter,
+        'xlsx': DGIIXlsxExportWriter,
+    }
+    _export_sheet_name = 'Reporte'
+    # Row key holding the id of its source record
+    _row_source_key = 'invoice_id'
+
+    # Export Fields
+    export_format = fields.Selection([
+        ('txt', 'TXT File (DGII Format)'),
+        ('xlsx', 'Excel File (XLSX)'),
+        ('csv', 'CSV File'),
+        ('all', 'All Formats (TXT, XLSX, CSV)'),
+    ], string='Export Format', default='txt')
+
+    export_filename = fields.Char(
+        string='Export Filename',
+        readonly=True
+    )
+
+    export_attachment_ids = fields.Many2many(
+        'ir.attachment',
+        string='Exported Files',
+        readonly=True
+    )
+
+    # Background Job
+    job_id = fields.Many2one(
+        'dgii.report.job',
+        string='Background Job',
+        readonly=True
+    )
+
+    job_state = fields.Selection(
+        related='job_id.state',
+        string='Job State'
+    )
+
+    job_progress = fields.Float(
+        related='job_id.progress',
+        string='Job Progress'
+    )
+
+    job_attachment_ids = fields.Many2many(
+        related='job_id.attachment_ids',
+        string='Job Files'
+    )
+
+    def action_export_report(self):
+        """Export report to file."""
+        self.ensure_one()
+
+        if not self.line_ids:
+            raise ValidationError(_('Please generate the report first.'))
+
+        formats = self._get_requested_formats()
+        return self._download_exports(self._store_exports(self._export_files(self.line_ids, formats)))
+
+    def action_generate_and_export(self):
+        """Export straight from the database, without creating report lines.
+
+        Files of a closed period already exported are served again as they
+        are, without regenerating them.
+        """
+        self.ensure_one()
+
+        formats = self._get_requested_formats()
+        attachments = self._get_closed_period_exports(formats)
+        if not attachments:
+            attachments = self._store_exports(self._export_files(self._get_export_rows(), formats))
+        return self._download_exports(attachments)
+
+    def action_run_in_background(self):
+        """Queue the generation and export in a background job."""
+        self.ensure_one()
+
+        self.job_id = self.env['dgii.report.job'].create({
+            'report_model': self._name,
+            'company_id': self.company_id.id,
+            'date_from': self.date_from,
+            'date_to': self.date_to,
+            'export_format': self.export_format,
+        })
+        return self._get_form_action()
+
+    def action_refresh_job(self):
+        """Reload the report to show the progress of its job."""
+        self.ensure_one()
+        return self._get_form_action()
+
+    def action_incremental_export(self):
+        """Export through a new snapshot of the period.
+
+        Only the rows changed since the latest snapshot are recomputed, and
+        the changes come along as a delta report.
+        """
+        self.ensure_one()
+
+        snapshot, rows = self.env['dgii.report.snapshot']._take(self)
+        attachments = self._store_exports(self._export_files(rows, self._get_requested_formats()))
+        attachments |= snapshot.delta_attachment_id
+        self.export_attachment_ids = attachments
+        return self._download_exports(attachments)
+
+    def _get_form_action(self):
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+    def _get_requested_formats(self):
+        if self.export_format == 'all':
+            return ['txt', 'xlsx', 'csv']
+        return [self.export_format or 'txt']
+
+    def _get_export_domain(self, file_format=None):
+        """Domain of the stored exports of this report, company period and format."""
+        domain = [
+            ('report_model', '=', self._name),
+            ('company_id', '=', self.company_id.id),
+            ('date_from', '=', self.date_from),
+            ('date_to', '=', self.date_to),
+        ]
+        if file_format:
+            domain.append(('file_format', '=', file_format))
+        return domain
+
+    def _is_closed_period(self):
+        """Whether the period is locked for the company (tax or fiscal year lock date)."""
+        lock_dates = [
+            lock_date for lock_date in (self.company_id.tax_lock_date, self.company_id.fiscalyear_lock_date)
+            if lock_date
+        ]
+        return bool(lock_dates) and self.date_to <= max(lock_dates)
+
+    def _get_closed_period_exports(self, formats):
+        """Previously stored exports of this closed period, if all formats exist."""
+        if not self._is_closed_period():
+            return self.env['ir.attachment']
+
+        exports = self.env['dgii.report.export'].search(
+            self._get_export_domain() + [('file_format', 'in', formats)],
+            order='id desc'
+        )
+
+        latest = {}
+        for export in exports:
+            latest.setdefault(export.file_format, export)
+        if len(latest) != len(formats):
+            return self.env['ir.attachment']
+        return self.env['ir.attachment'].union(*(
+            latest[file_format].attachment_id for file_format in formats
+        ))
+
+    def _store_exports(self, files):
+        """Store exported files as filestore attachments of export records.
+
+        The attachments belong to dgii.report.export records, so only the
+        accounting users of the company can read them. An export of the same
+        report, period and format with identical content, matched by
+        checksum, is reused instead of being written again.
+        """
+        Export = self.env['dgii.report.export']
+        Attachment = self.env['ir.attachment']
+        attachments = Attachment
+        for file, filename in files:
+            with file:
+                file_format = filename.rsplit('.', 1)[-1]
+                checksum, _size = Attachment._get_file_checksum(file)
+                export = Export.search(
+                    self._get_export_domain(file_format) + [('attachment_id.checksum', '=', checksum)],
+                    limit=1
+                )
+                if not export:
+                    export = Export.create({
+                        'report_model': self._name,
+                        'company_id': self.company_id.id,
+                        'date_from': self.date_from,
+                        'date_to': self.date_to,
+                        'file_format': file_format,
+                    })
+                    export.attachment_id = Attachment._create_from_file(file, {
+                        'name': filename,
+                        'res_model': Export._name,
+                        'res_id': export.id,
+                    })
+            attachments |= export.attachment_id
+
+        self.write({
+            'export_attachment_ids': [Command.set(attachments.ids)],
+            'export_filename': attachments[:1].name if len(attachments) == 1 else False,
+        })
+        return attachments
+
+    def _download_exports(self, attachments):
+        """Download a single file, or show the bundle of files on the report."""
+        if len(attachments) == 1:
+            return {
+                'type': 'ir.actions.act_url',
+                'url': f'/web/content/{attachments.id}?download=true',
+                'target': 'self',
+            }
+
+        return self._get_form_action()
+
+    def _export_files(self, rows, formats):
+        """Write every requested format in a single scan of ``rows``.
+
+        Each row is formatted once and handed to all writers.
+
+        :return: list of (binary file object, filename), one per format; the
+                 files are rewound and must be closed by the caller
+        """
+        columns = self._get_export_columns()
+        writers = [self._export_writers[file_format](self, columns) for file_format in formats]
+
+        for row in rows:
+            values = self._format_export_row(row, columns)
+            for writer in writers:
+                writer.write_row(row, values)
+
+        return [
+            (writer.close(), self._get_export_filename(writer.file_format))
+            for writer in writers
+        ]
+
+    @api.model
+    def _format_export_row(self, row, columns):
+        """Text values of a row, shared by the TXT and CSV writers."""
+        values = {}
+        for column in columns:
+            value = row[column['key']]
+            kind = column['kind']
+            if kind == 'date':
+                value = value.strftime('%d/%m/%Y')
+            elif kind == 'money':
+                value = f"{value:.2f}"
+            elif kind == 'bool':
+                value = 'Sí' if value else 'No'
+            values[column['key']] = value
+        return values
+
+    def _flag_partner_vats(self, rows):
+        """Set the DGII registry status of the partner VAT on each row."""
+        statuses = self.env['dgii.rnc.registry']._get_vat_statuses(row['partner_vat'] for row in rows)
+        for row in rows:
+            row['partner_vat_status'] = statuses.get(row['partner_vat'], False)
+        return rows
+
+    def _serialize_rows(self, rows):
+        """JSON text of rows, with dates as ISO strings and amounts as floats."""
+        return json.dumps(rows, default=_json_default, sort_keys=True)
+
+    def _deserialize_rows(self, payload):
+        """Rows from ``_serialize_rows``, with their dates restored."""
+        date_keys = [column['key'] for column in self._get_export_columns() if column['kind'] == 'date']
+        rows = json.loads(payload)
+        for row in rows:
+            for key in date_keys:
+                row[key] = fields.Date.to_date(row[key])
+        return rows
+
+    def _get_export_rows(self):
+        """Rows of the report read straight from the database."""
+        raise NotImplementedError()
+
+    def _get_report_source_ids(self):
+        """Ordered ids of the source records of the report rows."""
+        raise NotImplementedError()
+
+    def _get_source_rows(self, source_ids):
+        """Rows of the given source records, in the order of ``source_ids``."""
+        raise NotImplementedError()
+
+    def _get_changed_source_ids(self, since):
+        """Ids of the source records of the report modified after ``since``."""
+        raise NotImplementedError()
+
+    def _get_related_source_ids(self, source_ids):
+        """Ids of the source records whose row also depends on the given
+        source records, recomputed along with them by the snapshots."""
+        return []
+
+    def _get_export_columns(self):
+        """Exported columns: dicts with key, csv_header, xlsx_header and kind
+        (text, date, money or bool)."""
+        raise NotImplementedError()
+
+    def _get_txt_record(self, row, values):
+        """One record of the DGII TXT file."""
+        raise NotImplementedError()
+
+    def _get_export_filename(self, file_format):
+        raise NotImplementedError()
+
+
+class DGIIReportExport(models.Model):
+    _name = 'dgii.report.export'
+    _description = 'DGII Report Export File'
+    _order = 'id desc'
+
+    report_model = fields.Selection([
+        ('dgii.report.606', 'Report 606 (Sales)'),
+        ('dgii.report.607', 'Report 607 (Purchases)'),
+    ], string='Report', required=True, readonly=True)
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        readonly=True,
+        index=True
+    )
+
+    date_from = fields.Date(
+        string='From Date',
+        required=True,
+        readonly=True
+    )
+
+    date_to = fields.Date(
+        string='To Date',
+        required=True,
+        readonly=True
+    )
+
+    file_format = fields.Selection([
+        ('txt', 'TXT File (DGII Format)'),
+        ('xlsx', 'Excel File (XLSX)'),
+        ('csv', 'CSV File'),
+    ], string='Format', required=True, readonly=True)
+
+    attachment_id = fields.Many2one(
+        'ir.attachment',
+        string='File',
+        readonly=True,
+        ondelete='cascade'
+    )
@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, Command, _
+import json
+import logging
+import os
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+class DGIIReportJob(models.Model):
+    _name = 'dgii.report.job'
+    _description = 'DGII Report Background Job'
+    _order = 'id desc'
+
+    # Source records read and staged per committed chunk
+    _JOB_CHUNK_SIZE = 2000
+    # Seconds a cron run keeps processing before handing over to a new run
+    _JOB_TIME_BUDGET = 240
+    # Advisory lock namespace serializing job starts per company
+    _JOB_LOCK_KEY = 606607
+    # System parameter with the number of jobs processed in parallel
+    _JOB_WORKERS_PARAM = 'dgii_report_job.workers'
+
+    name = fields.Char(
+        string='Name',
+        compute='_compute_name'
+    )
+
+    report_model = fields.Selection([
+        ('dgii.report.606', 'Report 606 (Sales)'),
+        ('dgii.report.607', 'Report 607 (Purchases)'),
+    ], string='Report', required=True, readonly=True)
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        readonly=True,
+        index=True,
+        default=lambda self: self.env.company
+    )
+
+    date_from = fields.Date(
+        string='From Date',
+        required=True,
+        readonly=True
+    )
+
+    date_to = fields.Date(
+        string='To Date',
+        required=True,
+        readonly=True
+    )
+
+    export_format = fields.Selection([
+        ('txt', 'TXT File (DGII Format)'),
+        ('xlsx', 'Excel File (XLSX)'),
+        ('csv', 'CSV File'),
+        ('all', 'All Formats (TXT, XLSX, CSV)'),
+    ], string='Export Format', required=True, readonly=True, default='txt')
+
+    batch_id = fields.Many2one(
+        'dgii.report.batch',
+        string='Batch',
+        readonly=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='State', required=True, readonly=True, default='queued', index=True)
+
+    # Checkpoint
+    source_ids = fields.Text(
+        string='Source Records',
+        readonly=True,
+        help='Ordered ids of the records of the report, fixed when the job starts'
+    )
+
+    total_count = fields.Integer(
+        string='Total Records',
+        readonly=True
+    )
+
+    processed_count = fields.Integer(
+        string='Processed Records',
+        readonly=True,
+        help='Checkpoint: records already staged in committed chunks'
+    )
+
+    progress = fields.Float(
+        string='Progress (%)',
+        compute='_compute_progress'
+    )
+
+    chunk_ids = fields.One2many(
+        'dgii.report.job.chunk',
+        'job_id',
+        string='Staged Chunks',
+        readonly=True
+    )
+
+    # Result
+    attachment_ids = fields.Many2many(
+        'ir.attachment',
+        string='Exported Files',
+        readonly=True
+    )
+
+    error_message = fields.Text(
+        string='Error',
+        readonly=True
+    )
+
+    date_started = fields.Datetime(
+        string='Started',
+        readonly=True
+    )
+
+    date_done = fields.Datetime(
+        string='Finished',
+        readonly=True
+    )
+
+    @api.depends('report_model', 'date_from', 'date_to')
+    def _compute_name(self):
+        labels = dict(self._fields['report_model'].selection)
+        for job in self:
+            job.name = f"{labels.get(job.report_model, '')} {job.date_from} - {job.date_to}"
+
+    @api.depends('state', 'processed_count', 'total_count')
+    def _compute_progress(self):
+        for job in self:
+            if job.state == 'done':
+                job.progress = 100.0
+            elif job.total_count:
+                # Keep the last percent for the export step
+                job.progress = min(99.0, job.processed_count * 100.0 / job.total_count)
+            else:
+                job.progress = 0.0
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        jobs = super().create(vals_list)
+        self._trigger_processing()
+        return jobs
+
+    def action_retry(self):
+        """Queue failed jobs again; they resume from their checkpoint."""
+        self.filtered(lambda job: job.state == 'failed').write({
+            'state': 'queued',
+            'error_message': False,
+        })
+        self._trigger_processing()
+
+    # Processing
+
+    @api.model
+    def _get_worker_count(self):
+        """Number of jobs processed in parallel: the ``dgii_report_job.workers``
+        system parameter, by default the number of CPU cores."""
+        workers = self.env['ir.config_parameter'].sudo().get_param(self._JOB_WORKERS_PARAM)
+        return max(int(workers or os.cpu_count() or 1), 1)
+
+    @api.model
+    def _get_worker_crons(self):
+        """Crons processing the jobs, one per worker.
+
+        The worker cron is copied up to the number of workers, each copy a
+        worker of its own. Copies beyond that number are archived. Nothing
+        runs while the worker cron itself is archived.
+        """
+        main = self.env.ref(f'{self._module}.ir_cron_dgii_report_job', raise_if_not_found=False)
+        if not main or not main.active:
+            return self.env['ir.cron']
+        main = main.sudo()
+        workers = self._get_worker_count()
+        copies = main.with_context(active_test=False).search([
+            ('id', '!=', main.id),
+            ('model_id', '=', main.model_id.id),
+            ('code', '=', main.code),
+        ], order='id')
+        copies[workers - 1:].filtered('active').write({'active': False})
+        copies = copies[:workers - 1]
+        copies.filtered(lambda cron: not cron.active).write({'active': True})
+        for worker in range(len(copies) + 2, workers + 1):
+            copies |= main.copy({
+                'name': _('%(name)s (Worker %(worker)s)', name=main.name, worker=worker),
+                'active': True,
+            })
+        return main | copies
+
+    @api.model
+    def _trigger_processing(self):
+        for cron in self._get_worker_crons():
+            cron._trigger()
+
+    @api.model
+    def _cron_process_jobs(self):
+        """Cron job processing queued jobs and resuming interrupted ones.
+
+        Each worker cron runs this in a cron worker of the server, a process
+        of its own, and claims jobs with ``SKIP LOCKED``, so jobs of
+        different companies are generated on several CPU cores at once. The
+        parallelism is the number of workers (see ``_get_worker_count``),
+        capped by the server's cron workers (``--max-cron-threads``).
+
+        Each chunk is committed with the job checkpoint, so a worker killed
+        mid-job only loses its current chunk. Work left when the time budget
+        runs out is handed over to a new run of the cron.
+        """
+        if not self._process_jobs(time.monotonic() + self._JOB_TIME_BUDGET):
+            self._trigger_processing()
+
+    @api.model
+    def _process_jobs(self, deadline):
+        """Process jobs one after the other until none is left or ``deadline``.
+
+        :return: whether all available jobs were processed
+        """
+        while time.monotonic() < deadline:
+            job = self._acquire_next_job()
+            if not job:
+                return True
+            if not job._process(deadline):
+                return False
+        return False
+
+    @api.model
+    def _acquire_next_job(self):
+        """Lock the next job to process.
+
+        Running jobs that no other worker holds were interrupted and are
+        resumed first. A queued job only starts while its company has fewer
+        running jobs than its ``dgii_report_job_limit``.
+        """
+        self.env.flush_all()
+        cr = self.env.cr
+        cr.execute("""
+            SELECT id FROM dgii_report_job
+             WHERE state = 'running'
+          ORDER BY id
+             LIMIT 1
+               FOR UPDATE SKIP LOCKED
+        """)
+        row = cr.fetchone()
+        if row:
+            return self.browse(row[0])
+
+        cr.execute("""
+            SELECT id, company_id FROM dgii_report_job
+             WHERE state = 'queued'
+          ORDER BY id
+        """)
+        for job_id, company_id in cr.fetchall():
+            # Serialize starts of the company's jobs until the next commit
+            cr.execute("SELECT pg_advisory_xact_lock(%s, %s)", (self._JOB_LOCK_KEY, company_id))
+            cr.execute("""
+                SELECT count(running.id) < GREATEST(company.dgii_report_job_limit, 1)
+                  FROM res_company company
+             LEFT JOIN dgii_report_job running
+                    ON running.company_id = company.id AND running.state = 'running'
+                 WHERE company.id = %s
+              GROUP BY company.dgii_report_job_limit
+            """, (company_id,))
+            if not cr.fetchone()[0]:
+                continue
+            cr.execute("""
+                SELECT id FROM dgii_report_job
+                 WHERE id = %s AND state = 'queued'
+                   FOR UPDATE SKIP LOCKED
+            """, (job_id,))
+            if cr.fetchone():
+                return self.browse(job_id)
+        return self.browse()
+
+    def _process(self, deadline):
+        """Process the job from its checkpoint until done or ``deadline``.
+
+        :return: whether the job is finished (done or failed)
+        """
+        self.ensure_one()
+        try:
+            if self.state == 'queued':
+                self.write({'state': 'running', 'date_started': fields.Datetime.now()})
+                if not self._commit_and_relock():
+                    return True
+
+            report = self._get_report()
+            if not self.source_ids:
+                source_ids = report._get_report_source_ids()
+                self.write({
+                    'source_ids': json.dumps(source_ids),
+                    'total_count': len(source_ids),
+                    'processed_count': 0,
+                })
+                if not self._commit_and_relock():
+                    return True
+
+            source_ids = json.loads(self.source_ids)
+            while self.processed_count < len(source_ids):
+                if time.monotonic() >= deadline:
+                    self._commit()
+                    return False
+                self._stage_chunk(report, source_ids)
+                if not self._commit_and_relock():
+                    return True
+                self.env.invalidate_all()
+
+            self._export(report)
+            self._commit()
+        except Exception as e:
+            self.env.cr.rollback()
+            _logger.exception(f"DGII report job {self.id} failed")
+            self.write({
+                'state': 'failed',
+                'error_message': str(e),
+                'date_done': fields.Datetime.now(),
+            })
+            self._commit()
+        return True
+
+    def _get_report(self):
+        """Transient report computing the rows and files of the job."""
+        return self.env[self.report_model].with_company(self.company_id).create({
+            'date_from': self.date_from,
+            'date_to': self.date_to,
+            'company_id': self.company_id.id,
+            'export_format': self.export_format,
+        })
+
+    def _stage_chunk(self, report, source_ids):
+        """Compute the rows of the next chunk and move the checkpoint past it."""
+        offset = self.processed_count
+        chunk_ids = source_ids[offset:offset + self._JOB_CHUNK_SIZE]
+        rows = report._get_source_rows(chunk_ids)
+        self.write({
+            'chunk_ids': [Command.create({
+                'sequence': offset,
+                'rows': report._serialize_rows(rows),
+            })],
+            'processed_count': offset + len(chunk_ids),
+        })
+
+    def _export(self, report):
+        """Write the files from the staged chunks and finish the job."""
+        attachments = report._store_exports(
+            report._export_files(self._iter_staged_rows(report), report._get_requested_formats())
+        )
+        self.chunk_ids.unlink()
+        self.write({
+            'state': 'done',
+            'attachment_ids': [Command.set(attachments.ids)],
+            'date_done': fields.Datetime.now(),
+        })
+        if self.batch_id:
+            self.batch_id._job_done()
+
+    def _iter_staged_rows(self, report):
+        """Yield the staged rows, loading one chunk at a time."""
+        Chunk = self.env['dgii.report.job.chunk']
+        for chunk_id in Chunk.search([('job_id', '=', self.id)], order='sequence').ids:
+            yield from report._deserialize_rows(Chunk.browse(chunk_id).rows)
+            Chunk.invalidate_model(['rows'])
+
+    def _commit_and_relock(self):
+        """Commit the checkpoint and lock the job again.
+
+        The commit releases the row lock; if another worker picked the job up
+        in between, it carries on from the checkpoint and this one stops.
+        """
+        self._commit()
+        self.env.cr.execute("""
+            SELECT id FROM dgii_report_job
+             WHERE id = %s AND state = 'running'
+               FOR UPDATE SKIP LOCKED
+        """, (self.id,))
+        locked = bool(self.env.cr.fetchone())
+        self.invalidate_recordset()
+        return locked
+
+    def _commit(self):
+        self.env.cr.commit()  # pylint: disable=invalid-commit
+
+
+class DGIIReportJobChunk(models.Model):
+    _name = 'dgii.report.job.chunk'
+    _description = 'DGII Report Job Staged Chunk'
+    _order = 'sequence'
+    _log_access = False
+
+    job_id = fields.Many2one(
+        'dgii.report.job',
+        string='Job',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    sequence = fields.Integer(
+        string='Offset',
+        required=True
+    )
+
+    rows = fields.Text(
+        string='Rows',
+        required=True,
+        help='JSON list of the report rows of the chunk'
+    )
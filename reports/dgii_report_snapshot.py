@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from odoo.tools import split_every
+from datetime import timedelta
+import hashlib
+import json
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class DGIIReportSnapshot(models.Model):
+    _name = 'dgii.report.snapshot'
+    _description = 'DGII Report Snapshot'
+    _order = 'version desc, id desc'
+
+    # Source records recomputed per chunk
+    _SNAPSHOT_CHUNK_SIZE = 1000
+    # Records modified shortly before the parent watermark are checked
+    # again: transactions still running when it was taken commit later
+    _WATERMARK_MARGIN = timedelta(minutes=10)
+
+    _DELTA_LABELS = {
+        'added': 'Agregado',
+        'modified': 'Modificado',
+        'removed': 'Eliminado',
+    }
+
+    name = fields.Char(
+        string='Name',
+        compute='_compute_name'
+    )
+
+    report_model = fields.Selection([
+        ('dgii.report.606', 'Report 606 (Sales)'),
+        ('dgii.report.607', 'Report 607 (Purchases)'),
+    ], string='Report', required=True, readonly=True)
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        readonly=True,
+        index=True
+    )
+
+    date_from = fields.Date(
+        string='From Date',
+        required=True,
+        readonly=True
+    )
+
+    date_to = fields.Date(
+        string='To Date',
+        required=True,
+        readonly=True
+    )
+
+    version = fields.Integer(
+        string='Version',
+        required=True,
+        readonly=True,
+        default=1
+    )
+
+    parent_id = fields.Many2one(
+        'dgii.report.snapshot',
+        string='Previous Version',
+        readonly=True,
+        ondelete='restrict'
+    )
+
+    watermark = fields.Datetime(
+        string='Watermark',
+        required=True,
+        readonly=True,
+        help='Source records modified after this date are recomputed by the next version'
+    )
+
+    content_hash = fields.Char(
+        string='Content Hash',
+        required=True,
+        readonly=True,
+        help='SHA-256 of the ordered rows of the report'
+    )
+
+    source_ids = fields.Text(
+        string='Source Records',
+        required=True,
+        readonly=True,
+        help='Ordered ids of the source records of the rows'
+    )
+
+    row_count = fields.Integer(
+        string='Rows',
+        readonly=True
+    )
+
+    added_count = fields.Integer(
+        string='Added',
+        readonly=True
+    )
+
+    modified_count = fields.Integer(
+        string='Modified',
+        readonly=True
+    )
+
+    removed_count = fields.Integer(
+        string='Removed',
+        readonly=True
+    )
+
+    line_ids = fields.One2many(
+        'dgii.report.snapshot.line',
+        'snapshot_id',
+        string='Changed Rows',
+        readonly=True
+    )
+
+    delta_attachment_id = fields.Many2one(
+        'ir.attachment',
+        string='Delta Report',
+        readonly=True
+    )
+
+    @api.depends('report_model', 'date_from', 'date_to', 'version')
+    def _compute_name(self):
+        labels = dict(self._fields['report_model'].selection)
+        for snapshot in self:
+            snapshot.name = f"{labels.get(snapshot.report_model, '')} {snapshot.date_from} - {snapshot.date_to} v{snapshot.version}"
+
+    def write(self, vals):
+        raise UserError(_('DGII report snapshots cannot be modified.'))
+
+    def unlink(self):
+        raise UserError(_('DGII report snapshots cannot be deleted.'))
+
+    @api.model
+    def _take(self, report):
+        """Snapshot of the report period, built on top of the latest one.
+
+        Only the source records modified since the latest snapshot's
+        watermark, and the ones new to the period, are recomputed; the other
+        rows come from the snapshot chain.
+
+        :return: (new snapshot, or an empty recordset when nothing changed,
+                  ordered rows of the report)
+        """
+        report.ensure_one()
+        parent = self.search([
+            ('report_model', '=', report._name),
+            ('company_id', '=', report.company_id.id),
+            ('date_from', '=', report.date_from),
+            ('date_to', '=', report.date_to),
+        ], limit=1)
+
+        # write_date of records written from now on is at least this
+        watermark = self.env.cr.now()
+        source_ids = report._get_report_source_ids()
+        current_ids = set(source_ids)
+
+        previous = parent._get_rows(report) if parent else {}
+        if parent:
+            changed = set(report._get_changed_source_ids(parent.watermark - self._WATERMARK_MARGIN))
+            # Rows that depend on a changed, new or removed source record
+            touched = changed | (current_ids - previous.keys()) | (previous.keys() - current_ids)
+            changed.update(report._get_related_source_ids(list(touched)))
+            to_compute = [source_id for source_id in source_ids if source_id in changed or source_id not in previous]
+        else:
+            to_compute = source_ids
+
+        rows = {source_id: row for source_id, (row, _row_hash) in previous.items()}
+        hashes = {source_id: row_hash for source_id, (_row, row_hash) in previous.items()}
+        lines = []
+        delta = []
+        for chunk_ids in split_every(self._SNAPSHOT_CHUNK_SIZE, to_compute):
+            for row in report._get_source_rows(list(chunk_ids)):
+                source_id = row[report._row_source_key]
+                payload = report._serialize_rows([row])
+                row_hash = hashlib.sha1(payload.encode('utf-8')).hexdigest()
+                if hashes.get(source_id) == row_hash:
+                    continue
+                delta.append(('modified' if source_id in previous else 'added', row))
+                lines.append((source_id, 'upsert', payload, row_hash))
+                rows[source_id] = row
+                hashes[source_id] = row_hash
+
+        for source_id in [source_id for source_id in previous if source_id not in current_ids]:
+            delta.append(('removed', rows.pop(source_id)))
+            lines.append((source_id, 'remove', None, None))
+            del hashes[source_id]
+
+        ordered_ids = [source_id for source_id in source_ids if source_id in rows]
+        content_hash = hashlib.sha256('\n'.join(hashes[source_id] for source_id in ordered_ids).encode('utf-8')).hexdigest()
+        ordered_rows = [rows[source_id] for source_id in ordered_ids]
+        if parent and not lines and content_hash == parent.content_hash:
+            return self.browse(), ordered_rows
+
+        version = parent.version + 1 if parent else 1
+        changes = [change for change, _row in delta]
+        delta_attachment = self._store_delta(report, delta, version) if parent else self.env['ir.attachment']
+        snapshot = self.create({
+            'report_model': report._name,
+            'company_id': report.company_id.id,
+            'date_from': report.date_from,
+            'date_to': report.date_to,
+            'version': version,
+            'parent_id': parent.id,
+            'watermark': watermark,
+            'content_hash': content_hash,
+            'source_ids': json.dumps(ordered_ids),
+            'row_count': len(ordered_ids),
+            'added_count': changes.count('added'),
+            'modified_count': changes.count('modified'),
+            'removed_count': changes.count('removed'),
+            'delta_attachment_id': delta_attachment.id,
+        })
+        if delta_attachment:
+            # The delta belongs to its snapshot: readable by the users who can read the snapshot
+            delta_attachment.sudo().res_id = snapshot.id
+        snapshot._insert_lines(lines)
+        _logger.info(f"DGII snapshot {snapshot.name}: {len(to_compute)} of {len(source_ids)} rows recomputed, {len(lines)} changed")
+        return snapshot, ordered_rows
+
+    def _get_chain(self):
+        """This snapshot and all its previous versions."""
+        chain = self
+        while chain[-1:].parent_id:
+            chain |= chain[-1].parent_id
+        return chain
+
+    def _get_rows(self, report):
+        """Rows of the snapshot, folded from its chain of changed rows.
+
+        :return: dict {source_id: (row, row_hash)}
+        """
+        self.ensure_one()
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (line.source_id) line.source_id, line.operation, line.row_data, line.row_hash
+              FROM dgii_report_snapshot_line line
+              JOIN dgii_report_snapshot snapshot ON snapshot.id = line.snapshot_id
+             WHERE line.snapshot_id IN %s
+          ORDER BY line.source_id, snapshot.version DESC
+        """, (tuple(self._get_chain().ids),))
+        return {
+            source_id: (report._deserialize_rows(row_data)[0], row_hash)
+            for source_id, operation, row_data, row_hash in self.env.cr.fetchall()
+            if operation == 'upsert'
+        }
+
+    def _insert_lines(self, lines):
+        """Store the changed rows (one multi-row INSERT per chunk, no ORM overhead)."""
+        for chunk in split_every(self._SNAPSHOT_CHUNK_SIZE, lines):
+            self.env.cr.execute(f"""
+                INSERT INTO dgii_report_snapshot_line
+                       (snapshot_id, source_id, operation, row_data, row_hash)
+                VALUES {', '.join(['%s'] * len(chunk))}
+            """, [(self.id, *line) for line in chunk])
+
+    @api.model
+    def _store_delta(self, report, delta, version):
+        """CSV of the added, modified and removed rows, to attach to the new snapshot."""
+        columns = [{'key': 'change', 'csv_header': 'Cambio', 'xlsx_header': 'Cambio', 'kind': 'text'}]
+        columns += report._get_export_columns()
+        writer = report._export_writers['csv'](report, columns)
+        for change, row in delta:
+            row = dict(row, change=self._DELTA_LABELS[change])
+            writer.write_row(row, report._format_export_row(row, columns))
+
+        filename = report._get_export_filename('csv').rsplit('.', 1)[0]
+        with writer.close() as file:
+            return self.env['ir.attachment']._create_from_file(file, {
+                'name': f'{filename}_delta_v{version}.csv',
+                'res_model': self._name,
+            })
+
+
+class DGIIReportSnapshotLine(models.Model):
+    _name = 'dgii.report.snapshot.line'
+    _description = 'DGII Report Snapshot Changed Row'
+    _order = 'snapshot_id, id'
+    _log_access = False
+
+    snapshot_id = fields.Many2one(
+        'dgii.report.snapshot',
+        string='Snapshot',
+        required=True,
+        readonly=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    source_id = fields.Integer(
+        string='Source Record',
+        required=True,
+        readonly=True,
+        index=True
+    )
+
+    operation = fields.Selection([
+        ('upsert', 'Added or Modified'),
+        ('remove', 'Removed'),
+    ], string='Operation', required=True, readonly=True)
+
+    row_data = fields.Text(
+        string='Row',
+        readonly=True,
+        help='JSON of the report row'
+    )
+
+    row_hash = fields.Char(
+        string='Row Hash',
+        readonly=True
+    )
+
+    def write(self, vals):
+        raise UserError(_('DGII report snapshots cannot be modified.'))
+
+    def unlink(self):
+        raise UserError(_('DGII report snapshots cannot be deleted.'))
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+from . import test_ncf_sequence_allocation
+from . import test_dgii_report_query_plans
+from . import test_dgii_report_export
+from . import test_dgii_report_job
+from . import test_dgii_report_snapshot
+from . import test_ncf_fiscal_cube
+from . import test_ncf_statistics
+from . import test_supplier_ncf_validation
+from . import test_supplier_ncf_field
+from . import test_dgii_rnc_registry
+from . import test_vat_validation
+from . import test_ncf_sequence_audit
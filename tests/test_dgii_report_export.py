@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import time
+import tracemalloc
+from datetime import date
+
+from odoo.exceptions import AccessError
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase, new_test_user
+
+_logger = logging.getLogger(__name__)
+
+
+class DGIIReportExportCase(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.report = cls.env['dgii.report.606'].create({
+            'date_from': date(2025, 1, 1),
+            'date_to': date(2025, 1, 31),
+        })
+
+    def _rows(self, count):
+        for index in range(count):
+            yield {
+                'ncf_number': f'B02{index:08d}',
+                'document_type_code': '02',
+                'invoice_date': date(2025, 1, 1 + index % 28),
+                'partner_name': f'Cliente {index}',
+                'partner_vat': '101010101',
+                'subtotal': 100.0,
+                'tax_amount': 18.0,
+                'total_amount': 118.0,
+                'currency_code': 'DOP',
+            }
+
+
+@tagged('post_install', '-at_install')
+class TestDGIIReportExport(DGIIReportExportCase):
+
+    def test_all_formats_single_pass(self):
+        files = self.report._export_files(self._rows(3), ['txt', 'xlsx', 'csv'])
+        self.assertEqual([filename.rsplit('.', 1)[1] for _file, filename in files], ['txt', 'xlsx', 'csv'])
+
+        contents = []
+        for file, _filename in files:
+            with file:
+                contents.append(file.read())
+        txt = contents[0].decode('utf-8')
+        csv = contents[2].decode('utf-8')
+        self.assertEqual(len(txt.split('\n')), 3)
+        self.assertIn('|B0200000000|01/01/2025|Cliente 0|101010101|100.00|18.00|118.00', txt)
+        self.assertEqual(len(csv.splitlines()), 4)
+        self.assertEqual(contents[1][:2], b'PK')
+
+    def test_store_exports_streams_files(self):
+        attachments = self.report._store_exports(self.report._export_files(self._rows(3), ['txt', 'csv']))
+        self.assertEqual(len(attachments), 2)
+        txt = attachments.filtered(lambda attachment: attachment.name.endswith('.txt'))
+        self.assertEqual(len(txt.raw.decode('utf-8').split('\n')), 3)
+        self.assertEqual(txt.file_size, len(txt.raw))
+
+        # Same content again: the stored attachments are reused
+        self.assertEqual(self.report._store_exports(self.report._export_files(self._rows(3), ['txt', 'csv'])), attachments)
+
+    def test_exports_restricted_to_accounting(self):
+        attachments = self.report._store_exports(self.report._export_files(self._rows(1), ['txt']))
+        self.assertEqual(attachments.res_model, 'dgii.report.export')
+
+        employee = new_test_user(self.env, login='dgii_employee', groups='base.group_user')
+        with self.assertRaises(AccessError):
+            attachments.with_user(employee).read(['name'])
+        accountant = new_test_user(self.env, login='dgii_accountant', groups='account.group_account_invoice')
+        self.assertTrue(attachments.with_user(accountant).read(['name']))
+
+
+@tagged('post_install', '-at_install', '-standard', 'ncf_perf')
+class TestDGIIReportExportBenchmark(DGIIReportExportCase):
+
+    def _measure_xlsx(self, count):
+        """Peak memory of the export up to the written file, storage excluded."""
+        tracemalloc.start()
+        start = time.perf_counter()
+        [(file, _filename)] = self.report._export_files(self._rows(count), ['xlsx'])
+        elapsed = time.perf_counter() - start
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        file.close()
+        _logger.info(f"XLSX export of {count} rows: {elapsed:.2f}s, peak {peak / 1024 / 1024:.1f} MiB")
+        return peak
+
+    def test_xlsx_memory_bounded(self):
+        """Peak memory of the XLSX writer must not grow with the row count."""
+        small_peak = self._measure_xlsx(10000)
+        large_peak = self._measure_xlsx(300000)
+        self.assertLess(large_peak, small_peak * 2)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import time
+import zipfile
+from contextlib import contextmanager
+from datetime import date
+from unittest.mock import patch
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestDGIIReportJob(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Job = cls.env['dgii.report.job']
+        cls.Report606 = type(cls.env['dgii.report.606'])
+        cls.job = cls.Job.create({
+            'report_model': 'dgii.report.606',
+            'date_from': date(2025, 1, 1),
+            'date_to': date(2025, 1, 31),
+        })
+
+    def setUp(self):
+        super().setUp()
+        # Jobs commit their checkpoints: they run on test cursors, whose
+        # commits stay within the test transaction
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+
+    @contextmanager
+    def _job_env(self):
+        """Environment on a test cursor, as the one of a job worker."""
+        self.env.flush_all()
+        with self.registry.cursor() as cr:
+            yield self.env(cr=cr)
+        self.env.invalidate_all()
+
+    def _rows(self, source_ids):
+        return [{
+            'ncf_number': f'B02{source_id:08d}',
+            'document_type_code': '02',
+            'invoice_date': date(2025, 1, source_id),
+            'partner_name': f'Cliente {source_id}',
+            'partner_vat': '101010101',
+            'subtotal': 100.0,
+            'tax_amount': 18.0,
+            'total_amount': 118.0,
+            'currency_code': 'DOP',
+        } for source_id in source_ids]
+
+    def test_job_runs_to_completion(self):
+        with patch.object(self.Report606, '_get_report_source_ids', return_value=[1, 2, 3]), \
+             patch.object(self.Report606, '_get_source_rows', side_effect=self._rows), \
+             patch.object(type(self.Job), '_JOB_CHUNK_SIZE', 2):
+            with self._job_env() as env:
+                job = env['dgii.report.job']._acquire_next_job()
+                self.assertEqual(job, self.job)
+                self.assertTrue(job._process(time.monotonic() + 60))
+
+        self.assertEqual(self.job.state, 'done')
+        self.assertEqual(self.job.progress, 100.0)
+        self.assertFalse(self.job.chunk_ids)
+        txt = self.job.attachment_ids.raw.decode('utf-8')
+        self.assertEqual(txt.split('\n')[2].split('|')[2:4], ['B0200000003', '03/01/2025'])
+
+    def test_job_resumes_from_checkpoint(self):
+        """An interrupted job only computes the chunks after its checkpoint."""
+        self.job.write({
+            'state': 'running',
+            'source_ids': json.dumps([1, 2, 3, 4, 5]),
+            'total_count': 5,
+        })
+        with patch.object(self.Report606, '_get_source_rows', side_effect=self._rows) as get_rows, \
+             patch.object(type(self.Job), '_JOB_CHUNK_SIZE', 2):
+            with self._job_env() as env:
+                job = self.job.with_env(env)
+                job._stage_chunk(job._get_report(), [1, 2, 3, 4, 5])
+                self.assertEqual(job.processed_count, 2)
+                get_rows.reset_mock()
+
+                job._process(time.monotonic() + 60)
+
+        self.assertEqual([call.args[0] for call in get_rows.call_args_list], [[3, 4], [5]])
+        self.assertEqual(self.job.state, 'done')
+        self.assertEqual(len(self.job.attachment_ids.raw.decode('utf-8').split('\n')), 5)
+
+    def test_job_starts_with_nothing_running(self):
+        self.job.company_id.dgii_report_job_limit = 1
+        self.env.flush_all()
+        self.assertEqual(self.Job._acquire_next_job(), self.job)
+
+    def test_company_concurrency_limit(self):
+        self.job.company_id.dgii_report_job_limit = 1
+        self.Job.create({
+            'report_model': 'dgii.report.607',
+            'date_from': date(2025, 1, 1),
+            'date_to': date(2025, 1, 31),
+            'state': 'running',
+            'source_ids': '[]',
+        }).flush_recordset()
+        # The running job is resumed, the queued one waits for the company slot
+        self.assertNotEqual(self.Job._acquire_next_job(), self.job)
+        self.Job.search([('state', '=', 'running')]).state = 'done'
+        self.env.flush_all()
+        self.assertEqual(self.Job._acquire_next_job(), self.job)
+
+    def test_batch_zips_company_files(self):
+        company_b = self.env['res.company'].create({'name': 'Empresa B', 'dgii_rnc': '131000002'})
+        batch = self.env['dgii.report.batch'].create({
+            'date_from': date(2025, 1, 1),
+            'date_to': date(2025, 1, 31),
+            'company_ids': [(6, 0, [self.env.company.id, company_b.id])],
+            'include_607': False,
+        })
+        batch.action_launch()
+        self.assertEqual(len(batch.job_ids), 2)
+
+        with patch.object(self.Report606, '_get_report_source_ids', return_value=[1, 2]), \
+             patch.object(self.Report606, '_get_source_rows', side_effect=self._rows):
+            with self._job_env() as env:
+                self.assertTrue(env['dgii.report.job']._process_jobs(time.monotonic() + 60))
+
+        self.assertEqual(batch.state, 'done')
+        with zipfile.ZipFile(io.BytesIO(batch.zip_attachment_id.raw)) as archive:
+            names = archive.namelist()
+        self.assertEqual(len(names), 2)
+        self.assertIn('131000002/DGII_606_202501_131000002.txt', names)
+
+    def test_trigger_all_worker_crons(self):
+        """Each worker cron runs in a cron worker process of its own."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param(self.Job._JOB_WORKERS_PARAM, 3)
+        crons = self.Job._get_worker_crons()
+        self.assertEqual(len(crons), 3)
+        self.assertTrue(all(crons.mapped('active')))
+
+        ICP.set_param(self.Job._JOB_WORKERS_PARAM, 1)
+        self.assertEqual(self.Job._get_worker_crons(), crons[0])
+        self.assertFalse(any(crons[1:].mapped('active')))
+
+        # Archived copies are reused
+        ICP.set_param(self.Job._JOB_WORKERS_PARAM, 3)
+        Trigger = self.env['ir.cron.trigger']
+        Trigger.search([('cron_id', 'in', crons.ids)]).unlink()
+        self.Job._trigger_processing()
+        self.assertEqual(Trigger.search([('cron_id', 'in', crons.ids)]).cron_id, crons)
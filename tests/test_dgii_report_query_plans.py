@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+from odoo.tools import SQL
+
+
+@tagged('post_install', '-at_install', '-standard', 'ncf_perf')
+class TestDGIIReportQueryPlans(TransactionCase):
+    """Fail when a DGII report query falls back to a sequential scan.
+
+    Loads a synthetic dataset of ``dataset_size`` invoices/bills (half of
+    them with an NCF assignment, the other half with a supplier NCF) spread
+    over several years, then checks the plan of the 606 and 607 report
+    queries for one month: the ORM searches and the statements the reports
+    run.
+    """
+
+    dataset_size = 1000000
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company = cls.env.company
+        partner = cls.env['res.partner'].create({'name': 'DGII Plan Partner', 'vat': '101010101'})
+        template = cls.env['account.move'].create({
+            'move_type': 'out_invoice',
+            'partner_id': partner.id,
+            'invoice_date': date(2025, 1, 15),
+        })
+        sequence = cls.env['ncf.sequence'].create({
+            'prefix': 'B98',
+            'document_type': 'unique',
+            'start_number': 1,
+            'end_number': 99999999,
+            'current_number': cls.dataset_size + 1,
+            'start_date': date(2020, 1, 1),
+            'expiry_date': fields.Date.today() + timedelta(days=365),
+            'state': 'inactive',
+        })
+        cls.env.flush_all()
+        cls._load_dataset(template, sequence)
+
+    @classmethod
+    def _load_dataset(cls, template, sequence):
+        cr = cls.env.cr
+        cr.execute("""
+            SELECT column_name
+              FROM information_schema.columns
+             WHERE table_name = 'account_move' AND column_name != 'id'
+        """)
+        overrides = {
+            'name': "'PLAN/' || g",
+            'date': "DATE '2020-01-01' + (g %% 2000)",
+            'invoice_date': "DATE '2020-01-01' + (g %% 2000)",
+            'state': "CASE WHEN g %% 10 = 0 THEN 'draft' ELSE 'posted' END",
+            'move_type': """CASE g %% 4 WHEN 0 THEN 'out_invoice' WHEN 1 THEN 'out_refund'
+                                       WHEN 2 THEN 'in_invoice' ELSE 'in_refund' END""",
+            'supplier_ncf': "CASE WHEN g %% 4 >= 2 THEN 'B01' || lpad(g::text, 8, '0') END",
+            'ref': "CASE WHEN g %% 4 >= 2 THEN 'B01-' || lpad(g::text, 8, '0') END",
+        }
+        columns = [row[0] for row in cr.fetchall()]
+        cr.execute(f"""
+            INSERT INTO account_move ({', '.join(f'"{column}"' for column in columns)})
+            SELECT {', '.join(overrides.get(column, f'"{column}"') for column in columns)}
+              FROM account_move, generate_series(1, %s) g
+             WHERE account_move.id = %s
+        """, (cls.dataset_size, template.id))
+        cr.execute("""
+            INSERT INTO ncf_assignment
+                   (ncf_number, sequence_id, invoice_id, company_id, assignment_date,
+                    prefix, document_type, invoice_state, invoice_move_type, partner_id)
+            SELECT 'B98' || lpad(row_number() OVER (ORDER BY id)::text, 8, '0'),
+                   %s, id, company_id, invoice_date::timestamp,
+                   'B98', 'unique', state, move_type, partner_id
+              FROM account_move
+             WHERE name LIKE 'PLAN/%%'
+               AND move_type IN ('out_invoice', 'out_refund')
+        """, (sequence.id,))
+        cr.execute("ANALYZE account_move")
+        cr.execute("ANALYZE ncf_assignment")
+
+    def _capture_statement(self, marker, func, *args):
+        """Statement containing ``marker`` executed by ``func(*args)``."""
+        statements = []
+        execute = self.env.cr.execute
+
+        def capture(query, params=None, log_exceptions=True):
+            statements.append(query)
+            return execute(query, params, log_exceptions)
+
+        with patch.object(self.env.cr, 'execute', side_effect=capture):
+            func(*args)
+        matches = [query for query in statements if isinstance(query, SQL) and marker in query.code]
+        self.assertTrue(matches, f"No report statement containing {marker!r} was executed")
+        return matches[0]
+
+    def _assert_no_seq_scan(self, statement):
+        """Check the plan of ``statement`` and return its index names."""
+        self.env.cr.execute(SQL("EXPLAIN (FORMAT JSON) %s", statement))
+        plan = self.env.cr.fetchone()[0][0]['Plan']
+        nodes = [plan]
+        indexes = set()
+        while nodes:
+            node = nodes.pop()
+            nodes.extend(node.get('Plans', []))
+            if 'Index Name' in node:
+                indexes.add(node['Index Name'])
+            if node['Node Type'] == 'Seq Scan':
+                self.assertNotIn(
+                    node['Relation Name'], ('ncf_assignment', 'account_move'),
+                    f"Sequential scan on {node['Relation Name']} in report query plan"
+                )
+        return indexes
+
+    def _create_report(self, model):
+        return self.env[model].create({
+            'date_from': date(2023, 3, 1),
+            'date_to': date(2023, 3, 31),
+            'company_id': self.company.id,
+        })
+
+    def test_report_606_plan(self):
+        report = self._create_report('dgii.report.606')
+        query = self.env['ncf.assignment']._search(
+            report._get_report_domain(), order='assignment_date, ncf_number'
+        )
+        self._assert_no_seq_scan(query.select())
+
+    def test_report_606_rows_plan(self):
+        """The rows query joins the assignments of the month to their invoices."""
+        report = self._create_report('dgii.report.606')
+        statement = self._capture_statement('FROM ncf_assignment assignment', report._get_report_rows)
+        self.assertIn('ncf_assignment_dgii_606_idx', self._assert_no_seq_scan(statement))
+
+    def test_report_607_plan(self):
+        report = self._create_report('dgii.report.607')
+        query = self.env['account.move']._search(
+            report._get_report_domain(), order='invoice_date, name'
+        )
+        self._assert_no_seq_scan(query.select())
+
+    def test_report_607_supplier_ncf_plan(self):
+        """The supplier NCF check of a chunk looks up its keys, not the period."""
+        report = self._create_report('dgii.report.607')
+        bill_ids = report._get_report_source_ids()[:report._REPORT_CHUNK_SIZE]
+        self.assertTrue(bill_ids)
+        statement = self._capture_statement(
+            'COALESCE(move.supplier_ncf, move.ref)', report._get_supplier_ncf_exceptions, bill_ids
+        )
+        self.assertIn('account_move_supplier_ncf_key_idx', self._assert_no_seq_scan(statement))
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+from unittest.mock import patch
+
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestDGIIReportSnapshot(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Snapshot = cls.env['dgii.report.snapshot']
+        cls.Report606 = type(cls.env['dgii.report.606'])
+        cls.report = cls.env['dgii.report.606'].create({
+            'date_from': date(2025, 1, 1),
+            'date_to': date(2025, 1, 31),
+        })
+        cls.partner_names = {}
+
+    def _rows(self, source_ids):
+        return [{
+            'assignment_id': source_id,
+            'ncf_number': f'B02{source_id:08d}',
+            'document_type_code': '02',
+            'invoice_date': date(2025, 1, source_id),
+            'invoice_id': source_id,
+            'partner_name': self.partner_names.get(source_id, f'Cliente {source_id}'),
+            'partner_vat': '101010101',
+            'subtotal': 100.0,
+            'tax_amount': 18.0,
+            'total_amount': 118.0,
+            'currency_code': 'DOP',
+        } for source_id in source_ids]
+
+    def _take(self, source_ids, changed_ids):
+        with patch.object(self.Report606, '_get_report_source_ids', return_value=source_ids), \
+             patch.object(self.Report606, '_get_changed_source_ids', return_value=changed_ids), \
+             patch.object(self.Report606, '_get_source_rows', side_effect=self._rows) as get_rows:
+            snapshot, rows = self.Snapshot._take(self.report)
+        computed = [source_id for call in get_rows.call_args_list for source_id in call.args[0]]
+        return snapshot, rows, computed
+
+    def test_incremental_regeneration(self):
+        base, rows, computed = self._take([1, 2, 3], [])
+        self.assertEqual((base.version, base.row_count, len(base.line_ids)), (1, 3, 3))
+        self.assertEqual(computed, [1, 2, 3])
+        self.assertFalse(base.delta_attachment_id)
+
+        # Nothing changed: no new version and nothing recomputed
+        snapshot, rows, computed = self._take([1, 2, 3], [])
+        self.assertFalse(snapshot)
+        self.assertEqual(computed, [])
+        self.assertEqual([row['ncf_number'] for row in rows], ['B0200000001', 'B0200000002', 'B0200000003'])
+
+        # Row 2 modified, row 3 left the period, row 4 joined it
+        self.partner_names[2] = 'Cliente Renombrado'
+        snapshot, rows, computed = self._take([1, 2, 4], [2])
+        self.assertEqual(computed, [2, 4])
+        self.assertEqual(snapshot.parent_id, base)
+        self.assertEqual(
+            (snapshot.version, snapshot.added_count, snapshot.modified_count, snapshot.removed_count),
+            (2, 1, 1, 1),
+        )
+        self.assertNotEqual(snapshot.content_hash, base.content_hash)
+        self.assertEqual([row['partner_name'] for row in rows], ['Cliente 1', 'Cliente Renombrado', 'Cliente 4'])
+        self.assertEqual(rows[0]['invoice_date'], date(2025, 1, 1))
+
+        delta = snapshot.delta_attachment_id.raw.decode('utf-8').splitlines()
+        self.assertEqual(len(delta), 4)
+        self.assertEqual(sorted(line.split(',')[0] for line in delta[1:]), ['"Agregado"', '"Eliminado"', '"Modificado"'])
+
+        # The folded chain gives back the rows of the new version
+        self.assertEqual(
+            [row['partner_name'] for row, _row_hash in snapshot._get_rows(self.report).values()],
+            ['Cliente 1', 'Cliente Renombrado', 'Cliente 4'],
+        )
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import logging
+import os
+import random
+import tempfile
+import time
+from unittest.mock import patch
+
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase, TransactionCase
+
+from ..tools.rnc_registry import RNCRegistry, compile_registry
+
+_logger = logging.getLogger(__name__)
+
+REGISTRY_LINES = [
+    '101010101|EMPRESA UNO SRL|UNO|SERVICIOS|||||01/01/2000|ACTIVO|NORMAL',
+    '131000002|EMPRESA DOS SRL|DOS|COMERCIO|||||01/01/2010|SUSPENDIDO|NORMAL',
+    '001-1234567-3|JUAN PÉREZ|||||||01/01/2015|ACTIVO|NORMAL',
+    'RNC|NOMBRE|CABECERA',
+]
+
+
+@tagged('post_install', '-at_install')
+class TestRNCRegistryIndex(BaseCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'DGII_RNC.idx')
+
+    def test_lookup(self):
+        self.assertEqual(compile_registry(REGISTRY_LINES, self.path), 3)
+        registry = RNCRegistry(self.path)
+        self.assertEqual(registry.lookup('101010101'), ('EMPRESA UNO SRL', 'ACTIVO'))
+        self.assertEqual(registry.lookup('00112345673'), ('JUAN PÉREZ', 'ACTIVO'))
+        self.assertIsNone(registry.lookup('101010102'))
+        self.assertIsNone(registry.lookup('1010101'))
+        self.assertEqual(registry.get_status('101-01010-1'), 'registered')
+        self.assertEqual(registry.get_status('131000002'), 'inactive')
+        self.assertEqual(registry.get_status('999999999'), 'not_found')
+
+    def test_atomic_refresh(self):
+        compile_registry(REGISTRY_LINES, self.path)
+        registry = RNCRegistry(self.path)
+        compile_registry(['401000008|EMPRESA NUEVA SRL||||||||ACTIVO|'], self.path)
+
+        # Readers keep the previous index until they refresh
+        self.assertTrue(registry.lookup('101010101'))
+        registry.refresh(max_age=0)
+        self.assertIsNone(registry.lookup('101010101'))
+        self.assertEqual(registry.lookup('401000008'), ('EMPRESA NUEVA SRL', 'ACTIVO'))
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['DGII_RNC.idx'])
+
+    def test_empty_file_keeps_index(self):
+        compile_registry(REGISTRY_LINES, self.path)
+        with self.assertRaises(ValueError):
+            compile_registry(['RNC|NOMBRE|CABECERA'], self.path)
+        self.assertEqual(RNCRegistry(self.path).count, 3)
+
+
+@tagged('post_install', '-at_install')
+class TestRNCRegistryValidation(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'DGII_RNC.idx')
+        cls.startClassPatcher(patch.object(
+            type(cls.env['dgii.rnc.registry']), '_get_index_path', lambda self: path
+        ))
+        cls.env['dgii.rnc.registry']._import_registry(REGISTRY_LINES)
+
+    def test_bulk_validation(self):
+        Partner = self.env['res.partner']
+        registered, inactive, unknown, invalid, no_vat = partners = Partner.create([
+            {'name': 'Uno', 'vat': '101010101'},
+            {'name': 'Dos', 'vat': '131000002'},
+            {'name': 'Tres', 'vat': '999999992'},
+            {'name': 'Cuatro', 'vat': '101010102'},
+            {'name': 'Cinco'},
+        ])
+        partners.action_validate_dgii_registry()
+        self.assertEqual(registered.dgii_registry_state, 'registered')
+        self.assertEqual(inactive.dgii_registry_state, 'inactive')
+        self.assertEqual(unknown.dgii_registry_state, 'not_found')
+        self.assertEqual(invalid.dgii_registry_state, 'invalid')
+        self.assertFalse(no_vat.dgii_registry_state)
+
+    def test_import_wizard(self):
+        content = '\r\n'.join(REGISTRY_LINES + ['401000008|EMPRESA NUEVA SRL||||||||ACTIVO|'])
+        wizard = self.env['dgii.rnc.import.wizard'].create({
+            'rnc_file': base64.b64encode(content.encode('latin-1')),
+            'validate_partners': False,
+        })
+        Registry = self.env['dgii.rnc.registry']
+        self.addCleanup(Registry._import_registry, REGISTRY_LINES)
+        wizard.action_import()
+        self.assertEqual(Registry._get_registry().count, 4)
+        self.assertEqual(Registry._lookup('001-1234567-3'), ('JUAN PÉREZ', 'ACTIVO'))
+
+    def test_onchange_fills_name(self):
+        partner = self.env['res.partner'].new({'vat': '101010101'})
+        partner._onchange_vat_dgii_registry()
+        self.assertEqual(partner.name, 'EMPRESA UNO SRL')
+        self.assertEqual(partner.dgii_registry_state, 'registered')
+
+        partner = self.env['res.partner'].new({'vat': '999999992'})
+        self.assertIn('warning', partner._onchange_vat_dgii_registry())
+
+
+@tagged('post_install', '-at_install', '-standard', 'ncf_perf')
+class TestRNCRegistryBenchmark(BaseCase):
+
+    def test_lookups_on_full_registry(self):
+        """Lookups on a registry the size of DGII_RNC.TXT, with no per-process load."""
+        rng = random.Random(23)
+        vats = [f'{rng.randrange(10 ** 8, 10 ** 9)}' for _index in range(500000)]
+        vats += [f'{rng.randrange(10 ** 10, 10 ** 11):011d}' for _index in range(200000)]
+        lines = (f'{vat}|CONTRIBUYENTE {index}|||||||01/01/2000|ACTIVO|NORMAL' for index, vat in enumerate(vats))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'DGII_RNC.idx')
+            start = time.perf_counter()
+            compile_registry(lines, path)
+            compiled = time.perf_counter() - start
+
+            registry = RNCRegistry(path)
+            sample = [rng.choice(vats) for _index in range(200000)]
+            start = time.perf_counter()
+            for vat in sample:
+                registry.lookup(vat)
+            elapsed = time.perf_counter() - start
+
+        _logger.info(f"DGII RNC registry: compiled in {compiled:.2f}s, {elapsed / len(sample) * 1e6:.2f}us per lookup")
+        self.assertLess(elapsed / len(sample), 1e-5)
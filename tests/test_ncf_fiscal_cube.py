@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.tests import tagged
+
+
+@tagged('post_install', '-at_install')
+class TestNCFFiscalCube(AccountTestInvoicingCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.Cube = cls.env['ncf.fiscal.cube']
+        cls.Cube._refresh()
+
+    def _cube(self, period):
+        return self.Cube.search([
+            ('company_id', '=', self.company_data['company'].id),
+            ('period', '=', period),
+            ('move_type', '=', 'out_invoice'),
+        ])
+
+    def test_posting_refreshes_month_slice(self):
+        invoices = self.init_invoice('out_invoice', invoice_date='2024-03-05', products=self.product_a) \
+            | self.init_invoice('out_invoice', invoice_date='2024-03-20', products=self.product_a)
+        invoices.action_post()
+        self.assertEqual(self.Cube._refresh(), 1)
+
+        row = self._cube(date(2024, 3, 1))
+        self.assertEqual(row.move_count, 2)
+        self.assertAlmostEqual(row.amount_total, sum(invoices.mapped('amount_total')))
+
+        # Back to draft: the slice is rebuilt without the invoice
+        invoices[0].button_draft()
+        self.Cube._refresh()
+        self.assertEqual(self._cube(date(2024, 3, 1)).move_count, 1)
+
+        # Nothing queued, nothing refreshed
+        self.assertEqual(self.Cube._refresh(), 0)
+
+    def test_any_posting_path_queues_slice(self):
+        """Moves posted without action_post (auto-post cron, payments, API) reach the cube too."""
+        cron = self.env.ref(f'{self.Cube._module}.ir_cron_ncf_fiscal_cube_refresh')
+        Trigger = self.env['ir.cron.trigger']
+        Trigger.search([('cron_id', '=', cron.id)]).unlink()
+
+        invoice = self.init_invoice('out_invoice', invoice_date='2024-04-10', products=self.product_a)
+        invoice._post(soft=False)
+        self.assertTrue(Trigger.search([('cron_id', '=', cron.id)]))
+        self.assertEqual(self.Cube._refresh(), 1)
+        self.assertEqual(self._cube(date(2024, 4, 1)).move_count, 1)
+
+    def test_waiting_slice_queued_again(self):
+        """A slice already waiting is queued again, and triggers the cron only once."""
+        cron = self.env.ref(f'{self.Cube._module}.ir_cron_ncf_fiscal_cube_refresh')
+        Trigger = self.env['ir.cron.trigger']
+        Dirty = self.env['ncf.fiscal.cube.dirty']
+        Trigger.search([('cron_id', '=', cron.id)]).unlink()
+
+        invoices = self.init_invoice('out_invoice', invoice_date='2024-05-05', products=self.product_a) \
+            | self.init_invoice('out_invoice', invoice_date='2024-05-20', products=self.product_a)
+        invoices[0].action_post()
+        invoices[1].action_post()
+        self.assertEqual(Dirty.search_count([('period', '=', date(2024, 5, 1))]), 2)
+        self.assertEqual(Trigger.search_count([('cron_id', '=', cron.id)]), 1)
+
+        self.assertEqual(self.Cube._refresh(), 1)
+        self.assertFalse(Dirty.search_count([]))
+        self.assertEqual(self._cube(date(2024, 5, 1)).move_count, 2)
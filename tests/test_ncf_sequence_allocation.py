@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+import random
+import threading
+import time
+from datetime import timedelta
+
+from psycopg2 import OperationalError
+
+from odoo import api, fields, SUPERUSER_ID
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase, TransactionCase, get_db_name
+from odoo.modules.registry import Registry
+from odoo.service.model import PG_CONCURRENCY_ERRORS_TO_RETRY
+
+
+@tagged('post_install', '-at_install')
+class TestNCFSequenceAllocation(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.sequence = cls.env['ncf.sequence'].create({
+            'prefix': 'B02',
+            'document_type': 'invoice_consumer',
+            'start_number': 1,
+            'end_number': 3,
+            'current_number': 1,
+            'start_date': fields.Date.today() - timedelta(days=1),
+            'expiry_date': fields.Date.today() + timedelta(days=365),
+            'state': 'active',
+        })
+
+    def test_sequential_numbers(self):
+        self.assertEqual(self.sequence.get_next_ncf(), 'B0200000001')
+        self.assertEqual(self.sequence.get_next_ncf(), 'B0200000002')
+        self.assertEqual(self.sequence.current_number, 3)
+        self.assertEqual(self.sequence.used_numbers, 2)
+
+    def test_usage_counters_follow_allocation(self):
+        self.assertEqual(self.sequence.available_numbers, 3)
+        self.sequence.allocate_block(2)
+        self.assertEqual(self.sequence.available_numbers, 1)
+        self.assertEqual(self.sequence.used_numbers, 2)
+        self.assertFalse(self.sequence.is_low_availability)
+        self.sequence.get_next_ncf()
+        self.assertEqual(self.sequence.available_numbers, 0)
+        self.assertEqual(self.sequence.percentage_used, 100)
+
+    def test_low_availability_follows_company_threshold(self):
+        self.sequence.allocate_block(2)
+        Sequence = self.env['ncf.sequence']
+        self.assertFalse(self.sequence.is_low_availability)
+        self.assertNotIn(self.sequence, Sequence.search([('is_low_availability', '=', True)]))
+
+        self.sequence.company_id.ncf_low_availability_threshold = 50
+        self.assertTrue(self.sequence.is_low_availability)
+        self.assertIn(self.sequence, Sequence.search([('is_low_availability', '=', True)]))
+        self.assertEqual(self.sequence.company_id.get_ncf_statistics()['low_availability_sequences'],
+                         len(Sequence.search([('is_low_availability', '=', True),
+                                              ('company_id', '=', self.sequence.company_id.id)])))
+
+    def test_allocate_block(self):
+        self.assertEqual(self.sequence.allocate_block(2), ['B0200000001', 'B0200000002'])
+        self.assertEqual(self.sequence.current_number, 3)
+        self.assertEqual(self.sequence.state, 'active')
+
+        # All or nothing: the remaining number is not enough for a block of 2
+        with self.assertRaises(UserError):
+            self.sequence.allocate_block(2)
+        self.assertEqual(self.sequence.allocate_block(1), ['B0200000003'])
+        self.assertEqual(self.sequence.state, 'depleted')
+
+    def test_allocate_partial_block(self):
+        self.sequence.get_next_ncf()
+        self.assertEqual(self.sequence.allocate_block(5, partial=True), ['B0200000002', 'B0200000003'])
+        self.assertEqual(self.sequence.state, 'depleted')
+        with self.assertRaises(UserError):
+            self.sequence.allocate_block(5, partial=True)
+
+    def test_depletion(self):
+        for _i in range(3):
+            self.sequence.get_next_ncf()
+        self.assertEqual(self.sequence.state, 'depleted')
+        with self.assertRaises(UserError):
+            self.sequence.get_next_ncf()
+
+    def test_active_sequence_resolver(self):
+        NCFSequence = self.env['ncf.sequence']
+        company_id = self.sequence.company_id.id
+
+        self.assertEqual(NCFSequence._get_active_sequence(company_id, 'invoice_consumer'), self.sequence)
+        misses = NCFSequence.get_resolver_cache_stats()['misses']
+        NCFSequence._get_active_sequence(company_id, 'invoice_consumer')
+        self.assertEqual(NCFSequence.get_resolver_cache_stats()['misses'], misses)
+
+        # Deactivating the sequence invalidates the cached lookup
+        self.sequence.action_deactivate()
+        self.assertFalse(NCFSequence._get_active_sequence(company_id, 'invoice_consumer'))
+
+    def test_expired(self):
+        self.sequence.write({
+            'start_date': fields.Date.today() - timedelta(days=30),
+            'expiry_date': fields.Date.today() - timedelta(days=1),
+        })
+        with self.assertRaises(UserError):
+            self.sequence.get_next_ncf()
+
+
+@tagged('post_install', '-at_install')
+class TestNCFBatchAssignment(AccountTestInvoicingCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.sequence = cls._create_sequence('B02', end_number=3)
+
+    @classmethod
+    def _create_sequence(cls, prefix, end_number, **vals):
+        return cls.env['ncf.sequence'].create({
+            'prefix': prefix,
+            'document_type': 'invoice_consumer',
+            'start_number': 1,
+            'end_number': end_number,
+            'current_number': 1,
+            'start_date': fields.Date.today() - timedelta(days=1),
+            'expiry_date': fields.Date.today() + timedelta(days=365),
+            'state': 'active',
+            **vals,
+        })
+
+    def _create_invoices(self, count, requires_ncf=True):
+        return self.env['account.move'].create([{
+            'move_type': 'out_invoice',
+            'partner_id': self.partner_a.id,
+            'requires_ncf': requires_ncf,
+            'ncf_document_type': 'invoice_consumer',
+        } for _index in range(count)])
+
+    def test_partial_availability(self):
+        # 3 numbers left for 5 invoices: the first 3 are numbered
+        invoices = self._create_invoices(5)
+        self.assertEqual(invoices[:3].mapped('ncf_number'), ['B0200000001', 'B0200000002', 'B0200000003'])
+        self.assertFalse(any(invoices[3:].mapped('ncf_assignment_id')))
+        self.assertEqual(self.sequence.state, 'depleted')
+
+    def test_partial_availability_next_sequence(self):
+        # The invoices left over go on with the next active sequence
+        self._create_sequence('B32', end_number=10)
+        invoices = self._create_invoices(5)
+        self.assertEqual(invoices.mapped('ncf_number'), [
+            'B0200000001', 'B0200000002', 'B0200000003', 'B3200000001', 'B3200000002',
+        ])
+
+    def test_duplicate_ncf_message(self):
+        invoices = self._create_invoices(2, requires_ncf=False)
+        invoices[0]._assign_ncf()
+        # Sequence moved back by hand onto a number already assigned
+        self.sequence.current_number = 1
+        with self.assertRaisesRegex(UserError, 'This NCF number is already assigned to another invoice'):
+            invoices[1]._assign_ncf()
+        self.assertFalse(invoices[1].ncf_assignment_id)
+
+    def test_high_throughput_writes_no_chatter(self):
+        self.sequence.write({'end_number': 100, 'allocation_mode': 'high_throughput'})
+        # Not auto-assigned on create
+        invoices = self._create_invoices(5, requires_ncf=False)
+        self.env.flush_all()
+        self.env.cr.execute("SELECT COALESCE(max(id), 0) FROM mail_message")
+        last_message_id = self.env.cr.fetchone()[0]
+
+        self.assertFalse(invoices._assign_ncf_batch())
+        self.env.flush_all()
+        self.assertEqual(len(invoices.ncf_assignment_id), 5)
+        self.assertFalse(self.env['mail.message'].search_count([('id', '>', last_message_id)]))
+        self.assertTrue(self.sequence.allocation_journal_ids)
+
+
+@tagged('post_install', '-at_install', 'ncf_stress')
+class TestNCFSequenceConcurrency(BaseCase):
+    """Run N concurrent cursors against one committed sequence."""
+
+    workers = 8
+    allocations_per_worker = 50
+
+    def setUp(self):
+        super().setUp()
+        self.registry = Registry(get_db_name())
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            self.sequence_id = env['ncf.sequence'].create({
+                'prefix': 'B99',
+                'document_type': 'payments',
+                'start_number': 1,
+                'end_number': 99999999,
+                'current_number': 1,
+                'start_date': fields.Date.today() - timedelta(days=1),
+                'expiry_date': fields.Date.today() + timedelta(days=365),
+                'state': 'active',
+            }).id
+        self.addCleanup(self._drop_sequence)
+
+    def _drop_sequence(self):
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            env['ncf.sequence'].browse(self.sequence_id).unlink()
+
+    def _allocate(self, results, rollback):
+        for _i in range(self.allocations_per_worker):
+            ncf_number = self._allocate_one(rollback)
+            if not rollback:
+                results.append(ncf_number)
+
+    def _allocate_one(self, rollback):
+        """Allocate one number in its own transaction, retried on
+        serialization failures like the server retries requests."""
+        while True:
+            with self.registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                try:
+                    ncf_number = env['ncf.sequence'].browse(self.sequence_id).get_next_ncf()
+                except OperationalError as e:
+                    if e.pgcode not in PG_CONCURRENCY_ERRORS_TO_RETRY:
+                        raise
+                    cr.rollback()
+                    time.sleep(random.uniform(0.0, 0.01))
+                    continue
+                if rollback:
+                    cr.rollback()
+                return ncf_number
+
+    def test_concurrent_allocation(self):
+        results = []
+        threads = [
+            threading.Thread(target=self._allocate, args=(results, index % 4 == 0))
+            for index in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        committed = (self.workers - len(threads[::4])) * self.allocations_per_worker
+        numbers = sorted(int(ncf[3:]) for ncf in results)
+
+        # No duplicates and no gaps among committed allocations
+        self.assertEqual(len(results), committed)
+        self.assertEqual(numbers, list(range(1, committed + 1)))
+
+        with self.registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            sequence = env['ncf.sequence'].browse(self.sequence_id)
+            self.assertEqual(sequence.current_number, committed + 1)
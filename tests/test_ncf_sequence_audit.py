@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+from odoo import fields
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.tests import tagged
+
+
+@tagged('post_install', '-at_install')
+class TestNCFSequenceAudit(AccountTestInvoicingCommon):
+
+    @classmethod
+    def setUpClass(cls, chart_template_ref=None):
+        super().setUpClass(chart_template_ref=chart_template_ref)
+        cls.sequence = cls._create_sequence('B05', current_number=11)
+
+    @classmethod
+    def _create_sequence(cls, prefix, current_number):
+        return cls.env['ncf.sequence'].create({
+            'prefix': prefix,
+            'document_type': 'unique',
+            'start_number': 1,
+            'end_number': 100,
+            'current_number': current_number,
+            'start_date': fields.Date.today() - timedelta(days=1),
+            'expiry_date': fields.Date.today() + timedelta(days=365),
+            'state': 'active',
+        })
+
+    def _assign(self, sequence, ncf_numbers, company=None):
+        """Insert assignments as they may be found in the database, bypassing the checks."""
+        invoices = self.env['account.move'].create([{
+            'move_type': 'out_invoice',
+            'partner_id': self.partner_a.id,
+        } for _ncf_number in ncf_numbers])
+        self.env.flush_all()
+        for invoice, ncf_number in zip(invoices, ncf_numbers):
+            self.env.cr.execute("""
+                INSERT INTO ncf_assignment (ncf_number, sequence_id, invoice_id, company_id, assignment_date)
+                VALUES (%s, %s, %s, %s, now() at time zone 'UTC')
+            """, (ncf_number, sequence.id, invoice.id, (company or sequence.company_id).id))
+
+    def _issues(self, audit):
+        return sorted((line.issue, line.first_number, line.last_number, line.number_count) for line in audit.line_ids)
+
+    def test_gaps_duplicates_out_of_range(self):
+        # Issued range 1..10
+        self._assign(self.sequence, ['B0500000001', 'B0500000002', 'B0500000004', 'B0500000005',
+                                     'B0500000009', 'B0500000012', 'B0700000003'])
+        # Same number booked under another company, out of reach of the unique constraint
+        self._assign(self.sequence, ['B0500000005'], company=self.company_data_2['company'])
+
+        audit = self.env['ncf.sequence.audit']._audit_sequences(self.sequence)
+        self.assertEqual(self._issues(audit), [
+            ('duplicate', 5, 5, 2),
+            ('gap', 3, 3, 1),
+            ('gap', 6, 8, 3),
+            ('gap', 10, 10, 1),
+            ('out_of_range', 3, 3, 1),
+            ('out_of_range', 12, 12, 1),
+        ])
+        self.assertEqual(audit.assigned_count, 8)
+        self.assertEqual(audit.missing_count, 5)
+        self.assertEqual(audit.duplicate_count, 1)
+        self.assertEqual(audit.out_of_range_count, 2)
+        self.assertEqual(self.sequence.last_audit_id, audit)
+        self.assertEqual(self.sequence.audit_issue_count, 8)
+        self.assertEqual(audit.line_ids.filtered(lambda line: line.issue == 'gap')[1].first_ncf, 'B0500000006')
+
+    def test_clean_and_empty_sequences(self):
+        self._assign(self.sequence, [f'B05{number:08d}' for number in range(1, 11)])
+        empty = self._create_sequence('B06', current_number=4)
+        unused = self._create_sequence('B07', current_number=1)
+
+        audits = self.env['ncf.sequence.audit']._audit_sequences(self.sequence | empty | unused)
+        clean, missing, nothing_issued = audits
+        self.assertFalse(clean.line_ids)
+        self.assertEqual(clean.issue_count, 0)
+        self.assertEqual(self._issues(missing), [('gap', 1, 3, 3)])
+        self.assertFalse(nothing_issued.line_ids)
+
+        stats = self.env.company.get_ncf_statistics()
+        self.assertEqual(stats['audit_issue_sequences'], 1)
+
+    def test_cron_skips_unchanged_sequences(self):
+        Audit = self.env['ncf.sequence.audit']
+        self.env['ncf.sequence']._cron_audit_sequences()
+        audit = self.sequence.last_audit_id
+        self.assertTrue(audit)
+
+        # No number allocated since the last audit
+        self.env['ncf.sequence']._cron_audit_sequences()
+        self.assertEqual(Audit.search([('sequence_id', '=', self.sequence.id)]), audit)
+
+        self.sequence.get_next_ncf()
+        self.env['ncf.sequence']._cron_audit_sequences()
+        self.assertNotEqual(self.sequence.last_audit_id, audit)
+        self.assertEqual(self.sequence.last_audit_id.last_number, 11)
+
+    def test_gc_clean_audits(self):
+        self._assign(self.sequence, [f'B05{number:08d}' for number in range(1, 11)])
+        Audit = self.env['ncf.sequence.audit']
+        old_clean, last_clean = Audit._audit_sequences(self.sequence) | Audit._audit_sequences(self.sequence)
+        broken = self._create_sequence('B06', current_number=4)
+        old_issues = Audit._audit_sequences(broken)
+        Audit._audit_sequences(broken)
+        self.env.flush_all()
+        self.env.cr.execute(
+            "UPDATE ncf_sequence_audit SET audit_date = now() - interval '1 year' WHERE id IN %s",
+            (tuple((old_clean | last_clean | old_issues).ids),)
+        )
+        Audit.invalidate_model(['audit_date'])
+
+        Audit._gc_clean_audits()
+        self.assertFalse(old_clean.exists())
+        self.assertEqual(self.sequence.last_audit_id, last_clean)
+        self.assertTrue(last_clean.exists())
+        self.assertTrue(old_issues.exists())
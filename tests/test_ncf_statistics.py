@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+from odoo.tests.common import TransactionCase
+
+
+@tagged('post_install', '-at_install')
+class TestNCFStatistics(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company_a = cls.env['res.company'].create({
+            'name': 'Empresa A',
+            'ncf_expiry_alert_days': 10,
+            'ncf_low_availability_threshold': 50.0,
+        })
+        cls.company_b = cls.env['res.company'].create({
+            'name': 'Empresa B',
+            'ncf_expiry_alert_days': 60,
+            'ncf_low_availability_threshold': 95.0,
+        })
+        today = fields.Date.today()
+        for company in cls.company_a | cls.company_b:
+            cls.env['ncf.sequence'].create([{
+                # 60% used, expires in 30 days
+                'prefix': 'B01',
+                'document_type': 'invoice',
+                'start_number': 1,
+                'end_number': 10,
+                'current_number': 7,
+                'start_date': today - timedelta(days=1),
+                'expiry_date': today + timedelta(days=30),
+                'state': 'active',
+                'company_id': company.id,
+            }, {
+                'prefix': 'B02',
+                'document_type': 'invoice_consumer',
+                'start_number': 1,
+                'end_number': 10,
+                'current_number': 1,
+                'start_date': today - timedelta(days=1),
+                'expiry_date': today + timedelta(days=365),
+                'state': 'inactive',
+                'company_id': company.id,
+            }])
+
+    def test_statistics_use_company_thresholds(self):
+        stats = (self.company_a | self.company_b).get_ncf_statistics_by_company()
+        self.assertEqual(stats[self.company_a.id], {
+            'total_sequences': 2,
+            'active_sequences': 1,
+            'expiring_sequences': 0,
+            'low_availability_sequences': 1,
+            'audit_issue_sequences': 0,
+        })
+        self.assertEqual(stats[self.company_b.id], {
+            'total_sequences': 2,
+            'active_sequences': 1,
+            'expiring_sequences': 1,
+            'low_availability_sequences': 0,
+            'audit_issue_sequences': 0,
+        })
+        self.assertEqual(self.company_a.get_ncf_statistics(), stats[self.company_a.id])
+
+    def test_company_without_sequences(self):
+        company = self.env['res.company'].create({'name': 'Empresa C'})
+        self.assertEqual(company.get_ncf_statistics()['total_sequences'], 0)
+
+    def test_sequence_flags_match_statistics(self):
+        Sequence = self.env['ncf.sequence']
+        Sequence.update_sequence_states()
+        for company in self.company_a | self.company_b:
+            stats = company.get_ncf_statistics()
+            sequences = Sequence.search([('company_id', '=', company.id)])
+            self.assertEqual(len(sequences.filtered('is_expiring_soon')), stats['expiring_sequences'])
+            self.assertEqual(len(sequences.filtered('is_low_availability')), stats['low_availability_sequences'])
+            self.assertEqual(
+                Sequence.search_count([('company_id', '=', company.id), ('is_low_availability', '=', True)]),
+                stats['low_availability_sequences'],
+            )
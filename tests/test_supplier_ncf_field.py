@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.tests import tagged
+from odoo.tools import mute_logger
+from psycopg2 import IntegrityError
+
+
+@tagged('post_install', '-at_install')
+class TestSupplierNCFField(AccountTestInvoicingCommon):
+
+    def _bill(self, ref, post=True):
+        bill = self.init_invoice('in_invoice', invoice_date='2024-03-05', products=self.product_a)
+        bill.ref = ref
+        if post:
+            bill.action_post()
+        return bill
+
+    def test_normalized_on_write(self):
+        bill = self._bill('x', post=False)
+        bill.supplier_ncf = 'b01-0000 0001'
+        self.assertEqual(bill.supplier_ncf, 'B0100000001')
+
+    def test_unique_per_supplier(self):
+        self._bill('first').supplier_ncf = 'B0100000001'
+        bill = self._bill('second', post=False)
+        bill.supplier_ncf = 'B0100000001'
+        with mute_logger('odoo.sql_db'), self.assertRaises(IntegrityError), self.cr.savepoint():
+            bill.action_post()
+
+    def test_backfill_from_ref(self):
+        first = self._bill('B01-00000001')
+        duplicate = self._bill('b0100000001')
+        other = self._bill('E310000000001')
+        free_text = self._bill('Factura marzo')
+        self.cr.execute("UPDATE account_move SET supplier_ncf = NULL WHERE id IN %s",
+                        (tuple((first | duplicate | other | free_text).ids),))
+        self.env['account.move'].invalidate_model(['supplier_ncf'])
+
+        self.assertEqual(self.env['account.move']._backfill_supplier_ncf(), 2)
+        self.assertEqual(first.supplier_ncf, 'B0100000001')
+        self.assertFalse(duplicate.supplier_ncf)
+        self.assertEqual(other.supplier_ncf, 'E310000000001')
+        self.assertFalse(free_text.supplier_ncf)
+        self.assertEqual(
+            self.env['account.move'].search([('supplier_ncf', '=like', 'B01%')]), first
+        )
+
+    def test_report_607_regenerated_after_fix(self):
+        bill = self._bill('Factura marzo')
+        report = self.env['dgii.report.607'].create({
+            'date_from': '2024-03-01',
+            'date_to': '2024-03-31',
+        })
+        report.action_generate_report()
+        self.assertEqual(report.line_ids.filtered(lambda line: line.invoice_id == bill).ncf_status, 'malformed')
+
+        bill.supplier_ncf = 'B0100000007'
+        report.action_generate_report()
+        line = report.line_ids.filtered(lambda line: line.invoice_id == bill)
+        self.assertEqual(line.ncf_status, 'valid')
+        self.assertTrue(line.ncf_valid)
+
+    def test_report_607_duplicates_across_chunks(self):
+        first = self._bill('B01-00000001')
+        first.supplier_ncf = 'B0100000001'
+        duplicate = self._bill('b0100000001')
+        other = self._bill('B0100000002')
+        self.cr.execute("UPDATE account_move SET supplier_ncf = NULL WHERE id IN %s",
+                        (tuple((duplicate | other).ids),))
+        self.env['account.move'].invalidate_model(['supplier_ncf'])
+        report = self.env['dgii.report.607'].create({
+            'date_from': '2024-03-01',
+            'date_to': '2024-03-31',
+        })
+
+        rows = [row for chunk in report._iter_report_row_chunks(chunk_size=1) for row in chunk]
+        statuses = {row['invoice_id']: row['ncf_status'] for row in rows}
+        self.assertEqual(statuses[first.id], 'duplicate')
+        self.assertEqual(statuses[duplicate.id], 'duplicate')
+        self.assertEqual(statuses[other.id], 'valid')
+
+    def test_report_607_snapshot_flags_new_duplicate(self):
+        first = self._bill('B0100000001')
+        first.supplier_ncf = 'B0100000001'
+        report = self.env['dgii.report.607'].create({
+            'date_from': '2024-03-01',
+            'date_to': '2024-03-31',
+        })
+        Snapshot = self.env['dgii.report.snapshot']
+        Snapshot._take(report)
+        # The first bill and its supplier were not touched since the snapshot
+        self.cr.execute("UPDATE account_move SET write_date = write_date - interval '1 day' WHERE id = %s", (first.id,))
+        self.cr.execute("UPDATE res_partner SET write_date = write_date - interval '1 day' WHERE id = %s",
+                        (first.partner_id.id,))
+        self.env.invalidate_all()
+
+        duplicate = self._bill('b01-00000001')
+        snapshot, rows = Snapshot._take(report)
+        statuses = {row['invoice_id']: row['ncf_status'] for row in rows}
+        self.assertEqual(statuses[first.id], 'duplicate')
+        self.assertEqual(statuses[duplicate.id], 'duplicate')
+        self.assertEqual(snapshot.modified_count, 1)
+        self.assertEqual(snapshot.added_count, 1)
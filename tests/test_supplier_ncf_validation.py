@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import random
+import time
+
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase
+
+from ..tools.ncf_validation import check_supplier_ncfs, normalize_ncf
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install')
+class TestSupplierNCFValidation(BaseCase):
+
+    def test_formats(self):
+        self.assertEqual(check_supplier_ncfs([
+            ('101010101', 'B0100000001'),
+            ('101010101', 'E310000000001'),
+            ('101010101', 'b01 0000 0002'),
+            ('101010101', 'B01000000'),
+            ('101010101', 'A010010011500000001'),
+            ('101010101', 'E3100000001'),
+            ('101010101', False),
+        ]), ['valid', 'valid', 'valid', 'malformed', 'malformed', 'malformed', 'missing'])
+
+    def test_duplicates_per_supplier(self):
+        self.assertEqual(check_supplier_ncfs([
+            ('101010101', 'B0100000001'),
+            ('131000002', 'B0100000001'),
+            ('101010101', 'b01-00000001'),
+            ('101010101', 'B0100000002'),
+        ]), ['duplicate', 'valid', 'duplicate', 'valid'])
+
+    def test_normalize(self):
+        self.assertEqual(normalize_ncf(' b01-0000.0001 '), 'B0100000001')
+        self.assertEqual(normalize_ncf(False), '')
+
+
+@tagged('post_install', '-at_install', '-standard', 'ncf_perf')
+class TestSupplierNCFValidationBenchmark(BaseCase):
+
+    def test_one_million_pairs(self):
+        """Validation must stay within a small factor of plain normalization."""
+        rng = random.Random(607)
+        pairs = [
+            (f'1{rng.randrange(10 ** 8):08d}', f'B01{rng.randrange(10 ** 8):08d}' if index % 10 else f'E31{index:010d}')
+            for index in range(1000000)
+        ]
+
+        start = time.perf_counter()
+        for _vat, ncf in pairs:
+            normalize_ncf(ncf)
+        baseline = time.perf_counter() - start
+
+        start = time.perf_counter()
+        statuses = check_supplier_ncfs(pairs)
+        elapsed = time.perf_counter() - start
+
+        _logger.info(f"Supplier NCF validation of {len(pairs)} pairs: {elapsed:.2f}s (normalization only: {baseline:.2f}s)")
+        self.assertEqual(len(statuses), len(pairs))
+        self.assertLess(elapsed, baseline * 4)
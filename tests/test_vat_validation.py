@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import logging
+import random
+import time
+
+from odoo.exceptions import ValidationError
+from odoo.tests import tagged
+from odoo.tests.common import BaseCase, TransactionCase
+
+from ..tools.vat_validation import check_vats, normalize_vat
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install')
+class TestVATValidation(BaseCase):
+
+    def test_check_digits(self):
+        self.assertEqual(check_vats([
+            '101850043',
+            '1-01-85004-3',
+            '101850042',
+            '00113918205',
+            '001-1391820-5',
+            '00113918204',
+            '1018500',
+            '10185004X',
+            False,
+        ]), ['valid', 'valid', 'invalid', 'valid', 'valid', 'invalid', 'malformed', 'malformed', 'missing'])
+
+    def test_rnc_remainders(self):
+        # Remainders 0 and 1 give the check digits 2 and 1
+        self.assertEqual(check_vats(['101010101', '131000002', '999999992']), ['valid'] * 3)
+
+    def test_normalize(self):
+        self.assertEqual(normalize_vat(' 001-1391820.5 '), '00113918205')
+        self.assertEqual(normalize_vat(False), '')
+
+
+@tagged('post_install', '-at_install')
+class TestCompanyRNCCheckDigit(TransactionCase):
+
+    def test_company_rnc(self):
+        company = self.env['res.company'].create({'name': 'Empresa RNC', 'dgii_rnc': '101850043'})
+        with self.assertRaises(ValidationError):
+            company.dgii_rnc = '101850042'
+
+
+@tagged('post_install', '-at_install', '-standard', 'ncf_perf')
+class TestVATValidationBenchmark(BaseCase):
+
+    def test_one_million_vats(self):
+        """Check digits must stay within a small factor of a plain format check."""
+        rng = random.Random(24)
+        vats = [
+            f'{rng.randrange(10 ** 8, 10 ** 9)}' if index % 3 else f'{rng.randrange(10 ** 11):011d}'
+            for index in range(1000000)
+        ]
+
+        start = time.perf_counter()
+        for vat in vats:
+            vat = normalize_vat(vat)
+            len(vat) in (9, 11) and vat.isdigit()
+        baseline = time.perf_counter() - start
+
+        start = time.perf_counter()
+        statuses = check_vats(vats)
+        elapsed = time.perf_counter() - start
+
+        _logger.info(f"RNC/cédula validation of {len(vats)} VATs: {elapsed:.2f}s (format check only: {baseline:.2f}s)")
+        self.assertEqual(len(statuses), len(vats))
+        self.assertLess(elapsed, baseline * 4)
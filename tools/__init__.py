@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+
+from . import ncf_validation
+from . import rnc_registry
+from . import vat_validation
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""Batch validation of the NCFs received from suppliers."""
+
+import re
+
+# B-series NCF (B + type + 8 digit sequence) or e-CF (E + type + 10 digit sequence)
+SUPPLIER_NCF_RE = re.compile(r'B\d{10}|E\d{12}')
+
+# Separators commonly typed inside an NCF
+_NCF_SEPARATORS = str.maketrans('', '', ' -.')
+
+NCF_STATUS_VALID = 'valid'
+NCF_STATUS_MISSING = 'missing'
+NCF_STATUS_MALFORMED = 'malformed'
+NCF_STATUS_DUPLICATE = 'duplicate'
+
+
+def normalize_ncf(ncf):
+    """NCF without separators, in upper case."""
+    return (ncf or '').translate(_NCF_SEPARATORS).upper()
+
+
+def check_supplier_ncfs(pairs):
+    """Validate (partner_vat, ncf) pairs in a single pass.
+
+    The format is checked with one precompiled pattern. Well-formed NCFs are
+    indexed by (partner_vat, ncf) in a dict: every pair booked more than once
+    is flagged as a duplicate, the first occurrence included.
+
+    :param pairs: iterable of (partner_vat, ncf)
+    :return: list of statuses, one per pair, in the same order
+    """
+    fullmatch = SUPPLIER_NCF_RE.fullmatch
+    translate = str.translate
+    first_index = {}
+    statuses = []
+    append = statuses.append
+    for index, (partner_vat, ncf) in enumerate(pairs):
+        if not ncf:
+            append(NCF_STATUS_MISSING)
+            continue
+        ncf = translate(ncf, _NCF_SEPARATORS).upper()
+        if not fullmatch(ncf):
+            append(NCF_STATUS_MALFORMED)
+            continue
+        key = (partner_vat, ncf)
+        first = first_index.setdefault(key, index)
+        if first == index:
+            append(NCF_STATUS_VALID)
+        else:
+            statuses[first] = NCF_STATUS_DUPLICATE
+            append(NCF_STATUS_DUPLICATE)
+    return statuses
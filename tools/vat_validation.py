@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Batch validation of the check digit of RNCs and cédulas.
+
+A few cédulas issued before the check digit was enforced fail the check:
+they are flagged for review, never rejected outright.
+"""
+
+from itertools import product
+
+# Separators commonly typed inside an RNC or cédula
+_VAT_SEPARATORS = str.maketrans('', '', ' -.')
+
+VAT_STATUS_VALID = 'valid'
+VAT_STATUS_MISSING = 'missing'
+VAT_STATUS_MALFORMED = 'malformed'
+VAT_STATUS_INVALID = 'invalid'
+
+
+def _weighted_sums(weights, digit_sum):
+    """{digits: sum of digit_sum(digit * weight)} for every string of len(weights) digits."""
+    return {
+        ''.join(digits): sum(digit_sum(int(digit) * weight) for digit, weight in zip(digits, weights))
+        for digits in product('0123456789', repeat=len(weights))
+    }
+
+
+def _luhn_digit_sum(value):
+    return value - 9 if value > 9 else value
+
+
+# RNC: weights 7, 9, 8, 6, 5, 4, 3, 2 on the first 8 digits, mod 11
+_RNC_HEAD = _weighted_sums((7, 9, 8, 6), int)
+_RNC_TAIL = _weighted_sums((5, 4, 3, 2), int)
+_RNC_CHECK = [str({0: 2, 1: 1}.get(total % 11, 11 - total % 11)) for total in range(9 * 44 + 1)]
+
+# Cédula: Luhn on the first 10 digits (weights 1, 2, 1, 2...)
+_CEDULA_QUAD = _weighted_sums((1, 2, 1, 2), _luhn_digit_sum)
+_CEDULA_PAIR = _weighted_sums((1, 2), _luhn_digit_sum)
+_CEDULA_CHECK = [str((10 - total % 10) % 10) for total in range(9 * 10 + 1)]
+
+
+def normalize_vat(vat):
+    """RNC or cédula without separators."""
+    return (vat or '').translate(_VAT_SEPARATORS)
+
+
+def check_vats(vats):
+    """Validate the format and check digit of RNCs and cédulas in a single pass.
+
+    The weighted sums are read from tables precomputed per group of 2 or 4
+    digits, so each check costs a few dict lookups on top of the format
+    check.
+
+    :param vats: iterable of RNCs (9 digits) or cédulas (11 digits)
+    :return: list of statuses, one per VAT, in the same order
+    """
+    translate = str.translate
+    rnc_head, rnc_tail, rnc_check = _RNC_HEAD, _RNC_TAIL, _RNC_CHECK
+    cedula_quad, cedula_pair, cedula_check = _CEDULA_QUAD, _CEDULA_PAIR, _CEDULA_CHECK
+    statuses = []
+    append = statuses.append
+    for vat in vats:
+        if not vat:
+            append(VAT_STATUS_MISSING)
+            continue
+        vat = translate(vat, _VAT_SEPARATORS)
+        size = len(vat)
+        if size == 9 and vat.isdigit() and vat.isascii():
+            valid = rnc_check[rnc_head[vat[:4]] + rnc_tail[vat[4:8]]] == vat[8]
+        elif size == 11 and vat.isdigit() and vat.isascii():
+            valid = cedula_check[cedula_quad[vat[:4]] + cedula_quad[vat[4:8]] + cedula_pair[vat[8:10]]] == vat[10]
+        else:
+            append(VAT_STATUS_MALFORMED)
+            continue
+        append(VAT_STATUS_VALID if valid else VAT_STATUS_INVALID)
+    return statuses
+
+
+def check_vat(vat):
+    """Status of a single RNC or cédula."""
+    return check_vats([vat])[0]
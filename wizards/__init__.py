@@ -1,3 +1,4 @@
 # -*- coding: utf-8 -*-
 
 from . import ncf_sequence_wizard
+from . import dgii_rnc_import_wizard
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, _
+from odoo.exceptions import UserError
+import io
+
+
+class DGIIRNCImportWizard(models.TransientModel):
+    _name = 'dgii.rnc.import.wizard'
+    _description = 'DGII Taxpayer Registry Import Wizard'
+
+    rnc_file = fields.Binary(
+        string='Registry File',
+        required=True,
+        help='DGII_RNC.TXT as published by DGII (pipe-delimited)'
+    )
+    
+    rnc_filename = fields.Char(
+        string='Filename'
+    )
+    
+    validate_partners = fields.Boolean(
+        string='Validate All Partners',
+        default=True,
+        help='Check the VAT of every partner against the new registry'
+    )
+    
+    def action_import(self):
+        """Compile the uploaded registry and swap it in for all workers.
+        
+        The file is read line by line from its attachment, never decoded
+        in memory as a whole.
+        """
+        self.ensure_one()
+        
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name),
+            ('res_field', '=', 'rnc_file'),
+            ('res_id', '=', self.id),
+        ], limit=1)
+        if not attachment:
+            raise UserError(_('Please select the DGII_RNC.TXT file.'))
+        # DGII publishes the registry in Latin-1
+        with io.TextIOWrapper(attachment._open_file(), encoding='latin-1') as lines:
+            count = self.env['dgii.rnc.registry']._import_registry(lines)
+        
+        if self.validate_partners:
+            return self.env['res.partner'].action_validate_dgii_registry()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('DGII Registry'),
+                'message': _('%d taxpayers imported.') % count,
+                'type': 'success',
+                'sticky': False,
+            }
+        }
@@ -163,6 +163,9 @@ class NCFSequenceWizard(models.TransientModel):
         # Validate no conflicts
         self._check_existing_sequence()
         
+        # Sequences starting in the future are activated by the daily cron
+        starts_later = self.start_date > fields.Date.context_today(self)
+        
         # Create the sequence
         sequence_vals = {
             'prefix': self.prefix,
@@ -172,7 +175,8 @@ class NCFSequenceWizard(models.TransientModel):
             'current_number': self.start_number,
             'start_date': self.start_date,
             'expiry_date': self.expiry_date,
-            'state': 'active' if self.auto_activate else 'inactive',
+            'state': 'active' if self.auto_activate and not starts_later else 'inactive',
+            'auto_activate': self.auto_activate and starts_later,
             'company_id': self.company_id.id,
         }
         